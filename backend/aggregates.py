@@ -0,0 +1,56 @@
+"""
+Rolling CO2 aggregates for /api/stats/global.
+
+Actions are fed in as they're logged, so reading the last-minute and today
+totals costs the same whether there are ten actions or ten million.
+
+- Per-second buckets in a ring buffer cover the last-minute window. Each slot
+  remembers which second it holds, so stale slots are ignored on read and
+  overwritten on write without any background sweeping. Seconds later than
+  now are never added, so a future-dated action can't sit in the window.
+- Per-day buckets (keyed by local ISO date) cover today.
+"""
+import time
+from datetime import date, datetime
+from typing import Dict, Iterable, Optional, Tuple
+
+
+class RollingAggregator:
+    def __init__(self, window_s: int = 60):
+        self.window_s = window_s
+        self._second_kg = [0.0] * window_s
+        self._second_stamp = [-1] * window_s
+        self._day_kg: Dict[str, float] = {}
+
+    def add(self, kg: float, when: datetime):
+        day = when.date().isoformat()
+        self._day_kg[day] = self._day_kg.get(day, 0.0) + kg
+
+        second = int(when.timestamp())
+        now_s = int(time.time())
+        if not now_s - self.window_s < second <= now_s:
+            return  # Too old for the rolling window, or in the future
+        slot = second % self.window_s
+        if self._second_stamp[slot] != second:
+            self._second_stamp[slot] = second
+            self._second_kg[slot] = 0.0
+        self._second_kg[slot] += kg
+
+    def add_many(self, entries: Iterable[Tuple[float, datetime]]):
+        for kg, when in entries:
+            self.add(kg, when)
+
+    def last_window_kg(self, now: Optional[float] = None) -> float:
+        """CO2 saved in the last window_s seconds"""
+        now_s = int(now if now is not None else time.time())
+        oldest = now_s - self.window_s
+        total = 0.0
+        for stamp, kg in zip(self._second_stamp, self._second_kg):
+            if stamp > oldest:
+                total += kg
+        return total
+
+    def day_kg(self, day: Optional[date] = None) -> float:
+        """CO2 saved on one local calendar day (today by default)"""
+        day = day or datetime.now().date()
+        return self._day_kg.get(day.isoformat(), 0.0)
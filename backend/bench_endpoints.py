@@ -0,0 +1,302 @@
+"""
+Load-test the main endpoints against a local stand-in LLM.
+
+Starts stub_llm.py and the app (each under uvicorn, on free local ports), then
+for every data size seeds that many actions through /api/ingest and drives
+each endpoint at increasing concurrency, reporting throughput and
+p50/p95/p99 latency.
+
+Results are saved as JSON under --out. Each run is compared with the previous
+one (or --baseline), and any case whose p95 got more than --regression-pct
+worse, or whose throughput dropped by that much, is flagged.
+
+Usage:
+    python bench_endpoints.py [--concurrency 1,8,32] [--sizes 0,10000,100000]
+                              [--requests 200] [--stub-latency-ms 300]
+                              [--stub-failure-rate 0] [--llm-share 0.2]
+                              [--url http://127.0.0.1:8000]   # use a running app instead
+
+Endpoints: onboard, onboard_quick, log, dashboard, stats_global (--endpoints to pick).
+"""
+import argparse
+import asyncio
+import glob
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime
+
+import httpx
+
+ENDPOINTS = ("onboard", "onboard_quick", "log", "dashboard", "stats_global")
+BENCH_USERS = 200
+SEED_BATCH = 5000
+
+# Mostly messages the fast-path classifier handles, plus some that need the LLM
+FAST_MESSAGES = [
+    "I took the bus to work",
+    "biked 5 km to campus",
+    "had a vegan lunch",
+    "I hung my laundry to dry",
+    "took the train 20 km",
+    "brought my reusable bottle",
+]
+ACTION_TYPES = ["bus", "train_electric", "bike_walk", "vegan_meal", "vegetarian_meal", "cold_wash", "line_dry"]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(module: str, port: int, env: dict) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", f"{module}:app", "--port", str(port), "--log-level", "warning"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env={**os.environ, **env},
+    )
+
+
+async def wait_ready(url: str, timeout_s: float = 30):
+    deadline = time.monotonic() + timeout_s
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                await client.get(url)
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout_s}s")
+
+
+def percentile(ordered, pct: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+class Bench:
+    def __init__(self, client: httpx.AsyncClient, llm_share: float):
+        self.client = client
+        self.llm_share = llm_share
+        self.user_ids = []
+
+    async def setup_users(self, count: int):
+        for _ in range(count):
+            user_id = f"bench-{uuid.uuid4().hex[:12]}"
+            await self.client.post("/api/onboard-quick", json={
+                "user_id": user_id, "city": "Pittsburgh", "country": "USA", "commuteMode": "car",
+                "commuteDistance": 12, "foodVibe": "flex", "hasAC": True, "hasHeating": True,
+            })
+            self.user_ids.append(user_id)
+
+    async def seed_actions(self, count: int):
+        """Bulk-load actions so later cases run against a bigger store"""
+        for start in range(0, count, SEED_BATCH):
+            lines = "\n".join(json.dumps({
+                "user_id": random.choice(self.user_ids),
+                "action_type": random.choice(ACTION_TYPES),
+                "quantity": random.randint(1, 20),
+            }) for _ in range(min(SEED_BATCH, count - start)))
+            response = await self.client.post("/api/ingest", content=lines.encode(),
+                                               headers={"content-type": "application/x-ndjson"}, timeout=120)
+            response.raise_for_status()
+
+    def request(self, endpoint: str):
+        """(method, path, json body) for one call to endpoint"""
+        if endpoint == "onboard":
+            return "POST", "/api/onboard", {"user_id": f"bench-ob-{uuid.uuid4().hex[:12]}",
+                                            "message": "Hi! I live in Pittsburgh."}
+        if endpoint == "onboard_quick":
+            return "POST", "/api/onboard-quick", {
+                "user_id": f"bench-q-{uuid.uuid4().hex[:12]}", "city": "Pittsburgh", "commuteMode": "transit",
+                "commuteDistance": 8, "foodVibe": "veggie", "hasAC": False, "hasHeating": True,
+            }
+        if endpoint == "log":
+            if random.random() < self.llm_share:
+                # Unique wording misses both the fast path and the classification cache
+                message = f"did something green for the planet #{uuid.uuid4().hex[:8]}"
+            else:
+                message = random.choice(FAST_MESSAGES)
+            return "POST", "/api/log", {"user_id": random.choice(self.user_ids), "message": message}
+        if endpoint == "dashboard":
+            return "GET", f"/api/dashboard/{random.choice(self.user_ids)}", None
+        return "GET", "/api/stats/global", None
+
+    async def run_case(self, endpoint: str, concurrency: int, total: int):
+        latencies = []
+        errors = 0
+        remaining = total
+
+        async def worker():
+            nonlocal remaining, errors
+            while remaining > 0:
+                remaining -= 1
+                method, path, body = self.request(endpoint)
+                t0 = time.perf_counter()
+                try:
+                    response = await self.client.request(method, path, json=body)
+                    ok = response.status_code < 400
+                except httpx.HTTPError:
+                    ok = False
+                if ok:
+                    latencies.append((time.perf_counter() - t0) * 1000)
+                else:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        wall_s = time.perf_counter() - start
+
+        latencies.sort()
+        return {
+            "endpoint": endpoint,
+            "concurrency": concurrency,
+            "requests": total,
+            "errors": errors,
+            "throughput_rps": round(len(latencies) / wall_s, 1) if wall_s else 0.0,
+            "p50_ms": round(percentile(latencies, 50), 2),
+            "p95_ms": round(percentile(latencies, 95), 2),
+            "p99_ms": round(percentile(latencies, 99), 2),
+            "mean_ms": round(statistics.fmean(latencies), 2) if latencies else 0.0,
+        }
+
+
+def case_key(case) -> str:
+    return f"{case['endpoint']}@size={case['data_size']},c={case['concurrency']}"
+
+
+def compare(current, baseline, regression_pct: float):
+    """Cases that got more than regression_pct worse than in the baseline run"""
+    previous = {case_key(case): case for case in baseline["cases"]}
+    regressions = []
+    for case in current["cases"]:
+        old = previous.get(case_key(case))
+        if old is None:
+            continue
+        if old["p95_ms"] and case["p95_ms"] > old["p95_ms"] * (1 + regression_pct / 100):
+            regressions.append(f"{case_key(case)}: p95 {old['p95_ms']}ms -> {case['p95_ms']}ms")
+        if old["throughput_rps"] and case["throughput_rps"] < old["throughput_rps"] * (1 - regression_pct / 100):
+            regressions.append(f"{case_key(case)}: throughput {old['throughput_rps']} -> {case['throughput_rps']} rps")
+    return regressions
+
+
+async def run(args):
+    processes = []
+    base_url = args.url
+    try:
+        if base_url is None:
+            stub_port, app_port = free_port(), free_port()
+            processes.append(start_server("stub_llm", stub_port, {
+                "STUB_LATENCY_MS": str(args.stub_latency_ms),
+                "STUB_JITTER_MS": str(args.stub_jitter_ms),
+                "STUB_FAILURE_RATE": str(args.stub_failure_rate),
+            }))
+            processes.append(start_server("main", app_port, {
+                "DEDALUS_BASE_URL": f"http://127.0.0.1:{stub_port}/v1",
+                "DEDALUS_API_KEY": "bench",
+                "STORAGE_BACKEND": "memory",
+                "SHARED_STATE": "0",
+                "CLASSIFICATION_CACHE_PATH": "",
+            }))
+            await wait_ready(f"http://127.0.0.1:{stub_port}/stats")
+            base_url = f"http://127.0.0.1:{app_port}"
+        await wait_ready(f"{base_url}/api/stats/global")
+
+        limits = httpx.Limits(max_connections=max(args.concurrency), max_keepalive_connections=max(args.concurrency))
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+            bench = Bench(client, args.llm_share)
+            await bench.setup_users(BENCH_USERS)
+
+            cases = []
+            seeded = 0
+            for size in args.sizes:
+                if size > seeded:
+                    await bench.seed_actions(size - seeded)
+                    seeded = size
+                for endpoint in args.endpoints:
+                    for concurrency in args.concurrency:
+                        case = await bench.run_case(endpoint, concurrency, args.requests)
+                        case["data_size"] = size
+                        cases.append(case)
+                        print(f"{endpoint:14} size={size:<8} c={concurrency:<4} "
+                              f"{case['throughput_rps']:8.1f} rps  p50 {case['p50_ms']:8.2f}ms  "
+                              f"p95 {case['p95_ms']:8.2f}ms  p99 {case['p99_ms']:8.2f}ms  errors {case['errors']}")
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+
+    return {
+        "started_at": datetime.now().isoformat(),
+        "config": {
+            "requests": args.requests,
+            "stub_latency_ms": args.stub_latency_ms,
+            "stub_jitter_ms": args.stub_jitter_ms,
+            "stub_failure_rate": args.stub_failure_rate,
+            "llm_share": args.llm_share,
+            "external_url": args.url,
+        },
+        "cases": cases,
+    }
+
+
+def int_list(value: str):
+    return [int(v) for v in value.split(",") if v]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int_list, default=[1, 8, 32])
+    parser.add_argument("--sizes", type=int_list, default=[0, 10000, 100000],
+                        help="Actions in the store for each round (seeded via /api/ingest)")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per case")
+    parser.add_argument("--endpoints", type=lambda v: v.split(","), default=list(ENDPOINTS))
+    parser.add_argument("--stub-latency-ms", type=float, default=300)
+    parser.add_argument("--stub-jitter-ms", type=float, default=100)
+    parser.add_argument("--stub-failure-rate", type=float, default=0.0)
+    parser.add_argument("--llm-share", type=float, default=0.2, help="Share of /api/log messages that need the LLM")
+    parser.add_argument("--url", default=None, help="Benchmark an already running app instead of starting one")
+    parser.add_argument("--out", default="bench_results", help="Directory results are saved to")
+    parser.add_argument("--baseline", default=None, help="Results file to compare with (default: latest in --out)")
+    parser.add_argument("--regression-pct", type=float, default=20.0)
+    args = parser.parse_args()
+
+    unknown = set(args.endpoints) - set(ENDPOINTS)
+    if unknown:
+        parser.error(f"unknown endpoints: {', '.join(sorted(unknown))}")
+
+    baseline_path = args.baseline
+    if baseline_path is None:
+        previous = sorted(glob.glob(os.path.join(args.out, "endpoints-*.json")))
+        baseline_path = previous[-1] if previous else None
+
+    results = asyncio.run(run(args))
+
+    os.makedirs(args.out, exist_ok=True)
+    path = os.path.join(args.out, f"endpoints-{datetime.now():%Y%m%d-%H%M%S}.json")
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nSaved results to {path}")
+
+    if baseline_path:
+        with open(baseline_path) as f:
+            regressions = compare(results, json.load(f), args.regression_pct)
+        print(f"Compared with {baseline_path}: ", end="")
+        if regressions:
+            print(f"{len(regressions)} regression(s) over {args.regression_pct:.0f}%")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("no regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Measure the memory the action store takes per action, against plain dicts.
+
+Logs N actions spread across users and days (a few categories per user per
+day, like real usage) into an ActionStore and into a list of dicts, and
+reports bytes per action for each, with the store's per-user index (row
+numbers and history rollups) broken out.
+
+Usage:
+    python bench_store.py [--actions 200000] [--users 2000] [--days 90]
+"""
+import argparse
+import random
+import sys
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta
+
+from store import ActionStore
+
+CATEGORIES = {"transport": ["bus", "train_electric", "bike_walk"], "food": ["vegan_meal", "vegetarian_meal"],
+              "energy": ["led_bulb", "ac_off"]}
+
+
+def make_records(actions: int, users: int, days: int):
+    rng = random.Random(1)
+    start = datetime.now() - timedelta(days=days)
+    for _ in range(actions):
+        category = rng.choice(list(CATEGORIES))
+        yield {
+            "id": str(uuid.uuid4()),
+            "user_id": f"user-{rng.randrange(users)}",
+            "logged_at": (start + timedelta(seconds=rng.randrange(days * 86400))).isoformat(),
+            "category": category,
+            "action_type": rng.choice(CATEGORIES[category]),
+            "quantity": float(rng.randrange(1, 20)),
+            "co2_saved_kg": round(rng.random() * 3, 3),
+            "factor_version": "2026-01",
+        }
+
+
+def measure(build):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return result, used
+
+
+def index_bytes(action_store: ActionStore) -> int:
+    """Bytes held by the per-user index: row numbers and history rollups"""
+    total = sys.getsizeof(action_store._by_user)
+    for user_actions in action_store._by_user.values():
+        total += sys.getsizeof(user_actions) + sum(sys.getsizeof(getattr(user_actions, name)) for name in
+                                                   ("rows", "day_keys", "day_kg", "day_counts"))
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--actions", type=int, default=200000)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--days", type=int, default=90)
+    args = parser.parse_args()
+
+    records = list(make_records(args.actions, args.users, args.days))
+    records.sort(key=lambda record: record["logged_at"])  # Logged in time order
+
+    def build_store():
+        action_store = ActionStore()
+        action_store.extend(dict(record) for record in records)
+        return action_store
+
+    action_store, store_bytes = measure(build_store)
+    # Each dict gets its own strings, as when actions are parsed from requests or a snapshot
+    _, dict_bytes = measure(lambda: [{key: value.encode().decode() if isinstance(value, str) else value
+                                      for key, value in record.items()} for record in records])
+    index = index_bytes(action_store)
+
+    n = args.actions
+    print(f"{n} actions across {args.users} users over {args.days} days\n")
+    print(f"{'layout':<22} {'MB':>8} {'B/action':>10}")
+    print(f"{'dicts':<22} {dict_bytes / 1e6:>8.1f} {dict_bytes / n:>10.0f}")
+    print(f"{'store (total)':<22} {store_bytes / 1e6:>8.1f} {store_bytes / n:>10.0f}")
+    print(f"{'  columns':<22} {(store_bytes - index) / 1e6:>8.1f} {(store_bytes - index) / n:>10.0f}")
+    print(f"{'  per-user index':<22} {index / 1e6:>8.1f} {index / n:>10.0f}")
+    print(f"\n{dict_bytes / store_bytes:.1f}x less memory than dicts")
+
+
+if __name__ == "__main__":
+    main()
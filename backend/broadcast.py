@@ -0,0 +1,84 @@
+"""
+Fan-out broadcaster for live global stats over Server-Sent Events.
+
+Instead of every open dashboard polling /api/stats/global, clients subscribe to
+/api/stats/stream. log_action calls notify(); one background task then builds
+the stats payload once, encodes it once, and hands the same bytes to every
+subscriber queue. Bursts of logs are coalesced so at most max_rate_hz events go
+out per second, and an idle refresh keeps the rolling last-minute number
+decaying even when nobody is logging.
+
+Each subscriber queue holds only the latest event, so a slow client skips
+stale updates instead of building up a backlog.
+"""
+import asyncio
+import json
+from typing import Any, Callable, Dict, Set
+
+KEEPALIVE = b": keepalive\n\n"
+
+
+def encode_event(payload: Dict[str, Any]) -> bytes:
+    return b"data: " + json.dumps(payload).encode() + b"\n\n"
+
+
+class StatsBroadcaster:
+    def __init__(self, build_payload: Callable[[], Dict[str, Any]], max_rate_hz: float = 2.0,
+                 idle_refresh_s: float = 5.0):
+        self.build_payload = build_payload
+        self.min_interval_s = 1.0 / max_rate_hz
+        self.idle_refresh_s = idle_refresh_s
+        self.events_sent = 0
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._changed = asyncio.Event()
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def notify(self):
+        """Mark the stats as changed - cheap enough to call on every log"""
+        self._changed.set()
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=1)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+
+    def publish(self):
+        """Encode the current stats once and hand them to every subscriber"""
+        if not self._subscribers:
+            return
+        message = encode_event(self.build_payload())
+        for queue in self._subscribers:
+            if queue.full():
+                queue.get_nowait()  # Drop the stale event, keep only the latest
+            queue.put_nowait(message)
+        self.events_sent += 1
+
+    async def run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout=self.idle_refresh_s)
+            except asyncio.TimeoutError:
+                pass
+            self._changed.clear()
+            self.publish()
+            # Coalesce: anything logged during this sleep goes out in the next event
+            await asyncio.sleep(self.min_interval_s)
+
+    async def events(self, is_disconnected: Callable, keepalive_s: float = 15.0):
+        """SSE byte stream for one client: current stats first, then updates"""
+        queue = self.subscribe()
+        try:
+            yield encode_event(self.build_payload())
+            while not await is_disconnected():
+                try:
+                    yield await asyncio.wait_for(queue.get(), timeout=keepalive_s)
+                except asyncio.TimeoutError:
+                    yield KEEPALIVE
+        finally:
+            self.unsubscribe(queue)
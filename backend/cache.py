@@ -0,0 +1,131 @@
+"""
+LRU + TTL cache for LLM classification results.
+
+Keys are the normalized log message plus the profile fields the classification
+prompt actually depends on, so "biked to campus" and "Biked to campus!" share an
+entry but two users with different commutes don't. Entries expire after a TTL
+and the least recently used one is evicted once the cache is full.
+
+If a path is given the cache is loaded from disk on startup and written back with
+save() (periodically and on shutdown), so a restart doesn't start cold.
+"""
+import json
+import os
+import re
+import tempfile
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+PROFILE_FIELDS = ("commute_distance_km", "commute_mode", "diet_type")
+
+_PUNCTUATION = re.compile(r"[^\w\s/]+")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_message(message: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace"""
+    text = _PUNCTUATION.sub(" ", message.lower())
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def make_key(message: str, user: Dict[str, Any]) -> str:
+    profile = "|".join(str(user.get(field)) for field in PROFILE_FIELDS)
+    return f"{normalize_message(message)}|{profile}"
+
+
+class ClassificationCache:
+    def __init__(self, max_size: int = 10000, ttl_s: float = 86400, path: Optional[str] = None):
+        self.max_size = max_size
+        self.ttl_s = ttl_s
+        self.path = path
+        # key -> (expires_at epoch seconds, classified actions)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.dirty = False  # Entries were added since the last snapshot()
+        if path:
+            self.load()
+
+    def get(self, message: str, user: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+        key = make_key(message, user)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, actions = entry
+        if expires_at < time.time():
+            del self._entries[key]
+            self.evictions += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return actions
+
+    def put(self, message: str, user: Dict[str, Any], actions: List[Dict[str, Any]]):
+        key = make_key(message, user)
+        self._entries[key] = (time.time() + self.ttl_s, actions)
+        self._entries.move_to_end(key)
+        self.dirty = True
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+    def load(self):
+        """Load unexpired entries from disk, oldest first so LRU order survives"""
+        if not self.path or not os.path.exists(self.path):
+            return
+        now = time.time()
+        loaded = OrderedDict()
+        try:
+            with open(self.path, "r") as f:
+                entries = json.load(f)
+            for key, expires_at, actions in entries[-self.max_size:]:
+                if not isinstance(key, str) or not isinstance(actions, list):
+                    raise ValueError(f"malformed entry for {key!r}")
+                if expires_at >= now:
+                    loaded[key] = (expires_at, actions)
+        except (OSError, TypeError, KeyError, ValueError) as e:
+            # Valid JSON of the wrong shape too: start empty rather than fail at import
+            print(f"WARNING: ignoring unreadable classification cache {self.path}: {e}")
+            return
+        self._entries = loaded
+
+    def snapshot(self) -> List[list]:
+        """Unexpired entries, oldest first, for save() (cached actions are never mutated)"""
+        now = time.time()
+        self.dirty = False
+        return [[key, expires_at, actions] for key, (expires_at, actions) in self._entries.items()
+                if expires_at >= now]
+
+    def save(self, entries: Optional[List[list]] = None):
+        """Write the cache (or an earlier snapshot() of it) to disk atomically"""
+        if not self.path:
+            return
+        if entries is None:
+            entries = self.snapshot()
+        # A unique temp file, so a save in a thread can't collide with another one
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(entries, f)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
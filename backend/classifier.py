@@ -0,0 +1,170 @@
+"""
+Deterministic fast-path classifier for /api/log messages.
+
+Short messages like "took the bus to work" or "line dried my laundry" map
+cleanly onto one action_type from emission_factors.json, so there's no need to
+pay for an LLM round trip. classify() returns actions in the same shape the LLM
+classification prompt produces, or None when it isn't confident and the caller
+should fall back to the LLM.
+
+A message is only answered locally when every clause in it matches exactly one
+rule, nothing is negated, and every action has a usable quantity.
+"""
+import re
+from typing import Any, Dict, List, Optional
+
+MILES_TO_KM = 1.6  # Same conversion the LLM prompt asks for
+
+# (action_type, category, unit, pattern) - checked in order, so more specific
+# phrases ("electric car", "carpool with 3") come before generic ones ("car")
+RULES = [
+    # Transport
+    ("carpool_3plus", "transport", "km", r"car ?pool(?:ed|ing)?\b.*?\b(?:with )?(?:[3-9]|three|four|five|six|\d{2,}) (?:people|of us|friends|others|coworkers)"),
+    ("carpool_2", "transport", "km", r"car ?pool(?:ed|ing)?|shared (?:a )?(?:ride|car)|rode with (?:a )?(?:friend|coworker|colleague)"),
+    ("car_electric", "transport", "km", r"\b(?:(?:drove|took) (?:an |my |the )?)?(?:electric car|ev|tesla|e-car)\b"),
+    ("car_diesel", "transport", "km", r"\b(?:(?:drove|took) (?:a |my |the )?)?diesel(?: car)?\b"),
+    ("train_electric", "transport", "km", r"\b(?:train|metro|subway|tram|light rail|lrt|rail)\b"),
+    ("bus", "transport", "km", r"\b(?:bus|buses|bussed|shuttle|public transit|transit)\b"),
+    ("bike_walk", "transport", "km", r"\b(?:bike|biked|biking|cycled|cycling|bicycle|rode my bike|walk|walked|walking|jogged|scooter)\b"),
+    ("car_petrol", "transport", "km", r"\b(?:drove|drive|driving|car)\b"),
+
+    # Food
+    ("vegan_meal", "food", "meals", r"\b(?:vegan|plant[- ]based)\b"),
+    ("vegetarian_meal", "food", "meals", r"\b(?:vegetarian|veggie|meatless)\b"),
+    ("fish_meal", "food", "meals", r"\b(?:fish|salmon|tuna|sushi|seafood|cod)\b"),
+    ("beef_heavy_meal", "food", "meals", r"\b(?:beef|steak|burger|hamburger)\b"),
+    ("meat_mixed_meal", "food", "meals", r"\b(?:chicken|pork|turkey|ham)\b"),
+
+    # Home energy
+    ("line_dry", "home_energy", "loads", r"\b(?:line[- ]?dr(?:y|ied)|air[- ]?dr(?:y|ied)|hung (?:up )?(?:my |the )?(?:laundry|clothes)(?: out)?(?: to dry)?|skipped the dryer)\b"),
+    ("cold_wash", "home_energy", "loads", r"\b(?:cold wash|washed (?:\w+ )*?(?:in|with) cold|cold water (?:wash|laundry|load))\b"),
+    ("lights_off_hour", "home_energy", "hours", r"\b(?:lights? off|turned off (?:the |my |all )?lights?|switched off (?:the |my )?lights?)\b"),
+    ("ac_hour", "home_energy", "hours", r"\b(?:ac off|a/c off|turned off (?:the |my )?(?:ac|a/c|air ?con(?:ditioning)?)|skipped (?:the )?(?:ac|a/c|air ?con(?:ditioning)?))\b"),
+    ("heating_gas_hour", "home_energy", "hours", r"\b(?:heating off|heat off|turned (?:off|down) (?:the |my )?(?:heating|heater|heat)|skipped (?:the )?heating)\b"),
+
+    # Lifestyle
+    ("reusable_bottle", "lifestyle", "uses", r"\b(?:reusable (?:water )?bottle|refilled my (?:water )?bottle|my (?:own )?water bottle)\b"),
+    ("reusable_bag", "lifestyle", "uses", r"\b(?:reusable (?:shopping )?bags?|tote bags?|my own bags?|brought my (?:own )?bags?)\b"),
+    ("no_food_waste", "lifestyle", "uses", r"\b(?:no food waste|zero food waste|ate (?:my |the )?leftovers|finished (?:all )?my (?:food|leftovers))\b"),
+    ("local_produce", "lifestyle", "uses", r"\b(?:local produce|farmers'? market|locally grown|seasonal produce|local (?:veg|vegetables|fruit))\b"),
+    ("secondhand_clothing", "lifestyle", "uses", r"\b(?:thrift(?:ed|ing)?|second[- ]?hand (?:clothes|clothing|shirt|jacket|jeans|dress|shoes)|vintage (?:clothes|jacket|shirt))\b"),
+    ("secondhand_electronics", "lifestyle", "uses", r"\b(?:refurbished|second[- ]?hand (?:phone|laptop|computer|tablet|electronics|headphones)|used (?:phone|laptop|computer|tablet))\b"),
+]
+_COMPILED = [(a, c, u, re.compile(p)) for a, c, u, p in RULES]
+
+_CLAUSE_SPLIT = re.compile(r"\s*(?:[,;!?]+|\.(?!\d)|\band then\b|\bthen\b|\band\b|\bplus\b|\balso\b)\s*")
+_INSTEAD_OF = re.compile(r"\b(?:instead of|rather than|not)\s+(?:the |a |my )?\w+(?:ing)?\b")
+_NEGATION = re.compile(r"\b(?:didn'?t|did not|don'?t|do not|never|couldn'?t|wasn'?t|won'?t|no longer|forgot)\b")
+_COMMUTE = re.compile(r"\b(?:work|commute|commuted|commuting|office|campus|school|class|job)\b")
+
+_WORD_NUMBERS = {
+    "a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
+    "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10, "a couple of": 2,
+    "couple of": 2, "both": 2,
+}
+_NUMBER = r"(\d+(?:\.\d+)?|a couple of|couple of|an|a|one|two|three|four|five|six|seven|eight|nine|ten|both)"
+_DISTANCE = re.compile(_NUMBER + r"\s*(km|kms|kilometers?|kilometres?|mi|miles?)\b")
+_HOURS = re.compile(_NUMBER + r"\s*(hours?|hrs?|h)\b")
+_COUNT = re.compile(_NUMBER + r"\s+(?:\w+\s+)?(meals?|lunch(?:es)?|dinners?|breakfasts?|loads?|bottles?|bags?|items?|times)\b")
+_ALL_DAY = re.compile(r"\b(?:all day|the whole day|all afternoon)\b")
+
+# Clauses that carry no action of their own and shouldn't force an LLM call
+_FILLER = re.compile(r"^(?:i|today|this morning|this afternoon|tonight|yesterday|home|back home|again|too|as well|)$")
+
+stats = {"fast_path_hits": 0, "llm_fallbacks": 0}
+
+
+def hit_rate() -> float:
+    """Share of classified messages answered without the LLM"""
+    total = stats["fast_path_hits"] + stats["llm_fallbacks"]
+    return stats["fast_path_hits"] / total if total else 0.0
+
+
+def get_stats() -> Dict[str, Any]:
+    return {**stats, "hit_rate": round(hit_rate(), 4)}
+
+
+def _to_number(token: str) -> float:
+    if token in _WORD_NUMBERS:
+        return float(_WORD_NUMBERS[token])
+    return float(token)
+
+
+def _quantity(clause: str, category: str, unit: str, user: Dict[str, Any]) -> Optional[float]:
+    """Pull a quantity for the matched action, or None if it can't be trusted"""
+    if category == "transport":
+        match = _DISTANCE.search(clause)
+        if match:
+            distance = _to_number(match.group(1))
+            if match.group(2).startswith("mi"):
+                distance *= MILES_TO_KM
+            return round(distance, 2)
+        # No distance given - only a commute lets us assume one
+        if _COMMUTE.search(clause) and user.get("commute_distance_km"):
+            return float(user["commute_distance_km"])
+        return None
+
+    if unit == "hours":
+        match = _HOURS.search(clause)
+        if match:
+            return _to_number(match.group(1))
+        if _ALL_DAY.search(clause):
+            return 8.0
+        return None
+
+    match = _COUNT.search(clause)
+    if match:
+        return _to_number(match.group(1))
+    return 1.0
+
+
+def _classify_clause(clause: str, user: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    matches = []
+    remaining = clause
+    for action_type, category, unit, pattern in _COMPILED:
+        found = pattern.search(remaining)
+        if found:
+            matches.append((action_type, category, unit))
+            # Blank out the match so generic rules don't fire on the same words
+            remaining = remaining[:found.start()] + " " * (found.end() - found.start()) + remaining[found.end():]
+    if len(matches) != 1:
+        return None
+
+    action_type, category, unit = matches[0]
+    quantity = _quantity(clause, category, unit, user)
+    if quantity is None or quantity <= 0:
+        return None
+
+    return {
+        "category": category,
+        "action_type": action_type,
+        "quantity": quantity,
+        "unit": unit,
+        "confidence": "high",
+        "reasoning": "fast-path rule match",
+    }
+
+
+def classify(message: str, user: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+    """Classify a log message locally, or return None to defer to the LLM"""
+    text = message.lower().strip()
+    result = None
+    if text and not _NEGATION.search(text) and len(text) <= 200:
+        text = _INSTEAD_OF.sub(" ", text)
+        actions = []
+        for clause in _CLAUSE_SPLIT.split(text):
+            clause = clause.strip()
+            if _FILLER.match(clause):
+                continue
+            action = _classify_clause(clause, user)
+            if action is None:
+                actions = None
+                break
+            actions.append(action)
+        result = actions or None
+
+    if result is None:
+        stats["llm_fallbacks"] += 1
+    else:
+        stats["fast_path_hits"] += 1
+    return result
@@ -0,0 +1,51 @@
+"""
+Streaming NDJSON/CSV encoding for the export endpoints.
+
+Rows come from a lazy iterator (ActionStore.query, or users read one at a
+time) and are encoded into chunks of about CHUNK_BYTES, so an export of
+millions of actions never builds the whole body: StreamingResponse sends each
+chunk as it is produced, with chunked transfer encoding. stream() hands the
+event loop back after every chunk, so other requests keep being served while
+a long export runs.
+"""
+import asyncio
+import csv
+import io
+import json
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, Sequence
+
+FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+CHUNK_BYTES = 16 * 1024
+
+# Profile fields only - conversation_history stays out of exports
+USER_COLUMNS = ("user_id", "display_name", "city", "country", "college", "commute_mode", "commute_distance_km",
+                "diet_type", "meals_per_day", "has_ac", "heating_type", "estimated_annual_footprint_kg",
+                "onboarding_complete")
+
+
+def encode_rows(rows: Iterable[Dict[str, Any]], columns: Sequence[str], fmt: str) -> Iterator[bytes]:
+    """Encode rows as NDJSON objects or CSV lines (with a header), in CHUNK_BYTES chunks"""
+    buffer = io.StringIO()
+    writer = None
+    if fmt == "csv":
+        writer = csv.writer(buffer, lineterminator="\n")
+        writer.writerow(columns)
+    for row in rows:
+        if writer is not None:
+            writer.writerow([row.get(column) for column in columns])
+        else:
+            buffer.write(json.dumps({column: row.get(column) for column in columns}))
+            buffer.write("\n")
+        if buffer.tell() >= CHUNK_BYTES:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+async def stream(chunks: Iterator[bytes]) -> AsyncIterator[bytes]:
+    """Yield chunks to StreamingResponse, letting other requests run in between"""
+    for chunk in chunks:
+        yield chunk
+        await asyncio.sleep(0)
@@ -0,0 +1,58 @@
+"""
+Export actions or users from a running CarbonBuddy server as NDJSON or CSV.
+
+The response from GET /api/export/{actions,users} is written out chunk by
+chunk as it arrives, so exports of any size run in constant memory on both
+sides. The server must be started with ALLOW_EXPORT_ENDPOINT=1.
+
+Usage:
+    python export_data.py actions --format csv --out actions.csv
+    python export_data.py actions --user-id u1 --category transport --start 2026-03-01 --end 2026-04-01
+    python export_data.py users --out - | head
+"""
+import argparse
+import sys
+import time
+
+import httpx
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("kind", choices=("actions", "users"))
+    parser.add_argument("--format", choices=("ndjson", "csv"), default="ndjson")
+    parser.add_argument("--user-id")
+    parser.add_argument("--category", help="actions only")
+    parser.add_argument("--start", help="actions logged at or after this ISO date/datetime")
+    parser.add_argument("--end", help="actions logged before this ISO date/datetime")
+    parser.add_argument("--out", default="-", help='output file, or "-" for stdout')
+    parser.add_argument("--url", default="http://localhost:8000")
+    args = parser.parse_args()
+
+    params = {"format": args.format, "user_id": args.user_id}
+    if args.kind == "actions":
+        params.update(category=args.category, start=args.start, end=args.end)
+    params = {key: value for key, value in params.items() if value is not None}
+
+    started = time.perf_counter()
+    written = 0
+    with httpx.stream("GET", f"{args.url}/api/export/{args.kind}", params=params, timeout=None) as response:
+        if response.status_code != 200:
+            print(f"Export failed ({response.status_code}): {response.read().decode()}", file=sys.stderr)
+            sys.exit(1)
+        f = sys.stdout.buffer if args.out == "-" else open(args.out, "wb")
+        try:
+            for chunk in response.iter_bytes():
+                f.write(chunk)
+                written += len(chunk)
+        finally:
+            if f is sys.stdout.buffer:
+                f.flush()
+            else:
+                f.close()
+
+    print(f"Exported {args.kind} ({written / 1e6:.1f} MB) in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Compiled emission-factor registry with hot reload.
+
+emission_factors.json is compiled once per version into a FactorTable:
+- action types map to compact integer ids, with the kg CO2e values in one
+  contiguous array indexed by id
+- equivalency thresholds are parsed and sorted once, so get_equivalency is a
+  bisect instead of a parse-and-sort on every call
+
+Tables are immutable. A reload compiles a new table and swaps the registry's
+reference to it, so a request that grabbed `registry.table` keeps a consistent
+view. Each table's version is a hash of the file contents, which stays the
+same across restarts and workers; logged actions record it as factor_version.
+"""
+import hashlib
+import json
+import os
+import time
+from array import array
+from bisect import bisect_right
+from typing import Any, Dict, Optional
+
+REQUIRED_ACTION_TYPES = ("car_petrol", "meat_mixed_meal")  # Baseline defaults used by the app
+
+
+class FactorTable:
+    def __init__(self, data: Dict[str, Any], version: str):
+        self.version = version
+        self.factors: Dict[str, Dict[str, Any]] = {f["action_type"]: f for f in data["factors"]}
+        missing = [t for t in REQUIRED_ACTION_TYPES if t not in self.factors]
+        if missing:
+            raise ValueError(f"emission factors missing required action types: {missing}")
+
+        self.action_types = tuple(self.factors)
+        self.ids: Dict[str, int] = {action_type: i for i, action_type in enumerate(self.action_types)}
+        self.values = array("d", (self.factors[t]["emission_factor_kg_co2e"] for t in self.action_types))
+
+        pairs = sorted((float(threshold), text) for threshold, text in data["equivalencies"].items())
+        if not pairs:
+            raise ValueError("emission factors have no equivalencies")
+        self.thresholds = [threshold for threshold, _ in pairs]
+        self.equivalency_texts = [text for _, text in pairs]
+
+    def __contains__(self, action_type: str) -> bool:
+        return action_type in self.ids
+
+    def __len__(self) -> int:
+        return len(self.action_types)
+
+    def value(self, action_type: str) -> float:
+        """kg CO2e per unit for an action type"""
+        return self.values[self.ids[action_type]]
+
+    def saved_kg(self, action_type: str, category: str, quantity: float, user: Dict[str, Any]) -> float:
+        """CO2 saved by one action versus the user's baseline.
+
+        Food and transport are compared with the user's usual diet / commute
+        mode; home energy and lifestyle factors are already savings.
+        """
+        emission_factor = self.value(action_type)
+        if category == "food":
+            baseline_type = user.get("diet_type") or "meat_mixed_meal"
+            baseline_factor = self.value(baseline_type if baseline_type in self.ids else "meat_mixed_meal")
+        elif category == "transport":
+            baseline_type = user.get("commute_mode") or "car_petrol"
+            baseline_factor = self.value(baseline_type if baseline_type in self.ids else "car_petrol")
+        else:
+            return emission_factor * quantity
+        return max(0, baseline_factor * quantity - emission_factor * quantity)
+
+    def equivalency(self, kg_co2: float) -> str:
+        """Largest equivalency whose threshold kg_co2 reaches (smallest one below all)"""
+        return self.equivalency_texts[max(0, bisect_right(self.thresholds, kg_co2) - 1)]
+
+
+def compile_file(path: str) -> FactorTable:
+    with open(path, "rb") as f:
+        raw = f.read()
+    return FactorTable(json.loads(raw), hashlib.sha256(raw).hexdigest()[:12])
+
+
+class FactorRegistry:
+    """Holds the current FactorTable and reloads it when the file changes"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._mtime = os.stat(path).st_mtime_ns
+        self.table = compile_file(path)
+        self.loaded_at = time.time()
+        self.reloads = 0
+        self.last_error: Optional[str] = None
+
+    def reload(self, force: bool = False) -> bool:
+        """Recompile if the file changed (or always, with force).
+
+        Returns True when a new version was swapped in. A broken file leaves
+        the current table in place.
+        """
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+            if not force and mtime == self._mtime:
+                return False
+            table = compile_file(self.path)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            self.last_error = str(e)
+            print(f"Error reloading emission factors: {e}")
+            return False
+        self._mtime = mtime
+        self.last_error = None
+        if table.version == self.table.version:
+            return False
+        self.table = table
+        self.loaded_at = time.time()
+        self.reloads += 1
+        return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "version": self.table.version,
+            "action_types": len(self.table),
+            "loaded_at": self.loaded_at,
+            "reloads": self.reloads,
+            "last_error": self.last_error,
+        }
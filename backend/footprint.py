@@ -0,0 +1,107 @@
+"""
+Annual footprint engine: one place that turns a profile into a total plus a
+per-category breakdown.
+
+footprint() handles a single profile (onboarding). batch_footprints() handles
+thousands at once for cohort reports and for re-baselining every user when the
+emission factors change; with NumPy installed it runs as one vectorized pass,
+otherwise it falls back to calling footprint() per profile.
+
+Profiles are plain dicts with the UserProfile fields (commute_mode,
+commute_distance_km, diet_type, meals_per_day, has_ac); missing values get the
+same defaults UserProfile uses.
+"""
+from typing import Any, Dict, List
+
+try:
+    import numpy as np
+except ImportError:  # Optional - only the batch path uses it
+    np = None
+
+WORK_DAYS = 250
+DAYS_PER_YEAR = 365
+HOME_BASELINE_KG = 1500  # Average US household baseline
+AC_EXTRA_KG = 500
+
+DEFAULT_COMMUTE_MODE = "car_petrol"
+DEFAULT_DIET_TYPE = "meat_mixed_meal"
+DEFAULT_MEALS_PER_DAY = 3
+
+
+def _factor(factors: Dict[str, Dict[str, Any]], key: str, default: str) -> float:
+    return factors.get(key, factors[default])["emission_factor_kg_co2e"]
+
+
+def footprint(profile: Dict[str, Any], factors: Dict[str, Dict[str, Any]]) -> Dict[str, float]:
+    """Annual kg CO2e for one profile: {"total", "transport", "food", "home"}"""
+    commute_factor = _factor(factors, profile.get("commute_mode") or DEFAULT_COMMUTE_MODE, DEFAULT_COMMUTE_MODE)
+    transport = (profile.get("commute_distance_km") or 0) * 2 * WORK_DAYS * commute_factor
+
+    food_factor = _factor(factors, profile.get("diet_type") or DEFAULT_DIET_TYPE, DEFAULT_DIET_TYPE)
+    meals = profile.get("meals_per_day")
+    food = food_factor * (DEFAULT_MEALS_PER_DAY if meals is None else meals) * DAYS_PER_YEAR
+
+    home = HOME_BASELINE_KG + (AC_EXTRA_KG if profile.get("has_ac") else 0)
+
+    return {"total": transport + food + home, "transport": transport, "food": food, "home": home}
+
+
+def breakdown_percentages(result: Dict[str, float]) -> Dict[str, int]:
+    """Whole-number shares of the total that add up to 100"""
+    total = result["total"]
+    breakdown = {
+        "transport": round(result["transport"] / total * 100) if total > 0 else 0,
+        "food": round(result["food"] / total * 100) if total > 0 else 0,
+        "energy": round(result["home"] / total * 100) if total > 0 else 0,
+    }
+    breakdown["other"] = 100 - breakdown["transport"] - breakdown["food"] - breakdown["energy"]
+    return breakdown
+
+
+def _lookup(keys: List[Any], factors: Dict[str, Dict[str, Any]], default: str):
+    """Map each key to its factor via one small table instead of a dict lookup per row"""
+    index: Dict[Any, int] = {}
+    codes = np.fromiter((index.setdefault(key, len(index)) for key in keys), dtype=np.intp, count=len(keys))
+    table = np.array([_factor(factors, key or default, default) for key in index], dtype=np.float64)
+    return table[codes]
+
+
+def batch_footprints(profiles: List[Dict[str, Any]], factors: Dict[str, Dict[str, Any]]) -> Dict[str, List[float]]:
+    """Footprints for many profiles at once, as parallel lists per component"""
+    if np is None or not profiles:
+        results = [footprint(p, factors) for p in profiles]
+        return {key: [r[key] for r in results] for key in ("total", "transport", "food", "home")}
+
+    n = len(profiles)
+    distance = np.fromiter((p.get("commute_distance_km") or 0 for p in profiles), dtype=np.float64, count=n)
+    meals = np.fromiter((DEFAULT_MEALS_PER_DAY if p.get("meals_per_day") is None else p["meals_per_day"]
+                         for p in profiles), dtype=np.float64, count=n)
+    has_ac = np.fromiter((bool(p.get("has_ac")) for p in profiles), dtype=bool, count=n)
+
+    transport = distance * (2 * WORK_DAYS) * _lookup([p.get("commute_mode") for p in profiles],
+                                                    factors, DEFAULT_COMMUTE_MODE)
+    food = meals * DAYS_PER_YEAR * _lookup([p.get("diet_type") for p in profiles], factors, DEFAULT_DIET_TYPE)
+    home = np.where(has_ac, HOME_BASELINE_KG + AC_EXTRA_KG, HOME_BASELINE_KG).astype(np.float64)
+    total = transport + food + home
+
+    return {"total": total.tolist(), "transport": transport.tolist(), "food": food.tolist(), "home": home.tolist()}
+
+
+def summarize(batch: Dict[str, List[float]]) -> Dict[str, Any]:
+    """Cohort summary: total percentiles and mean per component"""
+    totals = batch["total"]
+    if not totals:
+        return {"count": 0}
+    if np is not None:
+        arr = np.asarray(totals)
+        p50, p90 = np.percentile(arr, [50, 90]).tolist()
+    else:
+        ordered = sorted(totals)
+        p50 = ordered[len(ordered) // 2]
+        p90 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.9))]
+    return {
+        "count": len(totals),
+        "total_p50": round(p50, 1),
+        "total_p90": round(p90, 1),
+        "mean": {key: round(sum(values) / len(values), 1) for key, values in batch.items()},
+    }
@@ -1,152 +1,156 @@
 """
-Seed the database with realistic demo data to make the collective counter impressive
-This simulates 20 CMU students over 2 weeks
+Generate synthetic users and actions as NDJSON, at any scale.
+
+Users are modeled on CMU student archetypes (the original 20-student demo),
+spread over a few colleges and cities. Each user is written as one
+{"type": "user", ...} line followed by their {"type": "action", ...} lines,
+and nothing is kept in memory beyond the current user, so millions of users
+stream straight to disk (or stdout).
+
+Savings use the same baseline-vs-actual rules as /api/log: a car commuter
+who takes the bus saves the difference, a vegan eating a vegan meal saves
+nothing new. Load the output with seed.py or SEED_DATA_PATH (see main.py).
+
+Usage:
+    python generate_demo_data.py [--users 20] [--days 14] [--seed 42]
+                                 [--out demo_data.ndjson]   # "-" for stdout
 """
+import argparse
+import json
+import os
+import random
 import sys
-sys.path.append('/home/claude/carbonbuddy/backend')
-
+import time
 from datetime import datetime, timedelta
-import random
-import json
 
-# Student profiles (realistic CMU archetypes)
-STUDENTS = [
-    {"name": "Sarah", "college": "CFA", "commute": "walk", "diet": "vegetarian", "distance_km": 0},
-    {"name": "Mike", "college": "SCS", "commute": "car", "diet": "meat_mixed", "distance_km": 12},
-    {"name": "Priya", "college": "Tepper", "commute": "bus", "diet": "vegan", "distance_km": 8},
-    {"name": "Jake", "college": "Engineering", "commute": "bike", "diet": "meat_mixed", "distance_km": 5},
-    {"name": "Emma", "college": "Dietrich", "commute": "bus", "diet": "vegetarian", "distance_km": 10},
-    {"name": "David", "college": "SCS", "commute": "car", "diet": "beef_heavy", "distance_km": 15},
-    {"name": "Lisa", "college": "CFA", "commute": "walk", "diet": "vegan", "distance_km": 0},
-    {"name": "Alex", "college": "Tepper", "commute": "train", "diet": "fish", "distance_km": 20},
-    {"name": "Maria", "college": "Engineering", "commute": "bike", "diet": "vegetarian", "distance_km": 4},
-    {"name": "Tom", "college": "SCS", "commute": "bus", "diet": "meat_mixed", "distance_km": 7},
-    {"name": "Nina", "college": "Dietrich", "commute": "walk", "diet": "vegetarian", "distance_km": 0},
-    {"name": "Chris", "college": "Engineering", "commute": "car", "diet": "meat_mixed", "distance_km": 14},
-    {"name": "Amy", "college": "CFA", "commute": "bike", "diet": "vegan", "distance_km": 6},
-    {"name": "Ryan", "college": "Tepper", "commute": "bus", "diet": "beef_heavy", "distance_km": 9},
-    {"name": "Sophia", "college": "SCS", "commute": "walk", "diet": "fish", "distance_km": 0},
-    {"name": "Dan", "college": "Engineering", "commute": "car", "diet": "meat_mixed", "distance_km": 11},
-    {"name": "Rachel", "college": "Dietrich", "commute": "train", "diet": "vegetarian", "distance_km": 18},
-    {"name": "Kevin", "college": "SCS", "commute": "bike", "diet": "vegan", "distance_km": 5},
-    {"name": "Laura", "college": "CFA", "commute": "bus", "diet": "vegetarian", "distance_km": 8},
-    {"name": "Ben", "college": "Tepper", "commute": "car", "diet": "meat_mixed", "distance_km": 13},
-]
-
-# Load emission factors
-with open('/home/claude/carbonbuddy/backend/emission_factors.json', 'r') as f:
-    emission_data = json.load(f)
-    EMISSION_FACTORS = {f['action_type']: f for f in emission_data['factors']}
-
-def generate_actions_for_student(student, days=14):
-    """Generate realistic actions for a student over N days"""
-    actions = []
-    
-    # Map diet types
-    diet_map = {
-        "vegetarian": "vegetarian_meal",
-        "vegan": "vegan_meal",
-        "meat_mixed": "meat_mixed_meal",
-        "beef_heavy": "beef_heavy_meal",
-        "fish": "fish_meal"
-    }
-    
-    # Map commute types
-    commute_map = {
-        "walk": "bike_walk",
-        "bike": "bike_walk",
-        "bus": "bus",
-        "train": "train_electric",
-        "car": "car_petrol"
-    }
-    
-    for day in range(days):
-        date = datetime.now() - timedelta(days=days-day-1)
-        
-        # Commute actions (5 days/week)
-        if day % 7 < 5 and student["distance_km"] > 0:  # Weekdays only
-            # Baseline is car, actual is their mode
-            commute_type = commute_map[student["commute"]]
-            if commute_type != "car_petrol":  # Only log if not driving
-                baseline = EMISSION_FACTORS["car_petrol"]["emission_factor_kg_co2e"] * student["distance_km"] * 2
-                actual = EMISSION_FACTORS[commute_type]["emission_factor_kg_co2e"] * student["distance_km"] * 2
-                saved = baseline - actual
-                
-                actions.append({
-                    "logged_at": date.isoformat(),
-                    "category": "transport",
-                    "action_type": commute_type,
-                    "quantity": student["distance_km"] * 2,
-                    "co2_saved_kg": saved
-                })
-        
-        # Food actions (random, but matching their diet)
-        # 60% chance they log a meal each day
-        if random.random() < 0.6:
-            meal_type = diet_map[student["diet"]]
-            # Baseline is meat_mixed
-            baseline = EMISSION_FACTORS["meat_mixed_meal"]["emission_factor_kg_co2e"]
-            actual = EMISSION_FACTORS[meal_type]["emission_factor_kg_co2e"]
-            saved = max(0, baseline - actual)
-            
-            if saved > 0:  # Only log if they saved something
-                actions.append({
-                    "logged_at": date.isoformat(),
-                    "category": "food",
-                    "action_type": meal_type,
-                    "quantity": 1,
-                    "co2_saved_kg": saved
-                })
-        
-        # Occasional lifestyle actions (20% chance per day)
-        if random.random() < 0.2:
-            lifestyle_actions = [
-                ("reusable_bottle", 0.08),
-                ("reusable_bag", 0.03),
-                ("no_food_waste", 0.9),
-                ("local_produce", 0.3),
-            ]
-            action = random.choice(lifestyle_actions)
-            actions.append({
-                "logged_at": date.isoformat(),
-                "category": "lifestyle",
-                "action_type": action[0],
-                "quantity": 1,
-                "co2_saved_kg": action[1]
-            })
-    
-    return actions
-
-# Generate all actions
-print("Generating realistic demo data for 20 CMU students over 2 weeks...")
-all_actions = []
-total_saved = 0
-
-for student in STUDENTS:
-    actions = generate_actions_for_student(student, days=14)
-    all_actions.extend(actions)
-    student_total = sum(a["co2_saved_kg"] for a in actions)
-    total_saved += student_total
-    print(f"{student['name']} ({student['college']}): {len(actions)} actions, {student_total:.1f} kg saved")
-
-print(f"\nTotal: {len(all_actions)} actions, {total_saved:.1f} kg CO2 saved")
-print(f"Average per student: {total_saved/20:.1f} kg")
-
-# Save to JSON
-output = {
-    "students": STUDENTS,
-    "actions": all_actions,
-    "summary": {
-        "total_actions": len(all_actions),
-        "total_co2_saved_kg": round(total_saved, 1),
-        "num_students": len(STUDENTS),
-        "period_days": 14,
-        "generated_at": datetime.now().isoformat()
+from factors import compile_file
+from footprint import footprint
+
+FIRST_NAMES = ["Sarah", "Mike", "Priya", "Jake", "Emma", "David", "Lisa", "Alex", "Maria", "Tom",
+               "Nina", "Chris", "Amy", "Ryan", "Sophia", "Dan", "Rachel", "Kevin", "Laura", "Ben"]
+COLLEGES = ["CFA", "SCS", "Tepper", "Engineering", "Dietrich", "MCS", "Heinz"]
+CITIES = [("Pittsburgh", "USA", 0.6), ("Boston", "USA", 0.15), ("Toronto", "Canada", 0.1),
+          ("London", "UK", 0.1), ("Berlin", "Germany", 0.05)]
+
+# (commute_mode, weight, one-way km range)
+COMMUTES = [("car_petrol", 0.3, (5, 25)), ("bus", 0.25, (3, 15)), ("bike_walk", 0.25, (0, 6)),
+            ("train_electric", 0.1, (8, 30)), ("car_electric", 0.05, (5, 25)), ("car_diesel", 0.05, (5, 25))]
+DIETS = [("meat_mixed_meal", 0.45), ("beef_heavy_meal", 0.15), ("fish_meal", 0.1),
+         ("vegetarian_meal", 0.2), ("vegan_meal", 0.1)]
+GREENER_COMMUTES = ["bus", "train_electric", "bike_walk", "carpool_2", "carpool_3plus"]
+EVERYDAY_ACTIONS = [("reusable_bottle", 1, 3), ("reusable_bag", 1, 2), ("no_food_waste", 1, 1),
+                    ("local_produce", 1, 2), ("cold_wash", 1, 2), ("line_dry", 1, 1), ("lights_off_hour", 1, 4)]
+
+DEFAULT_FACTORS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "emission_factors.json")
+
+
+def make_user(index: int, rng: random.Random, table) -> dict:
+    commute_mode, _, (low, high) = rng.choices(COMMUTES, weights=[c[1] for c in COMMUTES])[0]
+    city, country, _ = rng.choices(CITIES, weights=[c[2] for c in CITIES])[0]
+    user = {
+        "user_id": f"demo-{index:07d}",
+        "display_name": f"{rng.choice(FIRST_NAMES)} {chr(65 + index % 26)}.",
+        "city": city,
+        "country": country,
+        "college": rng.choice(COLLEGES),
+        "commute_distance_km": 0 if commute_mode == "bike_walk" and rng.random() < 0.3 else rng.randint(low, high),
+        "commute_mode": commute_mode,
+        "diet_type": rng.choices(DIETS, weights=[d[1] for d in DIETS])[0][0],
+        "meals_per_day": 3,
+        "has_ac": rng.random() < 0.6,
+        "heating_type": rng.choice(["gas", "electric", "none"]),
+        "onboarding_complete": True,
+        "conversation_history": [],
     }
-}
+    user["estimated_annual_footprint_kg"] = footprint(user, table.factors)["total"]
+    return user
+
+
+def make_actions(user: dict, start: datetime, days: int, rng: random.Random, table, end: datetime):
+    """Yield one user's actions, day by day, between 7am and 10pm (and not after end)"""
+    diet_factor = table.value(user["diet_type"])
+    greener_meals = [t for t in ("fish_meal", "vegetarian_meal", "vegan_meal") if table.value(t) < diet_factor]
+    drives = user["commute_mode"].startswith("car_")
+
+    sequence = 0
+
+    def action(day: str, action_type: str, quantity: float, latest_s: int) -> dict:
+        nonlocal sequence
+        sequence += 1
+        category = table.factors[action_type]["category"]
+        seconds = rng.randint(min(7 * 3600, latest_s), latest_s)
+        return {
+            "type": "action",
+            "id": f"{user['user_id']}-{sequence}",
+            "user_id": user["user_id"],
+            "logged_at": f"{day}T{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}",
+            "category": category,
+            "action_type": action_type,
+            "quantity": quantity,
+            "co2_saved_kg": table.saved_kg(action_type, category, quantity, user),
+            "factor_version": table.version,
+        }
+
+    for offset in range(days):
+        date = start + timedelta(days=offset)
+        day = date.date().isoformat()
+        latest_s = 22 * 3600
+        if date.date() == end.date():
+            latest_s = min(latest_s, end.hour * 3600 + end.minute * 60 + end.second)
+        # Weekday commutes: drivers sometimes leave the car at home
+        if date.weekday() < 5 and user["commute_distance_km"] > 0 and drives and rng.random() < 0.35:
+            yield action(day, rng.choice(GREENER_COMMUTES), user["commute_distance_km"] * 2, latest_s)
+        # A meal greener than their usual diet
+        if greener_meals and rng.random() < 0.5:
+            yield action(day, rng.choice(greener_meals), 1, latest_s)
+        # Everyday habits
+        if rng.random() < 0.4:
+            action_type, low, high = rng.choice(EVERYDAY_ACTIONS)
+            yield action(day, action_type, rng.randint(low, high), latest_s)
+
+
+def generate(out, users: int, days: int, seed: int, factors_path: str, end: datetime):
+    rng = random.Random(seed)
+    table = compile_file(factors_path)
+    start = (end - timedelta(days=days - 1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    action_count = 0
+    total_saved = 0.0
+    dumps = json.dumps
+
+    for index in range(users):
+        user = make_user(index, rng, table)
+        lines = [dumps({"type": "user", **user})]
+        for record in make_actions(user, start, days, rng, table, end):
+            lines.append(dumps(record))
+            action_count += 1
+            total_saved += record["co2_saved_kg"]
+        out.write("\n".join(lines) + "\n")
+    return action_count, total_saved
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--days", type=int, default=14)
+    parser.add_argument("--seed", type=int, default=42, help="Random seed, for reproducible data sets")
+    parser.add_argument("--out", default="demo_data.ndjson", help='Output file, or "-" for stdout')
+    parser.add_argument("--factors", default=DEFAULT_FACTORS_PATH, help="emission_factors.json to price actions with")
+    parser.add_argument("--end-date", default=None, help="Last day of generated activity (YYYY-MM-DD, default today)")
+    args = parser.parse_args()
+
+    end = datetime.now()
+    if args.end_date:
+        end = datetime.fromisoformat(args.end_date).replace(hour=23, minute=59, second=59)
+    started = time.perf_counter()
+    if args.out == "-":
+        actions, saved = generate(sys.stdout, args.users, args.days, args.seed, args.factors, end)
+    else:
+        with open(args.out, "w", buffering=1 << 20) as f:
+            actions, saved = generate(f, args.users, args.days, args.seed, args.factors, end)
+
+    print(f"Generated {args.users} users and {actions} actions ({saved:,.1f} kg CO2 saved) "
+          f"in {time.perf_counter() - started:.1f}s", file=sys.stderr)
 
-with open('/home/claude/carbonbuddy/backend/demo_data.json', 'w') as f:
-    json.dump(output, f, indent=2)
 
-print(f"\n✅ Demo data saved to demo_data.json")
-print(f"   Use this data to seed your database for an impressive demo!")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Per-user savings history, rolled up per category by day, ISO week and month.
+
+Buckets are updated as each action is appended (see store.UserActions and
+shared.SharedActionStore), so a history chart or the dashboard projection
+reads a handful of buckets instead of the user's raw actions. The in-memory
+store keeps only day buckets and sums weeks and months from them on read.
+
+Long ranges can be downsampled: consecutive buckets are merged so a series
+never has more than max_points points.
+"""
+import math
+from datetime import date, timedelta
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from leaderboard import week_key
+
+GRANULARITIES = ("day", "week", "month")
+DEFAULT_PERIODS = {"day": 30, "week": 12, "month": 12}  # Range shown when no start is given
+MAX_PERIODS = 3700  # About ten years of days
+RECENT_RATE_DAYS = 28  # Window for the dashboard's "current rate" projection
+
+# period -> (kg by category, action count)
+Buckets = Dict[str, Tuple[Dict[str, float], int]]
+
+
+@lru_cache(maxsize=4096)
+def bucket_keys(day: str) -> Tuple[str, str, str]:
+    """(day, week, month) periods for an ISO date"""
+    return day, week_key(date.fromisoformat(day)), day[:7]
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def period_start(granularity: str, day: date) -> date:
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return month_start(day)
+    return day
+
+
+def period_days(granularity: str, period: str) -> Tuple[date, date]:
+    """First and last day of a period"""
+    if granularity == "week":
+        start = date.fromisocalendar(int(period[:4]), int(period[6:]), 1)
+        return start, start + timedelta(days=6)
+    if granularity == "month":
+        start = date.fromisoformat(period + "-01")
+        return start, month_start(start + timedelta(days=32)) - timedelta(days=1)
+    day = date.fromisoformat(period)
+    return day, day
+
+
+def period_keys(granularity: str, start: date, end: date) -> List[str]:
+    """Every period from the one containing start to the one containing end"""
+    keys = []
+    current = period_start(granularity, start)
+    while current <= end and len(keys) < MAX_PERIODS:
+        if granularity == "day":
+            keys.append(current.isoformat())
+            current += timedelta(days=1)
+        elif granularity == "week":
+            keys.append(week_key(current))
+            current += timedelta(weeks=1)
+        else:
+            keys.append(current.isoformat()[:7])
+            current = month_start(current + timedelta(days=32))
+    return keys
+
+
+def default_start(granularity: str, end: date) -> date:
+    count = DEFAULT_PERIODS[granularity]
+    if granularity == "day":
+        return end - timedelta(days=count - 1)
+    if granularity == "week":
+        return end - timedelta(weeks=count - 1)
+    start = month_start(end)
+    for _ in range(count - 1):
+        start = month_start(start - timedelta(days=1))
+    return start
+
+
+def series(buckets: Buckets, keys: List[str], max_points: Optional[int] = None) -> List[Dict[str, Any]]:
+    """One point per period (zero-filled), merged into at most max_points points"""
+    size = math.ceil(len(keys) / max_points) if max_points and len(keys) > max_points else 1
+    points = []
+    for i in range(0, len(keys), size):
+        group = keys[i:i + size]
+        categories: Dict[str, float] = {}
+        count = 0
+        for key in group:
+            kg_by_category, bucket_count = buckets.get(key, ({}, 0))
+            for category, kg in kg_by_category.items():
+                categories[category] = categories.get(category, 0.0) + kg
+            count += bucket_count
+        point = {
+            "period": group[0],
+            "total_co2_saved_kg": round(sum(categories.values()), 3),
+            "actions": count,
+            "categories": {category: round(kg, 3) for category, kg in sorted(categories.items())},
+        }
+        if size > 1:
+            point["end_period"] = group[-1]
+        points.append(point)
+    return points
+
+
+def recent_window(first_day: Optional[str], today: date) -> List[str]:
+    """Days the recent savings rate is averaged over (fewer for new users)"""
+    start = today - timedelta(days=RECENT_RATE_DAYS - 1)
+    if first_day:
+        start = max(start, min(date.fromisoformat(first_day), today))
+    return period_keys("day", start, today)
+
+
+def daily_rate(day_buckets: Buckets, days: List[str]) -> float:
+    """Average kg saved per day over days"""
+    if not days:
+        return 0.0
+    return sum(sum(day_buckets[day][0].values()) for day in days if day in day_buckets) / len(days)
@@ -0,0 +1,137 @@
+"""
+In-process background jobs for work a request doesn't have to wait for.
+
+A fixed pool of worker tasks takes jobs from one bounded asyncio.Queue in
+FIFO order. A job is a plain function or a coroutine function: plain ones run
+on the event loop as soon as a worker picks them up (so two of them never
+interleave, and they run in the order they were submitted), coroutines are
+awaited and can overlap up to the pool size.
+
+submit() never blocks. When the queue is full it returns None and the caller
+decides what that means - skip optional work, or do it inline so the request
+that produced it absorbs the backpressure.
+
+Per-kind counts, queue wait and run time are kept for /api/stats/jobs and
+/metrics.
+"""
+import asyncio
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+import metrics
+
+FINISHED = ("done", "failed")
+
+
+class Job:
+    __slots__ = ("id", "kind", "fn", "args", "status", "result", "submitted_at", "_done")
+
+    def __init__(self, kind: str, fn: Callable, args: tuple):
+        self.id = str(uuid.uuid4())
+        self.kind = kind
+        self.fn = fn
+        self.args = args
+        self.status = "queued"  # queued -> running -> done | failed
+        self.result: Any = None
+        self.submitted_at = time.perf_counter()
+        self._done = asyncio.Event()
+
+    async def wait(self, timeout: float) -> bool:
+        """Wait up to timeout seconds for the job to finish; True if it has"""
+        if self.status not in FINISHED:
+            try:
+                await asyncio.wait_for(self._done.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.status in FINISHED
+
+
+class JobQueue:
+    def __init__(self, name: str, workers: int = 4, max_size: int = 1000):
+        self.name = name
+        self.workers = workers
+        self.max_size = max_size
+        self.running = 0
+        self.counts: Dict[str, Dict[str, int]] = {}  # kind -> submitted/done/failed/rejected
+        self._queue: "asyncio.Queue[Job]" = asyncio.Queue(maxsize=max_size)
+        self._tasks: List[asyncio.Task] = []
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def start(self):
+        """Start the workers on the running event loop"""
+        if self._tasks:
+            return
+        # A queue binds to the first loop that waits on it; start over on this one,
+        # keeping anything submitted before startup
+        queue: "asyncio.Queue[Job]" = asyncio.Queue(maxsize=self.max_size)
+        while not self._queue.empty():
+            queue.put_nowait(self._queue.get_nowait())
+        self._queue = queue
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    def _count(self, kind: str, key: str):
+        counts = self.counts.get(kind)
+        if counts is None:
+            counts = self.counts[kind] = {"submitted": 0, "done": 0, "failed": 0, "rejected": 0}
+        counts[key] += 1
+
+    def submit(self, kind: str, fn: Callable, *args) -> Optional[Job]:
+        """Queue fn(*args); returns the job, or None if the queue is full"""
+        job = Job(kind, fn, args)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self._count(kind, "rejected")
+            return None
+        self._count(kind, "submitted")
+        return job
+
+    async def _work(self):
+        while True:
+            job = await self._queue.get()
+            started = time.perf_counter()
+            metrics.JOB_WAIT.observe(started - job.submitted_at, job.kind)
+            job.status = "running"
+            self.running += 1
+            try:
+                result = job.fn(*job.args)
+                if asyncio.iscoroutine(result):
+                    result = await result
+                job.result = result
+                job.status = "done"
+            except asyncio.CancelledError:
+                job.status = "failed"
+                raise
+            except Exception as e:
+                print(f"Error in {job.kind} job: {e}")
+                metrics.ERRORS.inc(job.kind)
+                job.status = "failed"
+            finally:
+                self.running -= 1
+                self._count(job.kind, job.status)
+                metrics.JOB_DURATION.observe(time.perf_counter() - started, job.kind,
+                                             "ok" if job.status == "done" else "error")
+                job.fn = job.args = None  # Finished jobs are kept around for polling; drop the inputs
+                job._done.set()
+                self._queue.task_done()
+
+    async def close(self):
+        """Stop the workers; jobs still queued are dropped"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "workers": self.workers,
+            "max_size": self.max_size,
+            "depth": self.depth,
+            "running": self.running,
+            "kinds": {kind: dict(counts) for kind, counts in self.counts.items()},
+        }
@@ -0,0 +1,240 @@
+"""
+Append-only journal + snapshot persistence for the in-memory store.
+
+A lighter alternative to the SQLite backend (STORAGE_BACKEND=journal):
+
+- Every mutation (user saved, actions appended, stats saved) is appended to a
+  journal segment as a length-prefixed JSON record with a sequence number.
+  Records are buffered in memory and a background thread writes and fsyncs
+  them in batches, so at most JOURNAL_FSYNC_INTERVAL_MS of writes can be lost.
+  The buffer lock is only held to swap the batch out, never during disk I/O,
+  so the request path doesn't wait on fsync.
+- Periodically the app takes a compact snapshot of users_db, actions_db and
+  global_stats. Taking one marks where the journal rotates to a new segment
+  (the next batch write does it, off the event loop), and once the snapshot is
+  safely on disk the segments it covers are deleted.
+- On startup the latest snapshot is loaded and only the journal tail after it
+  is replayed, so cold start doesn't grow with total history. A torn record at
+  the end of a segment is ignored; a corrupt or malformed one elsewhere is
+  skipped with a warning.
+
+Directory layout:
+    snapshot.json                 latest snapshot (written atomically)
+    journal-000000000001.log      segment whose first record has seq 1
+"""
+import glob
+import json
+import os
+import struct
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+_LENGTH = struct.Struct(">I")
+
+ACTION_COLUMNS = ("id", "user_id", "logged_at", "category", "action_type", "quantity", "co2_saved_kg",
+                  "factor_version")
+SNAPSHOT_CHUNK = 10000
+# What each op's data must be for a record to be replayed
+OP_DATA_TYPES = {"user": dict, "actions": list, "stats": dict}
+
+
+def check_record(record: Any):
+    """Raise ValueError unless a decoded record can be replayed"""
+    if not isinstance(record, dict) or not isinstance(record.get("seq"), int):
+        raise ValueError("missing seq")
+    op, data = record.get("op"), record.get("data")
+    if op not in OP_DATA_TYPES or not isinstance(data, OP_DATA_TYPES[op]):
+        raise ValueError(f"unknown op or malformed data: {op!r}")
+    if op == "user" and not isinstance(data.get("user_id"), str):
+        raise ValueError("user record without a user_id")
+    if op == "actions" and not all(isinstance(r, dict) and all(c in r for c in ACTION_COLUMNS[:-1]) for r in data):
+        raise ValueError("actions record with a malformed action")
+
+
+class JournalStorage:
+    name = "journal"
+
+    def __init__(self, directory: str, fsync_interval_s: float = 0.05, snapshot_interval_s: float = 300):
+        self.directory = directory
+        self.fsync_interval_s = fsync_interval_s
+        self.snapshot_interval_s = snapshot_interval_s
+        self.records_written = 0
+        self.fsyncs = 0
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()  # Guards _seq, _buffer and _rotations
+        self._write_lock = threading.Lock()  # One batch written at a time, in order
+        self._buffer: List[Tuple[int, bytes]] = []  # (seq, encoded record)
+        self._rotations: List[int] = []  # Start a new segment after these seqs (snapshots pending)
+        self._seq = 0
+        self._file = None
+        self._stop = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+
+    # Loading
+
+    def load(self):
+        users: Dict[str, Dict[str, Any]] = {}
+        actions: List[Dict[str, Any]] = []
+        stats = None
+        snapshot_seq = 0
+
+        snapshot_path = os.path.join(self.directory, "snapshot.json")
+        if os.path.exists(snapshot_path):
+            with open(snapshot_path, "r") as f:
+                snapshot = json.load(f)
+            snapshot_seq = snapshot["seq"]
+            users = snapshot["users"]
+            columns = snapshot["action_columns"]
+            actions = [dict(zip(columns, row)) for row in snapshot["actions"]]
+            stats = snapshot["stats"]
+
+        # Replay only what happened after the snapshot
+        self._seq = snapshot_seq
+        for path in self._segments():
+            for record in self._read_segment(path):
+                if record["seq"] <= snapshot_seq:
+                    continue
+                self._seq = max(self._seq, record["seq"])
+                if record["op"] == "user":
+                    users[record["data"]["user_id"]] = record["data"]
+                elif record["op"] == "actions":
+                    actions.extend(record["data"])
+                elif record["op"] == "stats":
+                    stats = record["data"]
+
+        self._open_segment(self._seq + 1)
+        self._flusher = threading.Thread(target=self._run_flusher, name="journal-flusher", daemon=True)
+        self._flusher.start()
+        return users, actions, stats
+
+    def _segments(self) -> List[str]:
+        return sorted(glob.glob(os.path.join(self.directory, "journal-*.log")))
+
+    def _read_segment(self, path: str):
+        with open(path, "rb") as f:
+            data = f.read()
+        offset = 0
+        while offset + _LENGTH.size <= len(data):
+            (length,) = _LENGTH.unpack_from(data, offset)
+            start = offset + _LENGTH.size
+            if start + length > len(data):
+                break  # Torn write at the tail - everything before it is intact
+            offset = start + length
+            try:
+                record = json.loads(data[start:offset])
+                check_record(record)
+            except ValueError as e:
+                print(f"WARNING: skipping corrupt journal record at byte {start - _LENGTH.size} of {path}: {e}")
+                continue
+            yield record
+
+    def _open_segment(self, first_seq: int):
+        path = os.path.join(self.directory, f"journal-{first_seq:012d}.log")
+        self._file = open(path, "ab")
+
+    # Writes (request path: serialize and buffer only)
+
+    def _append(self, op: str, data: Any):
+        with self._lock:
+            self._seq += 1
+            payload = json.dumps({"seq": self._seq, "op": op, "data": data}).encode()
+            self._buffer.append((self._seq, _LENGTH.pack(len(payload)) + payload))
+
+    def save_user(self, user: Dict[str, Any]):
+        self._append("user", user)
+
+    def append_actions(self, records: List[Dict[str, Any]]):
+        if records:
+            self._append("actions", records)
+
+    def save_stats(self, stats: Dict[str, Any]):
+        self._append("stats", stats)
+
+    def _take_buffer(self) -> Tuple[List[Tuple[int, bytes]], List[int]]:
+        with self._lock:
+            buffer, self._buffer = self._buffer, []
+            rotations, self._rotations = self._rotations, []
+            return buffer, rotations
+
+    def _write(self, buffer: List[Tuple[int, bytes]], rotations: List[int]):
+        """Write records, rotating segments after the given seqs - caller holds the write lock"""
+        if self._file is None:
+            return
+        start = 0
+        for rotate_after in rotations:
+            end = start
+            while end < len(buffer) and buffer[end][0] <= rotate_after:
+                end += 1
+            self._write_records(buffer[start:end])
+            self._file.close()
+            self._open_segment(rotate_after + 1)
+            start = end
+        self._write_records(buffer[start:])
+
+    def _write_records(self, buffer: List[Tuple[int, bytes]]):
+        if not buffer:
+            return
+        self._file.write(b"".join(record for _, record in buffer))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.records_written += len(buffer)
+        self.fsyncs += 1
+
+    def _run_flusher(self):
+        while not self._stop.wait(self.fsync_interval_s):
+            self.flush()
+
+    def flush(self):
+        with self._write_lock:
+            self._write(*self._take_buffer())
+
+    def close(self):
+        self._stop.set()
+        if self._flusher is not None:
+            self._flusher.join()
+        with self._write_lock:
+            self._write(*self._take_buffer())
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    # Snapshots
+
+    def begin_snapshot(self) -> int:
+        """Return the seq the snapshot will cover (no I/O, so it's safe on the event loop).
+
+        Records appended from here on have a higher seq; the next write puts
+        them in a new segment.
+        """
+        with self._lock:
+            self._rotations.append(self._seq)
+            return self._seq
+
+    def write_snapshot(self, seq: int, users_json: str, actions: Sequence[Dict[str, Any]], stats: Dict[str, Any]):
+        """Write a snapshot covering everything up to seq, then drop old segments.
+
+        users_json is pre-serialized by the caller because user dicts keep
+        changing on the event loop; action records never change once logged.
+        """
+        self.flush()  # Everything up to seq on disk, and the segment rotated
+        path = os.path.join(self.directory, "snapshot.json")
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(f'{{"seq": {seq}, "stats": {json.dumps(stats)}, "users": {users_json}, ')
+            f.write(f'"action_columns": {json.dumps(ACTION_COLUMNS)}, "actions": [')
+            # Serialize in chunks: fast like one big dumps, without one giant string
+            for start in range(0, len(actions), SNAPSHOT_CHUNK):
+                rows = [[record.get(c) for c in ACTION_COLUMNS] for record in actions[start:start + SNAPSHOT_CHUNK]]
+                if start:
+                    f.write(",")
+                f.write(json.dumps(rows)[1:-1])
+            f.write("]}")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+        current = f"journal-{seq + 1:012d}.log"
+        for segment in self._segments():
+            if os.path.basename(segment) < current:
+                os.remove(segment)
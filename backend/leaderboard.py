@@ -0,0 +1,203 @@
+"""
+Incrementally maintained leaderboards: CO2 saved by user, college, city and
+country, for all time, the current ISO week and the current day.
+
+Every logged action adds its kg to one score per (window, dimension) as it is
+recorded, so reading a leaderboard never touches actions_db. Each board keeps
+its scores sorted (in blocks, see RankedScores), which makes top-K a slice and
+any key's rank a bisect, and keeps updates cheap with hundreds of thousands of
+keys. Writes are summed per key and ordered lazily, so a bulk load is one
+sort per board.
+
+Day and week boards are bucketed by calendar period (local time), and buckets
+older than days_kept / weeks_kept are dropped as new ones appear.
+"""
+from bisect import bisect_left, insort
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+DIMENSIONS = ("user", "college", "city", "country")
+WINDOWS = ("all", "week", "day")
+
+# (keys by dimension, always including "user"; kg saved; when) for one action
+Entry = Tuple[Dict[str, str], float, datetime]
+
+
+def week_key(day: date) -> str:
+    year, week, _ = day.isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+def period_key(window: str, day: date) -> str:
+    if window == "day":
+        return day.isoformat()
+    if window == "week":
+        return week_key(day)
+    return "all"
+
+
+def oldest_periods(days_kept: int, weeks_kept: int, today: Optional[date] = None) -> Dict[str, str]:
+    """Oldest day and week period still kept (period keys sort chronologically)"""
+    today = today or date.today()
+    return {
+        "day": (today - timedelta(days=days_kept - 1)).isoformat(),
+        "week": week_key(today - timedelta(weeks=weeks_kept - 1)),
+    }
+
+
+def sum_entries(entries: Iterable[Entry], oldest: Dict[str, str]) -> Dict[Tuple[str, str, str], Dict[str, float]]:
+    """Fold a batch of entries into per-board, per-key deltas.
+
+    Sums per user first and rolls those up into the groups, which is far
+    fewer dict updates than adding every action to every board.
+    """
+    per_user: Dict[Tuple[str, str], Dict[str, float]] = {}  # (window, period) -> user -> kg
+    groups_by_user: Dict[str, Dict[str, str]] = {}
+    periods_by_day: Dict[date, List[Tuple[str, str]]] = {}
+    for groups, kg, when in entries:
+        user = groups["user"]
+        groups_by_user[user] = groups
+        day = when.date()
+        periods = periods_by_day.get(day)
+        if periods is None:
+            # Backfilled actions outside the kept windows only count all-time
+            periods = periods_by_day[day] = [
+                (window, period_key(window, day)) for window in WINDOWS
+                if window == "all" or period_key(window, day) >= oldest[window]
+            ]
+        for board_period in periods:
+            totals = per_user.get(board_period)
+            if totals is None:
+                totals = per_user[board_period] = {}
+            totals[user] = totals.get(user, 0.0) + kg
+
+    deltas: Dict[Tuple[str, str, str], Dict[str, float]] = {}
+    for (window, period), totals in per_user.items():
+        deltas[(window, period, "user")] = totals
+        for user, kg in totals.items():
+            for dimension, key in groups_by_user[user].items():
+                if dimension == "user":
+                    continue
+                board = deltas.get((window, period, dimension))
+                if board is None:
+                    board = deltas[(window, period, dimension)] = {}
+                board[key] = board.get(key, 0.0) + kg
+    return deltas
+
+
+class RankedScores:
+    """Scores by key, kept in descending order for O(k) top-K and ~O(log n) rank.
+
+    Writes only update the scores; changed keys are re-placed in the order on
+    the next read (a bulk load with no reads in between is one sort). The
+    order is a list of short sorted blocks (the sortedcontainers layout), so
+    moving one key shifts at most 2 * BLOCK entries, not the whole board.
+    """
+    __slots__ = ("scores", "_pending", "_blocks", "_maxes")
+
+    BLOCK = 512
+
+    def __init__(self):
+        self.scores: Dict[str, float] = {}
+        self._pending: Dict[str, Optional[float]] = {}  # Changed key -> score it's ordered by (None if new)
+        self._blocks: List[List[Tuple[float, str]]] = []  # (-score, key), ties broken by key
+        self._maxes: List[Tuple[float, str]] = []  # Last entry of each block
+
+    def add_many(self, deltas: Dict[str, float]):
+        scores, pending = self.scores, self._pending
+        for key, delta in deltas.items():
+            old = scores.get(key)
+            if key not in pending:
+                pending[key] = old
+            scores[key] = delta if old is None else old + delta
+
+    def _insert(self, item: Tuple[float, str]):
+        if not self._blocks:
+            self._blocks.append([item])
+            self._maxes.append(item)
+            return
+        i = min(bisect_left(self._maxes, item), len(self._blocks) - 1)
+        block = self._blocks[i]
+        insort(block, item)
+        self._maxes[i] = block[-1]
+        if len(block) > 2 * self.BLOCK:
+            self._blocks[i:i + 1] = [block[:self.BLOCK], block[self.BLOCK:]]
+            self._maxes[i:i + 1] = [block[self.BLOCK - 1], block[-1]]
+
+    def _remove(self, item: Tuple[float, str]):
+        i = bisect_left(self._maxes, item)
+        block = self._blocks[i]
+        del block[bisect_left(block, item)]
+        if block:
+            self._maxes[i] = block[-1]
+        else:
+            del self._blocks[i], self._maxes[i]
+
+    def _flush(self):
+        """Bring the order up to date with the scores"""
+        pending = self._pending
+        if not pending:
+            return
+        if len(pending) * 8 >= len(self.scores):
+            order = sorted((-score, key) for key, score in self.scores.items())
+            self._blocks = [order[i:i + self.BLOCK] for i in range(0, len(order), self.BLOCK)]
+            self._maxes = [block[-1] for block in self._blocks]
+        else:
+            for key, old in pending.items():
+                if old is not None:
+                    self._remove((-old, key))
+                self._insert((-self.scores[key], key))
+        pending.clear()
+
+    def top(self, k: int) -> List[Tuple[str, float]]:
+        self._flush()
+        result = []
+        for block in self._blocks:
+            for negative, key in block[:k - len(result)]:
+                result.append((key, -negative))
+            if len(result) >= k:
+                break
+        return result
+
+    def rank(self, key: str) -> Optional[int]:
+        score = self.scores.get(key)
+        if score is None:
+            return None
+        self._flush()
+        item = (-score, key)
+        i = bisect_left(self._maxes, item)
+        return sum(len(block) for block in self._blocks[:i]) + bisect_left(self._blocks[i], item) + 1
+
+    def __len__(self) -> int:
+        return len(self.scores)
+
+
+class Leaderboards:
+    def __init__(self, days_kept: int = 8, weeks_kept: int = 3):
+        self.days_kept = days_kept
+        self.weeks_kept = weeks_kept
+        self._boards: Dict[Tuple[str, str, str], RankedScores] = {}  # (window, period, dimension)
+
+    def add_many(self, entries: Iterable[Entry]):
+        oldest = oldest_periods(self.days_kept, self.weeks_kept)
+        for board_key, per_key in sum_entries(entries, oldest).items():
+            board = self._boards.get(board_key)
+            if board is None:
+                board = self._boards[board_key] = RankedScores()
+            board.add_many(per_key)
+        # Drop expired day/week buckets
+        for window, period, dimension in list(self._boards):
+            if window != "all" and period < oldest[window]:
+                del self._boards[(window, period, dimension)]
+
+    def top(self, dimension: str, window: str, limit: int, period: Optional[str] = None) -> List[Dict[str, Any]]:
+        board = self._boards.get((window, period or period_key(window, date.today()), dimension))
+        if board is None:
+            return []
+        return [{"rank": i + 1, "key": key, "co2_saved_kg": kg} for i, (key, kg) in enumerate(board.top(limit))]
+
+    def rank(self, dimension: str, window: str, key: str, period: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        board = self._boards.get((window, period or period_key(window, date.today()), dimension))
+        if board is None or key not in board.scores:
+            return None
+        return {"rank": board.rank(key), "key": key, "co2_saved_kg": board.scores[key], "of": len(board)}
@@ -0,0 +1,313 @@
+"""
+Async LLM layer for CarbonBuddy.
+
+All calls to the Dedalus (OpenAI-compatible) endpoint go through here so the
+uvicorn event loop never blocks on a network round trip. One AsyncOpenAI client
+is shared per process with a bounded httpx connection pool, and a semaphore caps
+how many completions can be in flight at once.
+
+Transient failures (timeouts, connection errors, 429s and 5xxs) are retried with
+jittered exponential backoff, within an overall deadline per call. A circuit
+breaker counts consecutive failures; once it opens, calls raise LLMUnavailable
+immediately instead of waiting on a dead endpoint, and callers fall back to
+local behavior. After a cooldown one probe call is let through (half-open) and
+its result closes or re-opens the circuit.
+
+Tunable with environment variables:
+    LLM_MAX_CONCURRENCY     max in-flight completions per process (default 32)
+    LLM_MAX_CONNECTIONS     size of the HTTP connection pool (default 64)
+    LLM_MAX_KEEPALIVE       idle keep-alive connections kept open (default 16)
+    LLM_TIMEOUT_S           default per-attempt timeout in seconds (default 30)
+    LLM_CONNECT_TIMEOUT_S   TCP/TLS connect timeout in seconds (default 5)
+    LLM_DEADLINE_S          total time for a call, retries included (default 45)
+    LLM_MAX_RETRIES         retries after the first attempt (default 2)
+    LLM_RETRY_BASE_MS       first backoff ceiling; doubles per retry (default 250)
+    LLM_RETRY_MAX_MS        largest backoff ceiling (default 4000)
+    LLM_BREAKER_FAILURES    consecutive failures that open the circuit (default 5)
+    LLM_BREAKER_COOLDOWN_S  how long it stays open before a probe (default 30)
+"""
+import asyncio
+import os
+import random
+import time
+from typing import AsyncIterator, Dict, List, Optional
+
+import httpx
+from openai import (APIConnectionError, APIStatusError, APITimeoutError, AsyncOpenAI,
+                    DefaultAsyncHttpxClient)
+
+import metrics
+import prompts
+
+MODEL = "anthropic/claude-sonnet-4-5-20250929"
+BASE_URL = os.environ.get("DEDALUS_BASE_URL", "https://api.dedaluslabs.ai/v1")
+
+MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", "32"))
+MAX_CONNECTIONS = int(os.environ.get("LLM_MAX_CONNECTIONS", "64"))
+MAX_KEEPALIVE = int(os.environ.get("LLM_MAX_KEEPALIVE", "16"))
+TIMEOUT_S = float(os.environ.get("LLM_TIMEOUT_S", "30"))
+CONNECT_TIMEOUT_S = float(os.environ.get("LLM_CONNECT_TIMEOUT_S", "5"))
+DEADLINE_S = float(os.environ.get("LLM_DEADLINE_S", "45"))
+MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", "2"))
+RETRY_BASE_S = float(os.environ.get("LLM_RETRY_BASE_MS", "250")) / 1000
+RETRY_MAX_S = float(os.environ.get("LLM_RETRY_MAX_MS", "4000")) / 1000
+BREAKER_FAILURES = int(os.environ.get("LLM_BREAKER_FAILURES", "5"))
+BREAKER_COOLDOWN_S = float(os.environ.get("LLM_BREAKER_COOLDOWN_S", "30"))
+
+_client: Optional[AsyncOpenAI] = None
+_semaphore: Optional[asyncio.Semaphore] = None
+
+
+class LLMUnavailable(Exception):
+    """Raised without calling the endpoint while the circuit is open"""
+
+
+class CircuitBreaker:
+    """closed -> open after N consecutive failures -> half-open after a cooldown.
+
+    Half-open lets a single probe through; its success closes the circuit,
+    its failure opens it for another cooldown.
+    """
+    STATES = ("closed", "half_open", "open")
+
+    def __init__(self, failure_threshold: int, cooldown_s: float):
+        self.failure_threshold = failure_threshold
+        self.cooldown_s = cooldown_s
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self.rejected = 0
+        self._probing = False
+
+    def available(self) -> bool:
+        """Would a call be let through right now (without claiming the probe)"""
+        if self.state == "closed":
+            return True
+        if self.state == "open":
+            return time.monotonic() - self.opened_at >= self.cooldown_s
+        return not self._probing
+
+    def allow(self) -> bool:
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.cooldown_s:
+            self.state = "half_open"
+        if self.state == "closed":
+            return True
+        if self.state == "half_open" and not self._probing:
+            self._probing = True
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self):
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self._probing = False
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+            if self.state != "open":
+                self.times_opened += 1
+                print(f"LLM circuit opened after {self.consecutive_failures} consecutive failures")
+            self.state = "open"
+            self.opened_at = time.monotonic()
+        self._probing = False
+
+    def release(self):
+        """The call ended without telling us anything (e.g. it was cancelled)"""
+        self._probing = False
+
+    def get_stats(self) -> Dict[str, object]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "times_opened": self.times_opened,
+            "rejected_calls": self.rejected,
+            "retry_in_s": round(max(0.0, self.cooldown_s - (time.monotonic() - self.opened_at)), 1)
+            if self.state == "open" else 0.0,
+        }
+
+
+breaker = CircuitBreaker(BREAKER_FAILURES, BREAKER_COOLDOWN_S)
+retries: Dict[str, int] = {}  # kind -> retry attempts made
+
+
+def available() -> bool:
+    """False while the circuit is open - callers can skip straight to local behavior"""
+    return breaker.available()
+
+
+def get_stats() -> Dict[str, object]:
+    return {**breaker.get_stats(), "retries": dict(retries)}
+
+
+def get_client() -> AsyncOpenAI:
+    """Return the shared async client, creating it on first use"""
+    global _client
+    if _client is None:
+        http_client = DefaultAsyncHttpxClient(
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_KEEPALIVE,
+            ),
+            timeout=httpx.Timeout(TIMEOUT_S, connect=CONNECT_TIMEOUT_S),
+        )
+        _client = AsyncOpenAI(
+            api_key=os.environ.get("DEDALUS_API_KEY", ""),
+            base_url=BASE_URL,
+            http_client=http_client,
+            max_retries=0,  # _create retries itself, within the deadline and the breaker
+        )
+    return _client
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+    return _semaphore
+
+
+def _outcome(error: BaseException) -> str:
+    if isinstance(error, (APITimeoutError, asyncio.TimeoutError)):
+        return "timeout"
+    if isinstance(error, (asyncio.CancelledError, GeneratorExit)):
+        return "cancelled"
+    if isinstance(error, LLMUnavailable):
+        return "rejected"
+    return "error"
+
+
+def _retryable(error: BaseException) -> bool:
+    """Worth another attempt: timeouts, connection errors, rate limits and server errors"""
+    if isinstance(error, (APITimeoutError, APIConnectionError, asyncio.TimeoutError)):
+        return True
+    return isinstance(error, APIStatusError) and (error.status_code == 429 or error.status_code >= 500)
+
+
+def _backoff_s(attempt: int) -> float:
+    """Full jitter: uniform between 0 and the exponential ceiling"""
+    return random.uniform(0, min(RETRY_MAX_S, RETRY_BASE_S * 2 ** attempt))
+
+
+async def _create(kind: str, timeout: Optional[float], hold: bool = False, **kwargs):
+    """chat.completions.create with retries, an overall deadline and the breaker.
+
+    Only the request itself is retried; for streams that's up to the response
+    headers, never after tokens have been handed to the caller. With hold, a
+    successful call returns still holding a semaphore slot (for the stream
+    body); the caller releases it.
+    """
+    if not breaker.allow():
+        raise LLMUnavailable("LLM circuit is open")
+    semaphore = _get_semaphore()
+    deadline = time.monotonic() + DEADLINE_S
+    attempt = 0
+    while True:
+        try:
+            # Waiting for a free slot counts against the deadline too
+            await asyncio.wait_for(semaphore.acquire(), max(0.0, deadline - time.monotonic()))
+        except BaseException:
+            breaker.release()  # Never reached the endpoint
+            raise
+        remaining = deadline - time.monotonic()
+        try:
+            response = await get_client().chat.completions.create(
+                model=MODEL,
+                timeout=max(0.1, min(timeout if timeout is not None else TIMEOUT_S, remaining)),
+                **kwargs,
+            )
+            if not hold:
+                semaphore.release()
+            return response
+        except BaseException as e:
+            semaphore.release()
+            if not isinstance(e, Exception):
+                breaker.release()  # Cancelled: says nothing about the endpoint
+                raise
+            if not _retryable(e):
+                breaker.release()
+                raise
+            delay = _backoff_s(attempt)
+            if attempt >= MAX_RETRIES or time.monotonic() + delay >= deadline or breaker.state != "closed":
+                breaker.record_failure()
+                raise
+            attempt += 1
+            retries[kind] = retries.get(kind, 0) + 1
+            metrics.LLM_RETRIES.inc(kind)
+            await asyncio.sleep(delay)
+
+
+async def complete(messages: List[Dict[str, str]], max_tokens: int = 1000,
+                   timeout: Optional[float] = None, kind: str = "other") -> str:
+    """Run one chat completion and return the text of the first choice.
+
+    kind labels the call (classification, reply, onboarding) for prompt stats and metrics.
+    """
+    prompt_tokens = prompts.record_prompt(kind, messages)
+    start = time.perf_counter()
+    response = None
+    try:
+        response = await _create(kind, timeout, max_tokens=max_tokens, messages=messages)
+        content = response.choices[0].message.content
+    except BaseException as e:
+        if response is not None:
+            # _create settled the breaker for its own failures; this is a bad response (e.g. no choices)
+            if isinstance(e, Exception):
+                breaker.record_failure()
+            else:
+                breaker.release()
+        metrics.LLM_CALL_DURATION.observe(time.perf_counter() - start, kind, _outcome(e))
+        raise
+    breaker.record_success()
+    metrics.LLM_CALL_DURATION.observe(time.perf_counter() - start, kind, "ok")
+
+    # Prefer the provider's token counts, fall back to our estimate
+    usage = getattr(response, "usage", None)
+    metrics.LLM_PROMPT_TOKENS.inc(kind, amount=getattr(usage, "prompt_tokens", None) or prompt_tokens)
+    metrics.LLM_COMPLETION_TOKENS.inc(
+        kind, amount=getattr(usage, "completion_tokens", None) or prompts.estimate_tokens(content or ""))
+    return content
+
+
+async def stream(messages: List[Dict[str, str]], max_tokens: int = 1000,
+                 timeout: Optional[float] = None, kind: str = "other") -> AsyncIterator[str]:
+    """Run a streaming chat completion, yielding text deltas as they arrive"""
+    metrics.LLM_PROMPT_TOKENS.inc(kind, amount=prompts.record_prompt(kind, messages))
+    start = time.perf_counter()
+    completion_chars = 0
+    response = None
+    try:
+        response = await _create(kind, timeout, hold=True, max_tokens=max_tokens, messages=messages, stream=True)
+        async for chunk in response:
+            if chunk.choices and chunk.choices[0].delta.content:
+                if not completion_chars:
+                    metrics.LLM_FIRST_TOKEN.observe(time.perf_counter() - start, kind)
+                completion_chars += len(chunk.choices[0].delta.content)
+                yield chunk.choices[0].delta.content
+    except BaseException as e:
+        # GeneratorExit means the consumer stopped reading (e.g. client disconnected)
+        outcome = _outcome(e)
+        if response is not None:
+            # The request went through; a stream that breaks mid-way still counts against the endpoint
+            if outcome in ("timeout", "error"):
+                breaker.record_failure()
+            else:
+                breaker.release()
+        metrics.LLM_CALL_DURATION.observe(time.perf_counter() - start, kind, outcome)
+        raise
+    finally:
+        if response is not None:
+            _get_semaphore().release()
+        metrics.LLM_COMPLETION_TOKENS.inc(kind, amount=prompts.chars_to_tokens(completion_chars))
+    breaker.record_success()
+    metrics.LLM_CALL_DURATION.observe(time.perf_counter() - start, kind, "ok")
+
+
+async def close():
+    """Close the shared client and its connection pool"""
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
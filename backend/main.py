@@ -1,18 +1,43 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
+from starlette.routing import Match
 from typing import List, Optional, Dict, Any
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+from collections import OrderedDict
+import asyncio
+import hashlib
+import hmac
 import json
+import time
 import uuid
 import os
-from openai import OpenAI
 from dotenv import load_dotenv
 
-# Load environment variables from .env file
+# Load environment variables from .env file (before llm reads its settings)
 load_dotenv()
 
+from aggregates import RollingAggregator
+from broadcast import StatsBroadcaster
+import classifier
+from cache import ClassificationCache
+from factors import FactorRegistry
+import footprint
+import export
+import history
+from jobs import JobQueue
+from leaderboard import DIMENSIONS, WINDOWS, Leaderboards
+import llm
+import metrics
+import onboarding
+import prompts
+import replies
+from static import StaticAssets
+from shared import SharedAggregator, SharedActionStore, SharedDB, SharedLeaderboards, SharedStats, SharedUserStore
+from storage import ACTION_COLUMNS, MemoryStorage, create_storage
+from store import ActionStore
+
 app = FastAPI(title="CarbonBuddy API")
 
 # CORS middleware for frontend
@@ -23,29 +48,272 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(metrics.MetricsMiddleware)
 
-# In-memory database (for hackathon - replace with real DB for production)
-users_db = {}
-actions_db = []
-global_stats = {
+initial_stats = {
     "total_co2_saved_kg": 48520.3,
     "total_actions_logged": 8942,
     "total_users": 847,
     "last_updated": datetime.now().isoformat()
 }
 
-# Load emission factors
-with open('emission_factors.json', 'r') as f:
-    emission_data = json.load(f)
-    EMISSION_FACTORS = {f['action_type']: f for f in emission_data['factors']}
-    EQUIVALENCIES = emission_data['equivalencies']
+# SHARED_STATE=1 keeps counters, users and actions in one SQLite file so that
+# every `uvicorn --workers N` process sees the same state
+SHARED_STATE = os.environ.get("SHARED_STATE", "0") == "1"
+
+if SHARED_STATE:
+    shared_db = SharedDB(os.environ.get("SHARED_STATE_PATH", "carbonbuddy_shared.db"))
+    users_db = SharedUserStore(shared_db)
+    actions_db = SharedActionStore(shared_db)
+    rolling_stats = SharedAggregator(shared_db, window_s=60)
+    leaderboards = SharedLeaderboards(shared_db)
+    global_stats = SharedStats(shared_db, initial_stats)
+    # The shared file is already durable, so there's nothing else to restore from
+    storage = MemoryStorage()
+else:
+    # In-memory database (for hackathon - replace with real DB for production)
+    users_db = {}
+    actions_db = ActionStore()
+    rolling_stats = RollingAggregator(window_s=60)  # Fed by log_action for /api/stats/global
+    leaderboards = Leaderboards()  # Top users/groups by CO2 saved, also fed by log_action
+    global_stats = dict(initial_stats)
+    # Where state is persisted (STORAGE_BACKEND=memory keeps the old behavior)
+    storage = create_storage()
+background_tasks = set()
+
+# Answer common /api/log messages with local rules before calling the LLM
+FAST_CLASSIFIER = os.environ.get("FAST_CLASSIFIER", "1") == "1"
+
+# Remember LLM classifications so repeated messages skip the round trip
+classification_cache = ClassificationCache(
+    max_size=int(os.environ.get("CLASSIFICATION_CACHE_SIZE", "10000")),
+    ttl_s=float(os.environ.get("CLASSIFICATION_CACHE_TTL_S", "86400")),
+    path=os.environ.get("CLASSIFICATION_CACHE_PATH") or None,
+)
+
+# "template" renders /api/log replies locally, "llm" also rephrases every reply
+# with the LLM in the background (clients poll /api/log/reply/{reply_id})
+REPLY_MODE = os.environ.get("REPLY_MODE", "template")
+MAX_PENDING_REPLIES = 10000
+
+# Synthetic data from generate_demo_data.py: loaded into an empty store at
+# startup (SEED_DATA_PATH) or streamed into a running one (POST /api/seed)
+SEED_DATA_PATH = os.environ.get("SEED_DATA_PATH") or None
+SEED_BATCH_SIZE = int(os.environ.get("SEED_BATCH_SIZE", "10000"))
+ALLOW_SEED_ENDPOINT = os.environ.get("ALLOW_SEED_ENDPOINT", "0") == "1"
+
+# /api/export/* streams every user's data, so it's opt-in like /api/seed
+ALLOW_EXPORT_ENDPOINT = os.environ.get("ALLOW_EXPORT_ENDPOINT", "0") == "1"
+
+# /api/ingest applies structured actions in bulk updates of up to this many
+INGEST_BATCH_SIZE = int(os.environ.get("INGEST_BATCH_SIZE", "5000"))
+MAX_INGEST_ERRORS = 100  # Rejected items reported back per request
+# A JSON array is parsed whole, so its size is capped; NDJSON streams and isn't
+MAX_INGEST_JSON_BYTES = int(os.environ.get("MAX_INGEST_JSON_BYTES", str(10 * 1024 * 1024)))
+MAX_CLOCK_SKEW_S = 300  # How far in the future an ingested/seeded logged_at may be
+llm_replies = OrderedDict()  # reply_id -> reply Job, kept for polling
+MAX_REPLY_WAIT_S = 30  # Longest /api/log/reply/{reply_id}?wait_s= long poll
+
+# Work /api/log doesn't wait for. LLM replies get their own worker pool so a
+# slow reply never holds up the aggregate/persistence flushes, which run one
+# at a time (in order) on a single worker.
+reply_jobs = JobQueue("replies", workers=int(os.environ.get("JOB_WORKERS", "16")),
+                      max_size=int(os.environ.get("JOB_QUEUE_SIZE", "1000")))
+update_jobs = JobQueue("updates", workers=1)
+job_queues = (reply_jobs, update_jobs)
+pending_updates: List[Dict[str, Any]] = []  # Logged actions not yet in the aggregates/storage
+
+# Load emission factors (compiled; edits to the file are picked up without a restart)
+factor_registry = FactorRegistry(
+    os.environ.get("EMISSION_FACTORS_PATH") or os.path.join(os.path.dirname(__file__), "emission_factors.json")
+)
+FACTOR_RELOAD_INTERVAL_S = float(os.environ.get("FACTOR_RELOAD_INTERVAL_S", "5"))
+# POST /api/factors/reload re-baselines every user, so it's opt-in like /api/seed
+ALLOW_FACTOR_RELOAD_ENDPOINT = os.environ.get("ALLOW_FACTOR_RELOAD_ENDPOINT", "0") == "1"
+# ...and so does POST /api/footprint/rebaseline
+ALLOW_REBASELINE_ENDPOINT = os.environ.get("ALLOW_REBASELINE_ENDPOINT", "0") == "1"
+MAX_FOOTPRINT_BATCH_SIZE = int(os.environ.get("MAX_FOOTPRINT_BATCH_SIZE", "10000"))  # Profiles per /api/footprint/batch
+
+# The frontend is served from memory, precompressed (edits are picked up without a restart)
+frontend = StaticAssets(
+    os.environ.get("FRONTEND_DIR") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "frontend")
+)
+STATIC_RELOAD_INTERVAL_S = float(os.environ.get("STATIC_RELOAD_INTERVAL_S", "2"))
+# How often a changed classification cache is written to CLASSIFICATION_CACHE_PATH
+CACHE_SAVE_INTERVAL_S = float(os.environ.get("CLASSIFICATION_CACHE_SAVE_INTERVAL_S", "60"))
+
+def leaderboard_groups(user_id: str) -> Dict[str, str]:
+    """Leaderboard keys a user's actions count towards (user_id plus any groups they're in)"""
+    user = users_db.get(user_id) or {}
+    groups = {"user": user_id}
+    for dimension in ("college", "city", "country"):
+        value = user.get(dimension)
+        if isinstance(value, str) and value.strip():
+            groups[dimension] = value.strip()
+    return groups
+
+def add_to_aggregates(records: List[Dict[str, Any]]):
+    """Feed actions to the rolling stats and leaderboards"""
+    groups_by_user: Dict[str, Dict[str, str]] = {}
+    entries = []
+    for record in records:
+        when = datetime.fromisoformat(record["logged_at"])
+        groups = groups_by_user.get(record["user_id"])
+        if groups is None:
+            groups = groups_by_user[record["user_id"]] = leaderboard_groups(record["user_id"])
+        entries.append((groups, record["co2_saved_kg"], when))
+    # One write each per flush in shared mode
+    rolling_stats.add_many((kg, when) for _, kg, when in entries)
+    leaderboards.add_many(entries)
+
+def record_actions(records: List[Dict[str, Any]]):
+    """Add newly logged actions to actions_db; aggregates and storage catch up in the background"""
+    actions_db.extend(records)
+    was_empty = not pending_updates
+    pending_updates.extend(records)
+    # One queued flush covers everything logged until it runs
+    if was_empty and update_jobs.submit("updates", flush_updates) is None:
+        flush_updates()  # Queue full: catch up inline
+
+def flush_updates():
+    """Persist and aggregate the actions logged since the last flush"""
+    if not pending_updates:
+        return
+    records = pending_updates[:]
+    pending_updates.clear()
+    storage.append_actions(records)
+    storage.save_stats(global_stats)
+    add_to_aggregates(records)
+    stats_broadcaster.notify()
 
-# Initialize Dedalus client (OpenAI-compatible)
-client = OpenAI(
-    api_key=os.environ.get("DEDALUS_API_KEY", ""),
-    base_url="https://api.dedaluslabs.ai/v1"
+# One fan-out task pushes stats to every /api/stats/stream subscriber
+stats_broadcaster = StatsBroadcaster(
+    lambda: build_global_stats(),
+    max_rate_hz=float(os.environ.get("STATS_STREAM_MAX_HZ", "2")),
 )
 
+def ndjson(event: Dict[str, Any]) -> bytes:
+    """Encode one event line for the streaming endpoints"""
+    return json.dumps(event).encode() + b"\n"
+
+def save_user(user: Dict[str, Any]):
+    """Persist a user after changing it in place"""
+    if SHARED_STATE:
+        users_db.save(user)
+    storage.save_user(user)
+
+def increment_stats(**deltas: float):
+    """Add to the global counters (atomically across workers in shared mode)"""
+    if SHARED_STATE:
+        global_stats.incr(deltas)
+    else:
+        for key, delta in deltas.items():
+            global_stats[key] += delta
+
+@app.on_event("startup")
+async def startup():
+    for queue in job_queues:
+        queue.start()
+    # Restore persisted state into the in-memory stores
+    users, actions, stats = storage.load()
+    users_db.update(users)
+    for record in actions:
+        actions_db.append(record)
+    add_to_aggregates(actions)
+    if stats and not SHARED_STATE:
+        global_stats.update(stats)
+    if users or actions:
+        print(f"Loaded {len(users)} users and {len(actions)} actions from {storage.name} storage")
+    if SEED_DATA_PATH:
+        if SHARED_STATE:
+            print("Not seeding at startup with SHARED_STATE on (every worker would load it) - use seed.py instead")
+        elif len(users_db) or len(actions_db):
+            print(f"Not seeding from {SEED_DATA_PATH}: the store already has data")
+        else:
+            background_tasks.add(asyncio.create_task(seed_from_file(SEED_DATA_PATH)))
+    if storage.snapshot_interval_s:
+        background_tasks.add(asyncio.create_task(snapshot_loop()))
+    if FACTOR_RELOAD_INTERVAL_S > 0:
+        background_tasks.add(asyncio.create_task(factor_reload_loop()))
+    if STATIC_RELOAD_INTERVAL_S > 0:
+        background_tasks.add(asyncio.create_task(static_reload_loop()))
+    if classification_cache.path and CACHE_SAVE_INTERVAL_S > 0:
+        background_tasks.add(asyncio.create_task(cache_save_loop()))
+    background_tasks.add(asyncio.create_task(stats_broadcaster.run()))
+
+async def take_snapshot():
+    """Snapshot the in-memory state without blocking the event loop on disk I/O"""
+    # Capture a consistent view on the loop: users keep changing, logged actions don't
+    flush_updates()  # Journal everything in actions_db before the snapshot's seq
+    seq = storage.begin_snapshot()
+    users_json = json.dumps(users_db)
+    actions = actions_db.frozen()  # Read lazily by the writer thread; logged rows never change
+    stats = dict(global_stats)
+    await asyncio.to_thread(storage.write_snapshot, seq, users_json, actions, stats)
+
+async def snapshot_loop():
+    while True:
+        await asyncio.sleep(storage.snapshot_interval_s)
+        try:
+            await take_snapshot()
+        except Exception as e:
+            print(f"ERROR taking snapshot: {e}")
+            metrics.ERRORS.inc("snapshot")
+
+async def reload_factors(force: bool = False) -> bool:
+    """Swap in a changed emission_factors.json and re-baseline users against it"""
+    if not factor_registry.reload(force):
+        return False
+    version = factor_registry.table.version
+    # Every worker reloads its own table, but the shared users only need re-baselining once
+    if SHARED_STATE and not shared_db.claim("rebaselined_factor_version", version):
+        print(f"Loaded emission factors version {version} (users re-baselined by another worker)")
+        return True
+    print(f"Loaded emission factors version {version}, re-baselined {await rebaseline_users()} users")
+    return True
+
+async def factor_reload_loop():
+    while True:
+        await asyncio.sleep(FACTOR_RELOAD_INTERVAL_S)
+        await reload_factors()
+
+async def static_reload_loop():
+    while True:
+        await asyncio.sleep(STATIC_RELOAD_INTERVAL_S)
+        try:
+            # Off the event loop: recompressing a changed file takes a while
+            await asyncio.to_thread(frontend.refresh)
+        except Exception as e:
+            print(f"Error reloading frontend files: {e}")
+
+async def cache_save_loop():
+    while True:
+        await asyncio.sleep(CACHE_SAVE_INTERVAL_S)
+        if not classification_cache.dirty:
+            continue
+        try:
+            # Copy the entries on the loop, write them in a thread
+            await asyncio.to_thread(classification_cache.save, classification_cache.snapshot())
+        except OSError as e:
+            classification_cache.dirty = True
+            print(f"Error saving classification cache: {e}")
+
+@app.on_event("shutdown")
+async def shutdown():
+    # Release the pooled LLM connections
+    await llm.close()
+    classification_cache.save()
+    for task in background_tasks:
+        task.cancel()
+    for queue in job_queues:
+        await queue.close()  # Queued LLM replies are dropped
+    flush_updates()
+    if storage.snapshot_interval_s:
+        await take_snapshot()
+    storage.close()
+    if SHARED_STATE:
+        shared_db.close()  # Commit the queued write-behind updates
+
 # Pydantic models
 class OnboardMessage(BaseModel):
     user_id: str
@@ -54,12 +322,14 @@ class OnboardMessage(BaseModel):
 class LogMessage(BaseModel):
     user_id: str
     message: str
+    enhance_reply: bool = False  # Also ask the LLM to rephrase the reply (poll reply_id)
 
 class UserProfile(BaseModel):
     user_id: str
     display_name: Optional[str] = None
     city: Optional[str] = None
     country: Optional[str] = None
+    college: Optional[str] = None
     commute_distance_km: Optional[float] = 0
     commute_mode: Optional[str] = "car_petrol"
     diet_type: Optional[str] = "meat_mixed_meal"
@@ -70,10 +340,22 @@ class UserProfile(BaseModel):
     onboarding_complete: bool = False
     conversation_history: List[Dict[str, str]] = []
 
+class FootprintProfile(BaseModel):
+    commute_distance_km: Optional[float] = 0
+    commute_mode: Optional[str] = "car_petrol"
+    diet_type: Optional[str] = "meat_mixed_meal"
+    meals_per_day: int = 3
+    has_ac: bool = False
+
+class FootprintBatch(BaseModel):
+    profiles: List[FootprintProfile]
+    include_profiles: bool = True  # False returns only the cohort summary
+
 class QuickOnboardData(BaseModel):
     user_id: str
     city: str
     country: Optional[str] = None
+    college: Optional[str] = None
     commuteMode: str
     commuteDistance: int
     foodVibe: str
@@ -82,43 +364,14 @@ class QuickOnboardData(BaseModel):
 
 def get_equivalency(kg_co2: float) -> str:
     """Get tangible equivalency for carbon amount"""
-    thresholds = sorted([float(k) for k in EQUIVALENCIES.keys()], reverse=True)
-    for threshold in thresholds:
-        if kg_co2 >= threshold:
-            return EQUIVALENCIES[str(int(threshold))]
-    return EQUIVALENCIES["1"]
+    return factor_registry.table.equivalency(kg_co2)
 
-def calculate_annual_footprint(profile: UserProfile) -> float:
-    """Calculate estimated annual footprint from profile"""
-    # Transport (250 work days)
-    commute_factor = EMISSION_FACTORS.get(profile.commute_mode, EMISSION_FACTORS["car_petrol"])
-    transport_annual = profile.commute_distance_km * 2 * 250 * commute_factor["emission_factor_kg_co2e"]
-    
-    # Food (365 days)
-    food_factor = EMISSION_FACTORS.get(profile.diet_type, EMISSION_FACTORS["meat_mixed_meal"])
-    food_annual = food_factor["emission_factor_kg_co2e"] * profile.meals_per_day * 365
-    
-    # Home energy (rough estimate)
-    home_annual = 1500  # Average US household baseline
-    if profile.has_ac:
-        home_annual += 500
-    
-    return transport_annual + food_annual + home_annual
+def calculate_annual_footprint(profile: Dict[str, Any]) -> Dict[str, float]:
+    """Estimated annual footprint from profile: total plus transport/food/home"""
+    return footprint.footprint(profile, factor_registry.table.factors)
 
-@app.post("/api/onboard")
-async def onboard(data: OnboardMessage):
-    """Handle onboarding conversation"""
-    user_id = data.user_id
-    
-    # Initialize or get user
-    if user_id not in users_db:
-        users_db[user_id] = UserProfile(user_id=user_id).dict()
-    
-    user = users_db[user_id]
-    user["conversation_history"].append({"role": "user", "content": data.message})
-    
-    # Onboarding prompt
-    onboarding_prompt = """You are CarbonBuddy, a friendly AI climate coach. You are onboarding a new user.
+# Onboarding prompt
+ONBOARDING_PROMPT = """You are CarbonBuddy, a friendly AI climate coach. You are onboarding a new user.
 Your job is to have a SHORT, natural 2-minute conversation to learn about their lifestyle so you can calculate their carbon baseline.
 
 You need to collect:
@@ -157,83 +410,184 @@ When you have all the info, output ONLY a JSON block with:
 }
 
 If not complete yet, just respond conversationally."""
+
+def finish_onboarding(user: Dict[str, Any], response_text: str) -> Optional[Dict[str, Any]]:
+    """Complete onboarding if the LLM reply carries the profile JSON block"""
+    # Check if onboarding is complete (look for JSON)
+    if "{" not in response_text or "onboarding_complete" not in response_text:
+        return None
+    try:
+        # Extract JSON
+        json_start = response_text.index("{")
+        json_end = response_text.rindex("}") + 1
+        profile_data = json.loads(response_text[json_start:json_end])
+    except (ValueError, json.JSONDecodeError):
+        # JSON extraction failed, continue conversation
+        return None
+    
+    if not profile_data.get("onboarding_complete"):
+        return None
+    
+    try:
+        return complete_onboarding(user, profile_data)
+    except ValueError as e:
+        # Fields of the wrong type (pydantic's ValidationError) - keep the conversation going
+        print(f"Ignoring invalid onboarding profile: {e}")
+        return None
+
+def complete_onboarding(user: Dict[str, Any], profile_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Apply the collected profile, compute the baseline and build the final reply.
+
+    Raises ValueError (pydantic's ValidationError) before changing the user if
+    a field can't be coerced to its type, e.g. the LLM's "10" is fine but "ten" isn't.
+    """
+    profile = UserProfile(**{**user, **profile_data}).dict()
+    
+    # Calculate footprint
+    result = calculate_annual_footprint(profile)
+    total = result["total"]
+    
+    # Update user profile
+    user.update(profile_data)
+    user.update(profile)  # The coerced values
+    user["estimated_annual_footprint_kg"] = total
+    user["onboarding_complete"] = True
+    
+    # Add to global users count
+    increment_stats(total_users=1)
+    save_user(user)
+    storage.save_stats(global_stats)
+    
+    # Generate final response with footprint
+    final_response = f"Your estimated annual carbon footprint is {total:,.0f} kg CO2. "
+    
+    # Determine biggest source
+    sources = [("commute", result["transport"]), ("food", result["food"])]
+    sources.sort(key=lambda x: x[1], reverse=True)
+    biggest = sources[0]
+    pct = (biggest[1] / total * 100) if total > 0 else 0
+    
+    final_response += f"Your biggest source is {biggest[0]} at {pct:.0f}%. Now you can just text me anytime you make a climate-friendly choice and I'll track the impact. Try it — tell me what you did today!"
+    
+    return {
+        "response_text": final_response,
+        "onboarding_complete": True,
+        "user_profile": user
+    }
+
+def start_onboarding_turn(data: OnboardMessage) -> Dict[str, Any]:
+    """Get or create the user and record their new onboarding message"""
+    # Initialize or get user
+    if data.user_id not in users_db:
+        users_db[data.user_id] = UserProfile(user_id=data.user_id).dict()
+    
+    user = users_db[data.user_id]
+    user["conversation_history"].append({"role": "user", "content": data.message})
+    return user
+
+def scripted_onboarding_turn(user: Dict[str, Any], message: str) -> Dict[str, Any]:
+    """Onboarding turn from the local question flow (used while the LLM is unavailable)"""
+    response_text, profile_data = onboarding.step(user, message)
+    if profile_data is not None:
+        completed = complete_onboarding(user, profile_data)
+        user["conversation_history"].append({"role": "assistant", "content": completed["response_text"]})
+        save_user(user)
+        return completed
+    user["conversation_history"].append({"role": "assistant", "content": response_text})
+    save_user(user)
+    return {"response_text": response_text, "onboarding_complete": False}
+
+def use_scripted_onboarding(user: Dict[str, Any]) -> bool:
+    # Users who started the scripted flow finish it, even if the LLM is back
+    return "onboarding_flow" in user or not llm.available()
+
+@app.post("/api/onboard")
+async def onboard(data: OnboardMessage):
+    """Handle onboarding conversation"""
+    user = start_onboarding_turn(data)
+    if use_scripted_onboarding(user):
+        return scripted_onboarding_turn(user, data.message)
     
     # Call Claude via Dedalus
-    messages = [{"role": "system", "content": onboarding_prompt}] + user["conversation_history"]
+    messages = [{"role": "system", "content": ONBOARDING_PROMPT}] + prompts.compact_history(user["conversation_history"])
 
     try:
-        response = client.chat.completions.create(
-            model="anthropic/claude-sonnet-4-5-20250929",
-            max_tokens=1000,
-            messages=messages
-        )
-
-        response_text = response.choices[0].message.content
+        response_text = await llm.complete(messages, max_tokens=1000, kind="onboarding")
         user["conversation_history"].append({"role": "assistant", "content": response_text})
+        save_user(user)
         
-        # Check if onboarding is complete (look for JSON)
-        if "{" in response_text and "onboarding_complete" in response_text:
-            try:
-                # Extract JSON
-                json_start = response_text.index("{")
-                json_end = response_text.rindex("}") + 1
-                profile_data = json.loads(response_text[json_start:json_end])
-                
-                if profile_data.get("onboarding_complete"):
-                    # Update user profile
-                    user.update(profile_data)
-                    
-                    # Calculate footprint
-                    temp_profile = UserProfile(**user)
-                    footprint = calculate_annual_footprint(temp_profile)
-                    user["estimated_annual_footprint_kg"] = footprint
-                    user["onboarding_complete"] = True
-                    
-                    # Add to global users count
-                    global_stats["total_users"] += 1
-                    
-                    # Generate final response with footprint
-                    final_response = f"Your estimated annual carbon footprint is {footprint:,.0f} kg CO2. "
-                    
-                    # Determine biggest source
-                    sources = []
-                    commute_factor = EMISSION_FACTORS.get(user["commute_mode"], EMISSION_FACTORS["car_petrol"])
-                    transport_annual = user["commute_distance_km"] * 2 * 250 * commute_factor["emission_factor_kg_co2e"]
-                    sources.append(("commute", transport_annual))
-                    
-                    food_factor = EMISSION_FACTORS.get(user["diet_type"], EMISSION_FACTORS["meat_mixed_meal"])
-                    food_annual = food_factor["emission_factor_kg_co2e"] * user["meals_per_day"] * 365
-                    sources.append(("food", food_annual))
-                    
-                    sources.sort(key=lambda x: x[1], reverse=True)
-                    biggest = sources[0]
-                    pct = (biggest[1] / footprint * 100) if footprint > 0 else 0
-                    
-                    final_response += f"Your biggest source is {biggest[0]} at {pct:.0f}%. Now you can just text me anytime you make a climate-friendly choice and I'll track the impact. Try it — tell me what you did today!"
-                    
-                    return {
-                        "response_text": final_response,
-                        "onboarding_complete": True,
-                        "user_profile": user
-                    }
-            except (ValueError, json.JSONDecodeError) as e:
-                # JSON extraction failed, continue conversation
-                pass
+        completed = finish_onboarding(user, response_text)
+        if completed:
+            return completed
         
         return {
             "response_text": response_text,
             "onboarding_complete": False
         }
         
+    except llm.LLMUnavailable:
+        return scripted_onboarding_turn(user, data.message)
     except Exception as e:
-        # Fallback response if API fails
+        # Carry on with the scripted questions if the API fails
         print(f"ERROR in onboard: {str(e)}")
+        metrics.ERRORS.inc("onboard")
         import traceback
         traceback.print_exc()
-        return {
-            "response_text": "I'm having trouble connecting right now. Let's try again - where are you located?",
-            "onboarding_complete": False
-        }
+        return scripted_onboarding_turn(user, data.message)
+
+@app.post("/api/onboard/stream")
+async def onboard_stream(data: OnboardMessage):
+    """Onboarding turn streamed as NDJSON: token events, then a final done event"""
+    user = start_onboarding_turn(data)
+    messages = [{"role": "system", "content": ONBOARDING_PROMPT}] + prompts.compact_history(user["conversation_history"])
+
+    def scripted_events():
+        result = scripted_onboarding_turn(user, data.message)
+        yield ndjson({"type": "token", "text": result["response_text"]})
+        yield ndjson({"type": "done", **result})
+
+    async def events():
+        if use_scripted_onboarding(user):
+            for event in scripted_events():
+                yield event
+            return
+        response_text = ""
+        sent = 0  # How much of response_text has been forwarded as tokens
+        try:
+            async for delta in llm.stream(messages, max_tokens=1000, kind="onboarding"):
+                response_text += delta
+                # Hold back anything from a "{" on - it may be the profile JSON block,
+                # which the user should never see raw
+                brace = response_text.find("{")
+                visible_end = brace if brace != -1 else len(response_text)
+                if visible_end > sent:
+                    yield ndjson({"type": "token", "text": response_text[sent:visible_end]})
+                    sent = visible_end
+        except Exception as e:
+            if not isinstance(e, llm.LLMUnavailable):
+                print(f"ERROR in onboard stream: {str(e)}")
+                metrics.ERRORS.inc("onboard")
+            if sent:
+                # Part of an LLM reply already went out; start the questions on a new line
+                yield ndjson({"type": "token", "text": "\n\n"})
+            for event in scripted_events():
+                yield event
+            return
+        
+        user["conversation_history"].append({"role": "assistant", "content": response_text})
+        save_user(user)
+        
+        completed = finish_onboarding(user, response_text)
+        if completed:
+            yield ndjson({"type": "done", **completed})
+            return
+        
+        # Not the profile block after all - release what was held back
+        if sent < len(response_text):
+            yield ndjson({"type": "token", "text": response_text[sent:]})
+        yield ndjson({"type": "done", "response_text": response_text, "onboarding_complete": False})
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
 
 @app.post("/api/onboard-quick")
 async def onboard_quick(data: QuickOnboardData):
@@ -264,6 +618,7 @@ async def onboard_quick(data: QuickOnboardData):
         user_id=user_id,
         city=data.city,
         country=data.country,
+        college=data.college,
         commute_distance_km=commute_distance,
         commute_mode=commute_mode,
         diet_type=diet_type,
@@ -274,37 +629,20 @@ async def onboard_quick(data: QuickOnboardData):
     )
 
     # Calculate footprint
-    footprint_annual = calculate_annual_footprint(profile)
+    result = calculate_annual_footprint(profile.dict())
+    footprint_annual = result["total"]
     profile.estimated_annual_footprint_kg = footprint_annual
 
     # Store user profile
     users_db[user_id] = profile.dict()
 
     # Update global stats
-    global_stats["total_users"] += 1
-
-    # Calculate breakdown percentages
-    commute_factor = EMISSION_FACTORS.get(commute_mode, EMISSION_FACTORS["car_petrol"])
-    transport_annual = commute_distance * 2 * 250 * commute_factor["emission_factor_kg_co2e"]
-
-    food_factor = EMISSION_FACTORS.get(diet_type, EMISSION_FACTORS["meat_mixed_meal"])
-    food_annual = food_factor["emission_factor_kg_co2e"] * 3 * 365
-
-    home_annual = 1500
-    if data.hasAC:
-        home_annual += 500
-
-    total = transport_annual + food_annual + home_annual
-
-    breakdown = {
-        "transport": round((transport_annual / total * 100)) if total > 0 else 0,
-        "food": round((food_annual / total * 100)) if total > 0 else 0,
-        "energy": round((home_annual / total * 100)) if total > 0 else 0,
-        "other": 0
-    }
+    increment_stats(total_users=1)
+    storage.save_user(users_db[user_id])
+    storage.save_stats(global_stats)
 
-    # Adjust to ensure total is 100%
-    breakdown["other"] = 100 - breakdown["transport"] - breakdown["food"] - breakdown["energy"]
+    # Breakdown percentages (adding up to 100%)
+    breakdown = footprint.breakdown_percentages(result)
 
     return {
         "baseline": {
@@ -315,27 +653,62 @@ async def onboard_quick(data: QuickOnboardData):
         "user_profile": users_db[user_id]
     }
 
-@app.post("/api/log")
-async def log_action(data: LogMessage):
-    """Log climate actions"""
-    user_id = data.user_id
-    
-    if user_id not in users_db:
-        raise HTTPException(status_code=404, detail="User not found. Please complete onboarding first.")
-    
-    user = users_db[user_id]
-    
-    if not user.get("onboarding_complete"):
-        raise HTTPException(status_code=400, detail="Please complete onboarding first.")
-    
+@app.post("/api/footprint/batch")
+async def footprint_batch(data: FootprintBatch):
+    """Footprints and breakdowns for a cohort of profiles in one vectorized pass"""
+    if len(data.profiles) > MAX_FOOTPRINT_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_FOOTPRINT_BATCH_SIZE} profiles per batch.")
+    batch = footprint.batch_footprints([p.dict() for p in data.profiles], factor_registry.table.factors)
+    response = {"summary": footprint.summarize(batch)}
+    if data.include_profiles:
+        response["footprints"] = [
+            {key: round(batch[key][i], 1) for key in batch} for i in range(len(data.profiles))
+        ]
+    return response
+
+REBASELINE_CHUNK_SIZE = 1000  # Users recomputed between yields to the event loop
+rebaseline_lock = asyncio.Lock()
+
+async def rebaseline_users() -> int:
+    """Recompute every onboarded user's estimated footprint with the current factors.
+
+    Runs in chunks that yield to the event loop, so requests are served meanwhile.
+    """
+    async with rebaseline_lock:
+        user_ids = list(users_db)
+        changed = 0
+        for start in range(0, len(user_ids), REBASELINE_CHUNK_SIZE):
+            # Re-read each chunk: users may have changed while we were yielding
+            users = [users_db.get(user_id) for user_id in user_ids[start:start + REBASELINE_CHUNK_SIZE]]
+            users = [user for user in users if user and user.get("onboarding_complete")]
+            if users:
+                totals = footprint.batch_footprints(users, factor_registry.table.factors)["total"]
+                for user, total in zip(users, totals):
+                    if user.get("estimated_annual_footprint_kg") != total:
+                        user["estimated_annual_footprint_kg"] = total
+                        save_user(user)
+                        changed += 1
+            await asyncio.sleep(0)
+        return changed
+
+@app.post("/api/footprint/rebaseline")
+async def footprint_rebaseline():
+    """Re-baseline all users, e.g. after the emission factors change (needs ALLOW_REBASELINE_ENDPOINT=1)"""
+    if not ALLOW_REBASELINE_ENDPOINT:
+        raise HTTPException(status_code=403,
+                            detail="Re-baselining is disabled. Set ALLOW_REBASELINE_ENDPOINT=1 to enable it.")
+    return {"users_updated": await rebaseline_users()}
+
+async def classify_with_llm(message: str, user: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Ask the LLM to classify a log message into structured actions"""
     # Classification prompt
     classification_prompt = f"""You are parsing a user's natural language message to identify climate actions they took.
 
 USER PROFILE:
-{json.dumps(user, indent=2)}
+{prompts.classification_profile(user)}
 
 USER MESSAGE:
-"{data.message}"
+"{message}"
 
 YOUR TASK:
 Extract every climate-relevant action from this message. For each action, output a structured classification.
@@ -365,107 +738,28 @@ RULES:
 - NEVER estimate carbon numbers. Only classify.
 - Convert miles to km (1 mile = 1.6 km)
 """
-    
-    try:
-        # Call Claude for classification via Dedalus
-        response = client.chat.completions.create(
-            model="anthropic/claude-sonnet-4-5-20250929",
-            max_tokens=1000,
-            messages=[
-                {"role": "system", "content": classification_prompt},
-                {"role": "user", "content": data.message}
-            ]
-        )
 
-        response_text = response.choices[0].message.content
-        
-        # Extract JSON
-        json_start = response_text.index("[")
-        json_end = response_text.rindex("]") + 1
-        classified_actions = json.loads(response_text[json_start:json_end])
-        
-        if len(classified_actions) == 1 and classified_actions[0].get("no_action"):
-            return {
-                "response_text": "I didn't catch a specific climate action in that message. Try telling me something like 'I took the bus today' or 'I had a veggie lunch'!",
-                "actions_logged": [],
-                "total_saved_today": 0,
-                "global_stats": global_stats
-            }
-        
-        # Calculate carbon savings for each action
-        calculated_results = []
-        total_saved = 0
-        
-        for action in classified_actions:
-            action_type = action["action_type"]
-            category = action["category"]
-            quantity = action["quantity"]
-            
-            if action_type not in EMISSION_FACTORS:
-                continue
-            
-            factor = EMISSION_FACTORS[action_type]
-            emission_factor = factor["emission_factor_kg_co2e"]
-            
-            # Calculate baseline vs actual
-            if category == "food":
-                # Baseline is user's usual diet
-                baseline_type = user.get("diet_type", "meat_mixed_meal")
-                baseline_factor = EMISSION_FACTORS[baseline_type]["emission_factor_kg_co2e"]
-                actual = emission_factor * quantity
-                baseline = baseline_factor * quantity
-                saved = max(0, baseline - actual)
-                
-            elif category == "transport":
-                # Baseline is user's usual commute mode
-                baseline_type = user.get("commute_mode", "car_petrol")
-                baseline_factor = EMISSION_FACTORS[baseline_type]["emission_factor_kg_co2e"]
-                actual = emission_factor * quantity
-                baseline = baseline_factor * quantity
-                saved = max(0, baseline - actual)
-                
-            else:
-                # Home energy and lifestyle are already expressed as savings
-                saved = emission_factor * quantity
-                baseline = saved
-                actual = 0
-            
-            total_saved += saved
-            
-            calculated_results.append({
-                "action_type": action_type,
-                "display_name": factor["display_name"],
-                "quantity": quantity,
-                "unit": factor["unit"],
-                "co2_saved_kg": round(saved, 2),
-                "source": factor["source"]
-            })
-            
-            # Store in actions DB
-            action_record = {
-                "id": str(uuid.uuid4()),
-                "user_id": user_id,
-                "logged_at": datetime.now().isoformat(),
-                "category": category,
-                "action_type": action_type,
-                "quantity": quantity,
-                "co2_saved_kg": saved
-            }
-            actions_db.append(action_record)
-        
-        # Update global stats
-        global_stats["total_co2_saved_kg"] += total_saved
-        global_stats["total_actions_logged"] += len(calculated_results)
-        global_stats["last_updated"] = datetime.now().isoformat()
-        
-        # Generate friendly response
-        response_prompt = f"""You are CarbonBuddy, a friendly AI climate coach. The user just logged action(s) and we've calculated the impact. Generate a response.
+    # Call Claude for classification via Dedalus
+    response_text = await llm.complete([
+        {"role": "system", "content": classification_prompt},
+        {"role": "user", "content": message}
+    ], max_tokens=1000, kind="classification")
+
+    # Extract JSON
+    json_start = response_text.index("[")
+    json_end = response_text.rindex("]") + 1
+    return json.loads(response_text[json_start:json_end])
+
+def build_reply_messages(calculated_results: List[Dict[str, Any]], total_saved: float,
+                         collective_kg: float) -> List[Dict[str, str]]:
+    """Messages asking the LLM to phrase the reply for already-calculated actions"""
+    response_prompt = f"""You are CarbonBuddy, a friendly AI climate coach. The user just logged action(s) and we've calculated the impact. Generate a response.
 
 ACTIONS LOGGED AND CALCULATED:
-{json.dumps(calculated_results, indent=2)}
+{prompts.reply_actions(calculated_results)}
 
 COLLECTIVE STATS:
-- Total CO2 saved by all users: {global_stats['total_co2_saved_kg']:.1f} kg
+- Total CO2 saved by all users: {collective_kg:.1f} kg
 - User's total saved from this action: {total_saved:.1f} kg
 
 RESPONSE RULES:
@@ -477,34 +771,522 @@ RESPONSE RULES:
 6. If co2_saved_kg is 0 or very small (<0.1), say "That's your usual — keeping it consistent!" instead of celebrating
 
 Generate ONLY the response text, nothing else."""
-        
-        final_response = client.chat.completions.create(
-            model="anthropic/claude-sonnet-4-5-20250929",
-            max_tokens=500,
-            messages=[
-                {"role": "system", "content": response_prompt},
-                {"role": "user", "content": "Generate the response"}
-            ]
-        )
 
-        response_text = final_response.choices[0].message.content
+    return [
+        {"role": "system", "content": response_prompt},
+        {"role": "user", "content": "Generate the response"}
+    ]
+
+async def generate_llm_reply(calculated_results: List[Dict[str, Any]], total_saved: float,
+                             collective_kg: float) -> str:
+    """Have the LLM phrase the reply for already-calculated actions"""
+    messages = build_reply_messages(calculated_results, total_saved, collective_kg)
+    return await llm.complete(messages, max_tokens=500, kind="reply")
+
+def schedule_llm_reply(calculated_results: List[Dict[str, Any]], total_saved: float,
+                       collective_kg: float) -> Optional[str]:
+    """Queue LLM phrasing of a reply; returns an id to poll for it, or None if the queue is full"""
+    job = reply_jobs.submit("reply", generate_llm_reply, calculated_results, total_saved, collective_kg)
+    if job is None:
+        return None
+    llm_replies[job.id] = job
+    while len(llm_replies) > MAX_PENDING_REPLIES:
+        llm_replies.popitem(last=False)
+    return job.id
+
+def get_onboarded_user(user_id: str) -> Dict[str, Any]:
+    """Look up a user who is allowed to log actions"""
+    if user_id not in users_db:
+        raise HTTPException(status_code=404, detail="User not found. Please complete onboarding first.")
+    
+    user = users_db[user_id]
+    
+    if not user.get("onboarding_complete"):
+        raise HTTPException(status_code=400, detail="Please complete onboarding first.")
+    return user
+
+def calculate_action(user: Dict[str, Any], action_type: str, category: str, quantity: float,
+                     logged_at: Optional[str] = None):
+    """Savings for one action versus the user's baseline.
+    
+    Returns (result for the reply, record for actions_db). action_type must be in the factor table.
+    """
+    table = factor_registry.table  # One version for the whole calculation
+    factor = table.factors[action_type]
+    saved = table.saved_kg(action_type, category, quantity, user)
+    
+    result = {
+        "action_type": action_type,
+        "display_name": factor["display_name"],
+        "quantity": quantity,
+        "unit": factor["unit"],
+        "co2_saved_kg": round(saved, 2),
+        "source": factor["source"]
+    }
+    record = {
+        "id": str(uuid.uuid4()),
+        "user_id": user["user_id"],
+        "logged_at": logged_at or datetime.now().isoformat(),
+        "category": category,
+        "action_type": action_type,
+        "quantity": quantity,
+        "co2_saved_kg": saved,
+        "factor_version": table.version
+    }
+    return result, record
+
+def commit_actions(records: List[Dict[str, Any]]):
+    """Record a batch of calculated actions and update global stats in one go"""
+    record_actions(records)
+    increment_stats(total_co2_saved_kg=sum(r["co2_saved_kg"] for r in records),
+                    total_actions_logged=len(records))
+    global_stats["last_updated"] = datetime.now().isoformat()
+
+async def process_log(message: str, user: Dict[str, Any]):
+    """Classify a log message, calculate savings and record the actions.
+    
+    Returns (calculated_results, total_saved), or None if no climate action was found.
+    """
+    # Cheap local rules first, LLM only when they aren't confident
+    classified_actions = classifier.classify(message, user) if FAST_CLASSIFIER else None
+    if classified_actions is None:
+        classified_actions = classification_cache.get(message, user)
+    if classified_actions is None:
+        classified_actions = await classify_with_llm(message, user)
+        classification_cache.put(message, user, classified_actions)
+    
+    if len(classified_actions) == 1 and classified_actions[0].get("no_action"):
+        return None
+    
+    # Calculate carbon savings for each action
+    calculated_results = []
+    new_records = []
+    total_saved = 0
+    
+    for action in classified_actions:
+        if action["action_type"] not in factor_registry.table:
+            continue
+        result, record = calculate_action(user, action["action_type"], action["category"], action["quantity"])
+        total_saved += record["co2_saved_kg"]
+        calculated_results.append(result)
+        new_records.append(record)
+    
+    commit_actions(new_records)
+    
+    return calculated_results, total_saved
+
+# Only the local classifier is available while the LLM circuit is open
+DEGRADED_LOG_REPLY = "I can only recognize simple actions right now. Try something like 'I took the bus 5 km' or 'I had a vegan lunch'!"
+NO_ACTION_REPLY = "I didn't catch a specific climate action in that message. Try telling me something like 'I took the bus today' or 'I had a veggie lunch'!"
+LOG_ERROR_REPLY = "I had trouble processing that. Could you rephrase what you did today?"
+
+@app.post("/api/log")
+async def log_action(data: LogMessage):
+    """Log climate actions"""
+    user = get_onboarded_user(data.user_id)
+    
+    try:
+        logged = await process_log(data.message, user)
+        if logged is None:
+            return {
+                "response_text": NO_ACTION_REPLY,
+                "actions_logged": [],
+                "total_saved_today": 0,
+                "global_stats": global_stats
+            }
+        calculated_results, total_saved = logged
         
-        return {
+        # Render the reply locally - the numbers are already computed
+        response_text = replies.render(
+            calculated_results, total_saved, get_equivalency(total_saved), global_stats["total_co2_saved_kg"]
+        )
+        result = {
             "response_text": response_text,
             "actions_logged": calculated_results,
             "total_saved_today": round(total_saved, 2),
             "global_stats": global_stats
         }
         
+        # Optionally have the LLM rephrase it in the background (unless it's unavailable or backed up)
+        if (data.enhance_reply or REPLY_MODE == "llm") and llm.available():
+            reply_id = schedule_llm_reply(calculated_results, total_saved, global_stats["total_co2_saved_kg"])
+            if reply_id:
+                result["reply_id"] = reply_id
+        
+        return result
+        
+    except llm.LLMUnavailable:
+        return {
+            "response_text": DEGRADED_LOG_REPLY,
+            "actions_logged": [],
+            "total_saved_today": 0,
+            "global_stats": global_stats
+        }
     except Exception as e:
         print(f"Error: {e}")
+        metrics.ERRORS.inc("log")
         return {
-            "response_text": f"I had trouble processing that. Could you rephrase what you did today?",
+            "response_text": LOG_ERROR_REPLY,
             "actions_logged": [],
             "total_saved_today": 0,
             "global_stats": global_stats
         }
 
+@app.post("/api/log/stream")
+async def log_action_stream(data: LogMessage):
+    """Log climate actions, streamed as NDJSON.
+    
+    Emits an "actions" event as soon as savings are calculated, then the reply
+    as "token" events (LLM tokens when enhance_reply/REPLY_MODE=llm, otherwise
+    the local template in one piece), then a final "done" event.
+    """
+    user = get_onboarded_user(data.user_id)
+
+    async def events():
+        try:
+            logged = await process_log(data.message, user)
+        except Exception as e:
+            reply = DEGRADED_LOG_REPLY
+            if not isinstance(e, llm.LLMUnavailable):
+                print(f"Error: {e}")
+                metrics.ERRORS.inc("log")
+                reply = LOG_ERROR_REPLY
+            yield ndjson({"type": "actions", "actions_logged": [], "total_saved_today": 0, "global_stats": global_stats})
+            yield ndjson({"type": "token", "text": reply})
+            yield ndjson({"type": "done", "response_text": reply})
+            return
+        
+        if logged is None:
+            yield ndjson({"type": "actions", "actions_logged": [], "total_saved_today": 0, "global_stats": global_stats})
+            yield ndjson({"type": "token", "text": NO_ACTION_REPLY})
+            yield ndjson({"type": "done", "response_text": NO_ACTION_REPLY})
+            return
+        
+        calculated_results, total_saved = logged
+        collective_kg = global_stats["total_co2_saved_kg"]
+        yield ndjson({
+            "type": "actions",
+            "actions_logged": calculated_results,
+            "total_saved_today": round(total_saved, 2),
+            "global_stats": global_stats
+        })
+        
+        response_text = ""
+        if (data.enhance_reply or REPLY_MODE == "llm") and llm.available():
+            try:
+                async for delta in llm.stream(build_reply_messages(calculated_results, total_saved, collective_kg),
+                                              max_tokens=500, kind="reply"):
+                    response_text += delta
+                    yield ndjson({"type": "token", "text": delta})
+            except Exception as e:
+                print(f"Error streaming LLM reply: {e}")
+                metrics.ERRORS.inc("reply")
+        if not response_text:
+            response_text = replies.render(calculated_results, total_saved, get_equivalency(total_saved), collective_kg)
+            yield ndjson({"type": "token", "text": response_text})
+        yield ndjson({"type": "done", "response_text": response_text})
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+@app.get("/api/log/reply/{reply_id}")
+async def get_llm_reply(reply_id: str, wait_s: float = 0):
+    """Poll for the LLM-phrased version of a /api/log reply (wait_s holds the request until it's ready)"""
+    job = llm_replies.get(reply_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Reply not found")
+    if wait_s > 0:
+        await job.wait(min(wait_s, MAX_REPLY_WAIT_S))
+    status = {"done": "ready", "failed": "failed"}.get(job.status, "pending")
+    return {"status": status, "response_text": job.result if status == "ready" else None}
+
+async def body_lines(request: Request):
+    """Yield (line number, line) for the non-blank lines of a streamed body"""
+    buffer = b""
+    line_no = 0
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            line_no += 1
+            if line.strip():
+                yield line_no, line
+    if buffer.strip():
+        yield line_no + 1, buffer
+
+async def ingest_items(request: Request):
+    """Yield (position, item) from a JSON array/object body or an NDJSON stream"""
+    if "ndjson" in request.headers.get("content-type", ""):
+        # Parse line by line as the body streams in
+        async for line_no, line in body_lines(request):
+            yield line_no, line
+        return
+    
+    raw = bytearray()
+    async for chunk in request.stream():
+        raw += chunk
+        if len(raw) > MAX_INGEST_JSON_BYTES:
+            raise HTTPException(status_code=413, detail=(
+                f"JSON bodies are limited to {MAX_INGEST_JSON_BYTES} bytes. "
+                "Send larger uploads as NDJSON (Content-Type: application/x-ndjson)."))
+    body = await asyncio.to_thread(json.loads, raw)  # Parsing a big array would stall other requests
+    items = body.get("actions", []) if isinstance(body, dict) else body
+    for index, item in enumerate(items):
+        yield index, item
+
+def local_timestamp(value: str) -> str:
+    """Parse an ISO date/datetime as stored: local and naive (raises ValueError)"""
+    when = datetime.fromisoformat(value)
+    if when.tzinfo is not None:
+        when = when.astimezone().replace(tzinfo=None)
+    return when.isoformat()
+
+def action_timestamp(value: Any) -> str:
+    """Normalize an action's logged_at, rejecting times in the future (beyond clock skew)"""
+    if not isinstance(value, str):
+        raise ValueError("logged_at must be an ISO datetime")
+    logged_at = local_timestamp(value)
+    if datetime.fromisoformat(logged_at) > datetime.now() + timedelta(seconds=MAX_CLOCK_SKEW_S):
+        raise ValueError(f"logged_at is in the future: {value!r}")
+    return logged_at
+
+def validate_action_fields(item: Any):
+    """Checks shared by ingested and seeded actions; returns (action_type, quantity)"""
+    if not isinstance(item, dict):
+        raise ValueError("expected an object")
+    action_type = item.get("action_type")
+    if action_type not in factor_registry.table:
+        raise ValueError(f"unknown action_type: {action_type!r}")
+    quantity = item.get("quantity")
+    if isinstance(quantity, bool) or not isinstance(quantity, (int, float)) or not 0 <= quantity < float("inf"):
+        raise ValueError("quantity must be a non-negative number")
+    return action_type, quantity
+
+def validate_ingest_item(item: Any, users: Dict[str, Optional[Dict[str, Any]]]):
+    """Check one structured action; returns (user, action_type, quantity, logged_at)"""
+    action_type, quantity = validate_action_fields(item)
+    
+    user_id = item.get("user_id")
+    if user_id not in users:
+        users[user_id] = users_db.get(user_id) if isinstance(user_id, str) else None
+    user = users[user_id]
+    if user is None or not user.get("onboarding_complete"):
+        raise ValueError(f"unknown or not onboarded user: {user_id!r}")
+    
+    logged_at = item.get("logged_at")
+    if logged_at is not None:
+        logged_at = action_timestamp(logged_at)
+    return user, action_type, quantity, logged_at
+
+@app.post("/api/ingest")
+async def ingest_actions(request: Request):
+    """Bulk-ingest pre-classified actions (no LLM involved).
+    
+    Body is a JSON array (or {"actions": [...]}) or NDJSON with
+    Content-Type: application/x-ndjson. Each action is
+    {"user_id", "action_type", "quantity", "logged_at"?}.
+    """
+    users: Dict[str, Optional[Dict[str, Any]]] = {}  # Looked up once per request
+    pending: List[Dict[str, Any]] = []
+    accepted = 0
+    total_saved = 0.0
+    errors = []
+    rejected = 0
+    
+    try:
+        async for position, item in ingest_items(request):
+            try:
+                if isinstance(item, bytes):
+                    item = json.loads(item)
+                user, action_type, quantity, logged_at = validate_ingest_item(item, users)
+            except (ValueError, TypeError) as e:
+                rejected += 1
+                if len(errors) < MAX_INGEST_ERRORS:
+                    errors.append({"position": position, "error": str(e)})
+                continue
+            
+            category = factor_registry.table.factors[action_type]["category"]
+            _, record = calculate_action(user, action_type, category, quantity, logged_at)
+            pending.append(record)
+            if len(pending) >= INGEST_BATCH_SIZE:
+                commit_actions(pending)
+                accepted += len(pending)
+                total_saved += sum(r["co2_saved_kg"] for r in pending)
+                pending = []
+                await asyncio.sleep(0)  # Let other requests run between batches
+    except (ValueError, TypeError, AttributeError) as e:
+        # Malformed JSON body - nothing in it was applied
+        raise HTTPException(status_code=400, detail=f"Invalid ingest body: {e}")
+    
+    if pending:
+        commit_actions(pending)
+        accepted += len(pending)
+        total_saved += sum(r["co2_saved_kg"] for r in pending)
+    
+    return {
+        "accepted": accepted,
+        "rejected": rejected,
+        "total_co2_saved_kg": round(total_saved, 2),
+        "errors": errors,
+        "global_stats": global_stats
+    }
+
+def validate_seed_action(item: Dict[str, Any], seeded_users: set) -> Dict[str, Any]:
+    """Check one generated, already-priced action; returns the record to store"""
+    action_type, quantity = validate_action_fields(item)
+    if item.get("user_id") not in seeded_users:
+        raise ValueError(f"user {item.get('user_id')!r} wasn't seeded (unknown, or it already existed)")
+    if not isinstance(item.get("id"), str):
+        raise ValueError("id must be a string")
+    if item.get("category") != factor_registry.table.factors[action_type]["category"]:
+        raise ValueError(f"category {item.get('category')!r} doesn't match action_type {action_type!r}")
+    co2_saved_kg = item.get("co2_saved_kg")
+    if isinstance(co2_saved_kg, bool) or not isinstance(co2_saved_kg, (int, float)) or not -1e9 < co2_saved_kg < 1e9:
+        raise ValueError("co2_saved_kg must be a number")
+    logged_at = action_timestamp(item.get("logged_at"))
+    return {
+        "id": item["id"],
+        "user_id": item["user_id"],
+        "logged_at": logged_at,
+        "category": item["category"],
+        "action_type": action_type,
+        "quantity": quantity,
+        "co2_saved_kg": co2_saved_kg,
+        "factor_version": item.get("factor_version"),
+    }
+
+def apply_seed_batch(users: List[Dict[str, Any]], actions: List[Dict[str, Any]]):
+    """Bulk-load generated (new) users and their already-priced actions"""
+    for user in users:
+        users_db[user["user_id"]] = user
+        storage.save_user(user)
+    if users:
+        increment_stats(total_users=len(users))
+    if actions:
+        commit_actions(actions)
+
+async def seed_lines(lines) -> Dict[str, Any]:
+    """Load generate_demo_data.py NDJSON (an async iterator of (line number, line)) in batches.
+
+    Users whose user_id already exists are left alone, and their generated
+    actions are skipped with them. Invalid lines are skipped and reported.
+    """
+    users, actions = [], []
+    seeded_users = set()  # Ids added by this seed, which its actions may refer to
+    counts = {"users": 0, "actions": 0, "skipped": 0, "existing_users": 0}
+    errors = []
+    async for line_no, line in lines:
+        try:
+            item = json.loads(line)
+            kind = item.pop("type") if isinstance(item, dict) else None
+            if kind == "user":
+                user_id = item.get("user_id")
+                if not isinstance(user_id, str):
+                    raise ValueError("user_id must be a string")
+                if user_id in seeded_users or user_id in users_db:
+                    counts["existing_users"] += 1
+                    raise ValueError(f"user {user_id!r} already exists")
+                seeded_users.add(user_id)
+                users.append(item)
+            elif kind == "action":
+                actions.append(validate_seed_action(item, seeded_users))
+            else:
+                raise ValueError(f"unknown line type: {kind!r}")
+        except (ValueError, TypeError, KeyError) as e:
+            counts["skipped"] += 1
+            if len(errors) < MAX_INGEST_ERRORS:
+                errors.append({"line": line_no, "error": str(e)})
+            continue
+        
+        if len(users) + len(actions) >= SEED_BATCH_SIZE:
+            apply_seed_batch(users, actions)
+            counts["users"] += len(users)
+            counts["actions"] += len(actions)
+            users, actions = [], []
+            await asyncio.sleep(0)  # Let requests in between batches
+    
+    apply_seed_batch(users, actions)
+    counts["users"] += len(users)
+    counts["actions"] += len(actions)
+    return {**counts, "errors": errors}
+
+async def file_lines(path: str):
+    with open(path, "rb") as f:
+        for line_no, line in enumerate(f, 1):
+            if line.strip():
+                yield line_no, line
+
+async def seed_from_file(path: str):
+    """Startup seeding: replace the demo counters with the seeded data's totals"""
+    for key in ("total_co2_saved_kg", "total_actions_logged", "total_users"):
+        global_stats[key] = 0
+    started = time.perf_counter()
+    try:
+        counts = await seed_lines(file_lines(path))
+    except Exception as e:
+        print(f"ERROR seeding from {path}: {e}")
+        metrics.ERRORS.inc("seed")
+        return
+    storage.save_stats(global_stats)
+    print(f"Seeded {counts['users']} users and {counts['actions']} actions from {path} "
+          f"in {time.perf_counter() - started:.1f}s ({counts['skipped']} lines skipped)")
+    for error in counts["errors"][:5]:
+        print(f"  line {error['line']}: {error['error']}")
+
+@app.post("/api/seed")
+async def seed(request: Request):
+    """Bulk-load generate_demo_data.py NDJSON into the running store (needs ALLOW_SEED_ENDPOINT=1)"""
+    if not ALLOW_SEED_ENDPOINT:
+        raise HTTPException(status_code=403, detail="Seeding is disabled. Set ALLOW_SEED_ENDPOINT=1 to enable it.")
+    
+    counts = await seed_lines(body_lines(request))
+    storage.save_stats(global_stats)
+    return {**counts, "global_stats": global_stats}
+
+def export_response(rows, columns, fmt: str, name: str) -> StreamingResponse:
+    """Stream rows as an NDJSON/CSV download without building the body"""
+    if not ALLOW_EXPORT_ENDPOINT:
+        raise HTTPException(status_code=403, detail="Exports are disabled. Set ALLOW_EXPORT_ENDPOINT=1 to enable them.")
+    if fmt not in export.FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown format. Use one of: {', '.join(export.FORMATS)}")
+    return StreamingResponse(
+        export.stream(export.encode_rows(rows, columns, fmt)),
+        media_type=export.FORMATS[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{name}.{fmt}"'},
+    )
+
+def timestamp_bound(value: Optional[str], name: str) -> Optional[str]:
+    """Normalize an ISO date/datetime query parameter for comparing with logged_at"""
+    if value is None:
+        return None
+    try:
+        return local_timestamp(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"{name} must be an ISO date or datetime")
+
+@app.get("/api/export/actions")
+async def export_actions(format: str = "ndjson", user_id: Optional[str] = None, category: Optional[str] = None,
+                         start: Optional[str] = None, end: Optional[str] = None):
+    """Stream logged actions as NDJSON or CSV.
+
+    Filter by user_id, category and a logged_at range (start inclusive, end
+    exclusive; ISO dates or datetimes).
+    """
+    rows = actions_db.query(user_id=user_id, category=category, start=timestamp_bound(start, "start"),
+                            end=timestamp_bound(end, "end"))
+    return export_response(rows, ACTION_COLUMNS, format, "actions")
+
+@app.get("/api/export/users")
+async def export_users(format: str = "ndjson", user_id: Optional[str] = None):
+    """Stream user profiles (without conversation history) as NDJSON or CSV"""
+    def users():
+        # Ids up front: onboarding can add users while the export is running
+        for uid in [user_id] if user_id is not None else list(users_db):
+            user = users_db.get(uid)
+            if user is not None:
+                yield user
+
+    return export_response(users(), export.USER_COLUMNS, format, "users")
+
 @app.get("/api/dashboard/{user_id}")
 async def get_dashboard(user_id: str):
     """Get user dashboard data"""
@@ -512,48 +1294,72 @@ async def get_dashboard(user_id: str):
         raise HTTPException(status_code=404, detail="User not found")
     
     user = users_db[user_id]
+    if SHARED_STATE:
+        global_stats.refresh()
     
-    # Get user's actions
-    user_actions = [a for a in actions_db if a["user_id"] == user_id]
-    total_saved = sum(a["co2_saved_kg"] for a in user_actions)
+    # Running totals kept up to date by actions_db on every append
+    summary = actions_db.user_summary(user_id)
+    total_saved = summary["total_co2_saved_kg"]
     
-    # Calculate projected footprint
+    # Project the year from the recent daily rate (the last few weeks of day buckets)
     estimated = user.get("estimated_annual_footprint_kg", 8200)
-    if total_saved > 0 and len(user_actions) > 0:
-        # Simple projection based on current rate
-        days_active = len(set(a["logged_at"][:10] for a in user_actions))
-        if days_active > 0:
-            daily_avg_saved = total_saved / days_active
-            annual_saved = daily_avg_saved * 365
-            projected = max(0, estimated - annual_saved)
-        else:
-            projected = estimated
-    else:
-        projected = estimated
+    recent_days = history.recent_window(summary["first_active_day"], datetime.now().date())
+    daily_avg_saved = history.daily_rate(actions_db.user_buckets(user_id, "day", recent_days), recent_days)
+    projected = max(0, estimated - daily_avg_saved * 365) if summary["action_count"] > 0 else estimated
     
     return {
         "user": {
             "total_co2_saved_kg": round(total_saved, 1),
-            "actions_count": len(user_actions),
+            "actions_count": summary["action_count"],
             "estimated_annual_footprint_kg": estimated,
             "projected_annual_footprint_kg": round(projected, 0),
+            "recent_daily_co2_saved_kg": round(daily_avg_saved, 3),
             "display_name": user.get("display_name", "User")
         },
         "global": global_stats
     }
 
-@app.get("/api/stats/global")
-async def get_global_stats():
-    """Get real-time global stats"""
-    # Calculate last minute stats
-    one_minute_ago = datetime.now() - timedelta(minutes=1)
-    recent_actions = [a for a in actions_db if datetime.fromisoformat(a["logged_at"]) > one_minute_ago]
-    last_minute_kg = sum(a["co2_saved_kg"] for a in recent_actions)
+@app.get("/api/history/{user_id}")
+async def get_history(user_id: str, granularity: str = "day", start: Optional[str] = None,
+                      end: Optional[str] = None, max_points: Optional[int] = None):
+    """CO2 saved per category per day, week or month, from the user's rollup buckets.
+
+    start/end are ISO dates (default: the last 30 days / 12 weeks / 12 months).
+    Periods without actions are zero. With max_points, consecutive periods are
+    merged so long ranges stay chart-sized.
+    """
+    if user_id not in users_db:
+        raise HTTPException(status_code=404, detail="User not found")
+    if granularity not in history.GRANULARITIES:
+        raise HTTPException(status_code=400, detail=f"Unknown granularity. Use one of: {', '.join(history.GRANULARITIES)}")
+    try:
+        end_day = date.fromisoformat(end) if end else datetime.now().date()
+        start_day = date.fromisoformat(start) if start else history.default_start(granularity, end_day)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="start and end must be ISO dates (YYYY-MM-DD)")
+    if start_day > end_day:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    if max_points is not None and max_points < 1:
+        raise HTTPException(status_code=400, detail="max_points must be at least 1")
+
+    periods = history.period_keys(granularity, start_day, end_day)
+    points = history.series(actions_db.user_buckets(user_id, granularity, periods), periods, max_points)
+    return {
+        "user_id": user_id,
+        "granularity": granularity,
+        "start": periods[0],
+        "end": periods[-1],
+        "points": points,
+    }
+
+def build_global_stats() -> Dict[str, Any]:
+    """Collective counter payload shared by the poll and stream endpoints"""
+    if SHARED_STATE:
+        global_stats.refresh()
     
-    # Calculate today's stats
-    today = datetime.now().date()
-    today_actions = [a for a in actions_db if datetime.fromisoformat(a["logged_at"]).date() == today]
-    today_kg = sum(a["co2_saved_kg"] for a in today_actions)
+    # Read the rolling buckets - constant time however many actions exist
+    last_minute_kg = rolling_stats.last_window_kg()
+    today_kg = rolling_stats.day_kg()
     
     return {
         "total_co2_saved_kg": round(global_stats["total_co2_saved_kg"], 1),
@@ -563,11 +1369,177 @@ async def get_global_stats():
         "timestamp": datetime.now().isoformat()
     }
 
-@app.get("/")
-async def root():
-    # Serve the frontend HTML file
-    frontend_path = os.path.join(os.path.dirname(__file__), "..", "frontend", "index.html")
-    return FileResponse(frontend_path)
+@app.get("/api/stats/global")
+async def get_global_stats():
+    """Get real-time global stats"""
+    return build_global_stats()
+
+@app.get("/api/stats/stream")
+async def stream_global_stats(request: Request):
+    """Push global stats to the client as Server-Sent Events"""
+    return StreamingResponse(
+        stats_broadcaster.events(request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+MAX_LEADERBOARD_LIMIT = 100
+
+# A user_id is the only credential for /api/log and /api/dashboard, so the user
+# board shows a keyed hash of it instead. Workers sharing state need the same secret,
+# so without LEADERBOARD_ID_SECRET the first one generates it and stores it in the shared DB.
+LEADERBOARD_ID_SECRET = os.environ.get("LEADERBOARD_ID_SECRET")
+if not LEADERBOARD_ID_SECRET:
+    LEADERBOARD_ID_SECRET = os.urandom(16).hex()
+    if SHARED_STATE:
+        LEADERBOARD_ID_SECRET = shared_db.setting("leaderboard_id_secret", LEADERBOARD_ID_SECRET)
+LEADERBOARD_ID_SECRET = LEADERBOARD_ID_SECRET.encode()
+
+def public_user_id(user_id: str) -> str:
+    """Stable opaque id for a user on the leaderboard"""
+    return hmac.new(LEADERBOARD_ID_SECRET, user_id.encode(), hashlib.sha256).hexdigest()[:16]
+
+def present_user_row(entry: Dict[str, Any], caller_id: Optional[str]) -> Dict[str, Any]:
+    """Swap a user board row's user_id key for a public id and display name"""
+    user_id = entry["key"]
+    entry["key"] = public_user_id(user_id)
+    entry["display_name"] = (users_db.get(user_id) or {}).get("display_name") or "User"
+    if user_id == caller_id:
+        entry["user_id"] = user_id  # Only the caller sees their own id
+    return entry
+
+@app.get("/api/leaderboard/{dimension}")
+async def get_leaderboard(dimension: str, window: str = "all", limit: int = 10,
+                          period: Optional[str] = None, user_id: Optional[str] = None):
+    """Top users (or colleges/cities/countries) by CO2 saved.
+
+    window is all, week or day (the current ISO week / day unless period names
+    another recent one, e.g. 2026-W42 or 2026-10-18). With user_id, "you" is
+    that user's (or their group's) own rank. User rows are keyed by an opaque
+    id, with the raw user_id only on the caller's own row.
+    """
+    if dimension not in DIMENSIONS:
+        raise HTTPException(status_code=404, detail=f"Unknown leaderboard. Use one of: {', '.join(DIMENSIONS)}")
+    if window not in WINDOWS:
+        raise HTTPException(status_code=400, detail=f"Unknown window. Use one of: {', '.join(WINDOWS)}")
+    limit = max(1, min(limit, MAX_LEADERBOARD_LIMIT))
+
+    entries = leaderboards.top(dimension, window, limit, period)
+    for entry in entries:
+        entry["co2_saved_kg"] = round(entry["co2_saved_kg"], 2)
+        if dimension == "user":
+            present_user_row(entry, user_id)
+
+    you = None
+    if user_id is not None:
+        key = leaderboard_groups(user_id).get(dimension)
+        you = leaderboards.rank(dimension, window, key, period) if key else None
+        if you:
+            you["co2_saved_kg"] = round(you["co2_saved_kg"], 2)
+            if dimension == "user":
+                present_user_row(you, user_id)
+
+    return {"dimension": dimension, "window": window, "period": period, "entries": entries, "you": you}
+
+@app.get("/api/stats/classifier")
+async def get_classifier_stats():
+    """How often /api/log is answered without a fresh LLM classification"""
+    return {
+        **classifier.get_stats(),
+        "cache": classification_cache.get_stats()
+    }
+
+@app.get("/api/stats/jobs")
+async def get_job_stats():
+    """Background job queues: depth, running jobs and per-kind counts"""
+    return {queue.name: queue.get_stats() for queue in job_queues}
+
+@app.get("/api/stats/llm")
+async def get_llm_stats():
+    """LLM gateway health: circuit breaker state and retries by kind"""
+    return llm.get_stats()
+
+@app.get("/api/stats/prompts")
+async def get_prompt_stats():
+    """Estimated prompt tokens per LLM call, by kind"""
+    return {
+        "history_budget_tokens": prompts.HISTORY_BUDGET_TOKENS,
+        "by_kind": prompts.get_stats()
+    }
+
+@app.get("/api/factors")
+async def get_factors():
+    """Current emission factor version and reload status"""
+    return factor_registry.get_stats()
+
+@app.post("/api/factors/reload")
+async def post_factors_reload():
+    """Reload emission_factors.json now instead of waiting for the file watcher (needs ALLOW_FACTOR_RELOAD_ENDPOINT=1)"""
+    if not ALLOW_FACTOR_RELOAD_ENDPOINT:
+        raise HTTPException(status_code=403,
+                            detail="Factor reloads are disabled. Set ALLOW_FACTOR_RELOAD_ENDPOINT=1 to enable them.")
+    reloaded = await reload_factors(force=True)
+    return {"reloaded": reloaded, **factor_registry.get_stats()}
+
+# Gauges are read when /metrics is scraped, never on the request path
+metrics.Gauge("carbonbuddy_users", "Users in users_db", lambda: len(users_db))
+metrics.Gauge("carbonbuddy_actions", "Actions in actions_db", lambda: len(actions_db))
+metrics.Gauge("carbonbuddy_classification_cache_entries", "Cached LLM classifications",
+              lambda: classification_cache.get_stats()["size"])
+metrics.Gauge("carbonbuddy_classification_cache_hit_ratio", "Classification cache hits / lookups",
+              lambda: classification_cache.get_stats()["hit_rate"])
+metrics.CallbackCounter("carbonbuddy_classification_cache_lookups_total", "Classification cache lookups by result",
+                        lambda: {("hit",): classification_cache.hits, ("miss",): classification_cache.misses},
+                        ("result",))
+metrics.Gauge("carbonbuddy_fast_classifier_hit_ratio", "Log messages classified without the LLM / all",
+              lambda: classifier.hit_rate())
+metrics.CallbackCounter("carbonbuddy_classifications_total", "Log message classifications by path",
+                        lambda: {("fast_path",): classifier.stats["fast_path_hits"],
+                                 ("fallback",): classifier.stats["llm_fallbacks"]}, ("path",))
+metrics.Gauge("carbonbuddy_stats_stream_subscribers", "Open /api/stats/stream connections",
+              lambda: stats_broadcaster.subscriber_count)
+metrics.Gauge("carbonbuddy_llm_circuit_state", "LLM circuit breaker state (1 for the current one)",
+              lambda: {(state,): int(llm.breaker.state == state) for state in llm.CircuitBreaker.STATES}, ("state",))
+metrics.CallbackCounter("carbonbuddy_llm_circuit_opened_total", "Times the LLM circuit breaker opened",
+                        lambda: llm.breaker.times_opened)
+metrics.CallbackCounter("carbonbuddy_llm_rejected_total", "LLM calls refused without trying while the circuit was open",
+                        lambda: llm.breaker.rejected)
+metrics.Gauge("carbonbuddy_llm_replies_pending", "Background LLM replies not finished yet",
+              lambda: reply_jobs.depth + reply_jobs.running)
+metrics.Gauge("carbonbuddy_job_queue_depth", "Background jobs waiting for a worker by queue",
+              lambda: {(queue.name,): queue.depth for queue in job_queues}, ("queue",))
+metrics.Gauge("carbonbuddy_jobs_running", "Background jobs being worked on by queue",
+              lambda: {(queue.name,): queue.running for queue in job_queues}, ("queue",))
+metrics.CallbackCounter("carbonbuddy_jobs_rejected_total", "Background jobs refused because the queue was full",
+                        lambda: {(kind,): counts["rejected"] for queue in job_queues
+                                 for kind, counts in queue.counts.items()}, ("kind",))
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus scrape endpoint"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/stats/static")
+async def get_static_stats():
+    """Frontend files held in memory"""
+    return frontend.get_stats()
+
+# Registered last so every API route above wins
+@app.api_route("/api/{path:path}", methods=["GET", "HEAD", "POST", "PUT", "PATCH", "DELETE"])
+async def unknown_api_route(request: Request, path: str):
+    """Unknown /api paths are 404 whatever the method, never a frontend file"""
+    if any(route.matches(request.scope)[0] == Match.PARTIAL for route in app.router.routes
+           if getattr(route, "path", "").startswith("/api/") and route.path != "/api/{path:path}"):
+        raise HTTPException(status_code=405, detail="Method Not Allowed")  # Known route, wrong method
+    raise HTTPException(status_code=404, detail="Not found")
+
+@app.api_route("/{path:path}", methods=["GET", "HEAD"])
+async def serve_frontend(request: Request, path: str):
+    """Serve frontend/ from memory (gzip/brotli, ETag and 304 handling)"""
+    response = frontend.response(path, request.headers, head=request.method == "HEAD")
+    if response is None:
+        raise HTTPException(status_code=404, detail="Not found")
+    return response
 
 if __name__ == "__main__":
     import uvicorn
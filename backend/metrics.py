@@ -0,0 +1,179 @@
+"""
+Minimal Prometheus metrics, rendered in the text exposition format at /metrics.
+
+No client library needed: counters and histograms are plain Python numbers
+keyed by label values, so recording one is a dict lookup, a bisect and two
+additions. Cheap enough to leave on for every request. Gauges are callbacks
+that are only evaluated when /metrics is scraped.
+
+MetricsMiddleware times every HTTP request by route template (so
+/api/dashboard/{user_id} is one series, not one per user), until the last
+byte of the response has been sent. That includes streamed responses.
+"""
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Sequence, Tuple
+
+# Seconds; covers fast in-memory routes up to slow LLM round trips
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_metrics: List["_Metric"] = []
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        _metrics.append(self)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"] + self.samples()
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labelvalues: str, amount: float = 1):
+        self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_labels(self.labelnames, key)} {_number(value)}" for key, value in self._values.items()]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        # Per label set: [count per bucket (+Inf last), sum]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labelvalues: str):
+        series = self._series.get(labelvalues)
+        if series is None:
+            series = self._series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def samples(self) -> List[str]:
+        lines = []
+        for key, (counts, total) in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class Gauge(_Metric):
+    """Value read from a callback at scrape time.
+
+    The callback returns a number, or a dict of label-value tuples to numbers.
+    """
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, callback: Callable, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+
+    def samples(self) -> List[str]:
+        try:
+            value = self.callback()
+        except Exception as e:  # A broken gauge shouldn't take /metrics down
+            print(f"Error reading gauge {self.name}: {e}")
+            return []
+        if isinstance(value, dict):
+            return [f"{self.name}{_labels(self.labelnames, key)} {_number(v)}" for key, v in value.items()]
+        return [f"{self.name} {_number(value)}"]
+
+
+class CallbackCounter(Gauge):
+    """Counter whose running total is kept elsewhere and read at scrape time"""
+    kind = "counter"
+
+
+def render() -> str:
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# Shared metrics (recorded from llm.py, jobs.py and main.py)
+HTTP_REQUEST_DURATION = Histogram(
+    "carbonbuddy_http_request_duration_seconds", "HTTP request latency by route",
+    ("method", "route", "status"))
+LLM_CALL_DURATION = Histogram(
+    "carbonbuddy_llm_call_duration_seconds", "LLM call latency by kind and outcome", ("kind", "outcome"))
+LLM_FIRST_TOKEN = Histogram(
+    "carbonbuddy_llm_first_token_seconds", "Time to first streamed token by kind", ("kind",))
+LLM_PROMPT_TOKENS = Counter(
+    "carbonbuddy_llm_prompt_tokens_total", "Prompt tokens sent to the LLM by kind", ("kind",))
+LLM_COMPLETION_TOKENS = Counter(
+    "carbonbuddy_llm_completion_tokens_total", "Completion tokens received from the LLM by kind", ("kind",))
+LLM_RETRIES = Counter("carbonbuddy_llm_retries_total", "LLM attempts retried after a transient failure", ("kind",))
+JOB_WAIT = Histogram(
+    "carbonbuddy_job_wait_seconds", "Time background jobs spent queued before a worker took them", ("kind",))
+JOB_DURATION = Histogram(
+    "carbonbuddy_job_duration_seconds", "Background job run time by kind and outcome", ("kind", "outcome"))
+ERRORS = Counter("carbonbuddy_errors_total", "Handled errors by where they happened", ("source",))
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording HTTP_REQUEST_DURATION"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = "500"
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            HTTP_REQUEST_DURATION.observe(time.perf_counter() - start, scope["method"],
+                                          route.path if route is not None else "unmatched", status)
@@ -0,0 +1,123 @@
+"""
+Scripted onboarding, used while the LLM is unavailable.
+
+Asks the same four things the LLM onboarding prompt collects, one fixed
+question at a time, and reads the answers with simple keyword rules. The
+result is the same profile dict the LLM would have produced, so the rest of
+onboarding (footprint, stats) doesn't change.
+
+Progress is kept on the user as user["onboarding_flow"], so a user who
+started the scripted flow keeps going with it even if the LLM comes back.
+"""
+import re
+from typing import Any, Dict, Optional, Tuple
+
+from classifier import MILES_TO_KM
+
+INTRO = "I'm running in quick mode right now, so let's do this with a few short questions."
+
+QUESTIONS = [
+    ("location", "Which city (and country) do you live in?"),
+    ("commute", "How do you usually get to work or campus - car, bus, train, bike, walk, or do you work from home? "
+                "Roughly how far is it one way?"),
+    ("diet", "How would you describe your diet - vegan, vegetarian, some meat, or meat most days?"),
+    ("home", "Last one: do you use air conditioning regularly, and how is your home heated (gas, electric, or none)?"),
+]
+
+DEFAULT_COMMUTE_KM = 10
+
+_DISTANCE = re.compile(r"(\d+(?:\.\d+)?)\s*(km|kilomet(?:er|re)s?|mi|miles?)?\b")
+_LOCATION_PREFIX = re.compile(r"^(?:i(?:'m| am)? (?:live|living|based|from|in)\s+(?:in\s+)?|i'm in\s+|in\s+|from\s+)",
+                              re.IGNORECASE)
+_NEGATIVE = re.compile(r"\b(?:no|not|don'?t|do not|never|rarely|without)\b")
+
+# (pattern, commute_mode), checked in order
+_COMMUTE_MODES = [
+    (re.compile(r"\b(?:remote|from home|wfh|don'?t commute|no commute)\b"), None),
+    (re.compile(r"\b(?:electric car|ev|tesla)\b"), "car_electric"),
+    (re.compile(r"\bdiesel\b"), "car_diesel"),
+    (re.compile(r"\b(?:train|metro|subway|tram|rail)\b"), "train_electric"),
+    (re.compile(r"\b(?:bus|transit|shuttle)\b"), "bus"),
+    (re.compile(r"\b(?:bike|cycle|cycling|walk|walking|scooter)\b"), "bike_walk"),
+    (re.compile(r"\b(?:car|drive|driving)\b"), "car_petrol"),
+]
+
+_DIETS = [
+    (re.compile(r"\b(?:vegan|plant[- ]based)\b"), "vegan_meal"),
+    (re.compile(r"\b(?:vegetarian|veggie|no meat|don'?t eat meat)\b"), "vegetarian_meal"),
+    (re.compile(r"\b(?:beef|steak|red meat|every day|most days|daily|a lot)\b"), "beef_heavy_meal"),
+]
+
+
+def parse_location(text: str) -> Dict[str, Any]:
+    text = _LOCATION_PREFIX.sub("", text.strip()).strip(" .!")
+    city, _, country = text.partition(",")
+    return {"city": city.strip() or None, "country": country.strip() or None}
+
+
+def parse_commute(text: str) -> Dict[str, Any]:
+    text = text.lower()
+    mode = "car_petrol"
+    for pattern, commute_mode in _COMMUTE_MODES:
+        if pattern.search(text):
+            if commute_mode is None:
+                return {"commute_mode": "bike_walk", "commute_distance_km": 0}
+            mode = commute_mode
+            break
+    distance = DEFAULT_COMMUTE_KM
+    match = _DISTANCE.search(text)
+    if match:
+        distance = float(match.group(1))
+        if match.group(2) and match.group(2).startswith("mi"):
+            distance *= MILES_TO_KM
+    return {"commute_mode": mode, "commute_distance_km": round(distance, 1)}
+
+
+def parse_diet(text: str) -> Dict[str, Any]:
+    text = text.lower()
+    for pattern, diet_type in _DIETS:
+        if pattern.search(text):
+            return {"diet_type": diet_type}
+    return {"diet_type": "meat_mixed_meal"}
+
+
+def parse_home(text: str) -> Dict[str, Any]:
+    text = text.lower()
+    has_ac = bool(re.match(r"\s*(?:yes|yeah|yep|sure)\b", text))  # "Yes, gas heating"
+    for clause in re.split(r"[,;.]|\band\b|\bbut\b", text):
+        if re.search(r"\b(?:ac|a/c|air ?con(?:ditioning)?)\b", clause):
+            has_ac = not _NEGATIVE.search(clause)
+    if re.search(r"\b(?:electric|heat pump)\b", text):
+        heating_type = "electric"
+    elif re.search(r"\b(?:no heating|none|don'?t heat)\b", text):
+        heating_type = "none"
+    else:
+        heating_type = "gas"
+    return {"has_ac": has_ac, "heating_type": heating_type}
+
+
+PARSERS = {"location": parse_location, "commute": parse_commute, "diet": parse_diet, "home": parse_home}
+
+
+def step(user: Dict[str, Any], message: str) -> Tuple[str, Optional[Dict[str, Any]]]:
+    """Advance the scripted flow by one user message.
+
+    Returns (next question, None), or ("", profile) once all four answers are
+    in; the profile has the same fields as the LLM's JSON block.
+    The first call only asks the first question (the message that triggered
+    it may have been an answer to a different, LLM-asked question).
+    """
+    flow = user.get("onboarding_flow")
+    if flow is None:
+        user["onboarding_flow"] = {"step": 0, "answers": {}}
+        return f"{INTRO} {QUESTIONS[0][1]}", None
+
+    topic = QUESTIONS[flow["step"]][0]
+    flow["answers"].update(PARSERS[topic](message))
+    flow["step"] += 1
+    if flow["step"] < len(QUESTIONS):
+        return QUESTIONS[flow["step"]][1], None
+
+    profile = {**flow["answers"], "meals_per_day": 3, "onboarding_complete": True}
+    del user["onboarding_flow"]
+    return "", profile
@@ -0,0 +1,119 @@
+"""
+Prompt budgeting: keep what we send to the LLM bounded per call.
+
+- The classification prompt only gets the profile fields it uses, not the whole
+  user dict (which carries the ever-growing onboarding conversation_history).
+- Onboarding history is capped to a token budget. Recent turns are kept
+  verbatim; older user answers are folded into a short summary so facts like
+  the user's city aren't lost, and older assistant questions are dropped.
+- Every LLM call records its prompt size per kind, so the reduction can be
+  checked at /api/stats/prompts.
+
+Token counts are estimated at ~4 characters per token, which is close enough
+for budgeting without pulling in a tokenizer.
+
+Tunable with environment variables:
+    PROMPT_HISTORY_BUDGET_TOKENS   onboarding history budget per call (default 1500)
+"""
+import json
+import os
+from typing import Any, Dict, List
+
+CHARS_PER_TOKEN = 4
+HISTORY_BUDGET_TOKENS = int(os.environ.get("PROMPT_HISTORY_BUDGET_TOKENS", "1500"))
+
+# Everything the classification prompt (and its cache key) depends on
+CLASSIFICATION_PROFILE_FIELDS = ("commute_distance_km", "commute_mode", "diet_type")
+
+SUMMARY_ANSWER_CHARS = 200  # Max characters kept from each summarized user answer
+SUMMARY_PREFIX = "Earlier in this conversation the user said: "
+
+prompt_stats: Dict[str, Dict[str, int]] = {}
+
+
+def chars_to_tokens(chars: int) -> int:
+    return (chars + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def estimate_tokens(text: str) -> int:
+    return chars_to_tokens(len(text))
+
+
+def messages_tokens(messages: List[Dict[str, str]]) -> int:
+    return sum(estimate_tokens(m["content"]) for m in messages)
+
+
+def classification_profile(user: Dict[str, Any]) -> str:
+    """Only the profile fields the classification prompt needs, as JSON"""
+    return json.dumps({field: user.get(field) for field in CLASSIFICATION_PROFILE_FIELDS}, indent=2)
+
+
+def reply_actions(calculated_results: List[Dict[str, Any]]) -> str:
+    """The calculated actions the reply prompt needs, as compact JSON"""
+    return json.dumps([
+        {key: result[key] for key in ("display_name", "quantity", "unit", "co2_saved_kg")}
+        for result in calculated_results
+    ])
+
+
+def compact_history(history: List[Dict[str, str]],
+                    budget_tokens: int = HISTORY_BUDGET_TOKENS) -> List[Dict[str, str]]:
+    """Fit a conversation history into budget_tokens.
+
+    Keeps the most recent messages verbatim (using up to ~3/4 of the budget) and
+    replaces everything older with one summary message of the user's earlier answers.
+    """
+    if messages_tokens(history) <= budget_tokens:
+        return history
+
+    recent: List[Dict[str, str]] = []
+    used = 0
+    for message in reversed(history):
+        cost = estimate_tokens(message["content"])
+        if recent and used + cost > budget_tokens * 3 // 4:
+            break
+        recent.append(message)
+        used += cost
+    recent.reverse()
+    older = history[:len(history) - len(recent)]
+
+    # The summary gets whatever budget is left (after its prefix and separator), newest answers first
+    remaining_chars = max(0, budget_tokens - used) * CHARS_PER_TOKEN - len(SUMMARY_PREFIX) - 2
+    answers = []
+    for message in reversed(older):
+        if message["role"] != "user":
+            continue
+        answer = message["content"][:SUMMARY_ANSWER_CHARS]
+        if len(answer) + 5 > remaining_chars:  # Quotes and " | "
+            break
+        answers.append(answer)
+        remaining_chars -= len(answer) + 5
+    answers.reverse()
+
+    if not answers:
+        return recent
+    summary = SUMMARY_PREFIX + " | ".join(f'"{a}"' for a in answers)
+    # Keep the roles alternating: merge into the first kept user turn if there is one
+    if recent and recent[0]["role"] == "user":
+        return [{"role": "user", "content": summary + "\n\n" + recent[0]["content"]}] + recent[1:]
+    return [{"role": "user", "content": summary}] + recent
+
+
+def record_prompt(kind: str, messages: List[Dict[str, str]]) -> int:
+    """Track prompt size for one LLM call; returns the estimated tokens"""
+    tokens = messages_tokens(messages)
+    stats = prompt_stats.get(kind)
+    if stats is None:
+        stats = prompt_stats[kind] = {"calls": 0, "total_tokens": 0, "max_tokens": 0, "last_tokens": 0}
+    stats["calls"] += 1
+    stats["total_tokens"] += tokens
+    stats["max_tokens"] = max(stats["max_tokens"], tokens)
+    stats["last_tokens"] = tokens
+    return tokens
+
+
+def get_stats() -> Dict[str, Dict[str, Any]]:
+    return {
+        kind: {**stats, "avg_tokens": round(stats["total_tokens"] / stats["calls"], 1)}
+        for kind, stats in prompt_stats.items()
+    }
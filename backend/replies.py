@@ -0,0 +1,73 @@
+"""
+Local reply templates for /api/log.
+
+The numbers in a log reply are all computed before the LLM ever sees them, so
+the reply can be rendered here in microseconds instead of costing a second LLM
+round trip. The templates follow the same rules the LLM reply prompt used:
+exact per-action numbers to one decimal, one equivalency, a nod to the
+collective total, 2-3 sentences and at most one emoji.
+"""
+import random
+from typing import Any, Dict, List
+
+# Below this total the action is the user's usual choice, so don't celebrate
+SMALL_SAVING_KG = 0.1
+
+OPENERS = [
+    "Nice one!",
+    "Love it!",
+    "Great choice!",
+    "That adds up!",
+    "Well done!",
+]
+
+SINGLE_TEMPLATES = [
+    "{opener} Your {actions} saved {total} kg of CO2 — about the same as {equivalency}. The whole community is now at {collective} kg saved.",
+    "{opener} That {actions} kept {total} kg of CO2 out of the air, roughly {equivalency}. Together we've saved {collective} kg so far 🌍",
+    "{opener} {total} kg of CO2 saved with your {actions}, which is like {equivalency}. You're part of {collective} kg saved by everyone.",
+]
+
+MULTI_TEMPLATES = [
+    "{opener} You logged {actions}, {total} kg of CO2 saved in all. That's about {equivalency}, and the community total just hit {collective} kg.",
+    "{opener} Between {actions}, you saved {total} kg of CO2 — roughly {equivalency}. Everyone together is now at {collective} kg 🌱",
+    "{opener} Your {actions} add up to {total} kg of CO2 saved, like {equivalency}. That pushes the collective total to {collective} kg.",
+]
+
+USUAL_TEMPLATES = [
+    "That's your usual — keeping it consistent! Every steady habit counts toward the {collective} kg our community has saved.",
+    "That's your usual — keeping it consistent! Logged it, and the community total stands at {collective} kg.",
+]
+
+
+def _describe(action: Dict[str, Any], with_numbers: bool) -> str:
+    name = action["display_name"][0].lower() + action["display_name"][1:]
+    if with_numbers:
+        return f"{name} ({action['co2_saved_kg']:.1f} kg)"
+    return name
+
+
+def _join(parts: List[str]) -> str:
+    if len(parts) <= 2:
+        return " and ".join(parts)
+    return ", ".join(parts[:-1]) + " and " + parts[-1]
+
+
+def render(calculated_results: List[Dict[str, Any]], total_saved: float,
+           equivalency: str, collective_kg: float) -> str:
+    """Render a 2-3 sentence reply for logged actions"""
+    fields = {
+        "collective": f"{collective_kg:,.1f}",
+        "total": f"{total_saved:.1f}",
+        "equivalency": equivalency,
+        "opener": random.choice(OPENERS),
+    }
+
+    if total_saved < SMALL_SAVING_KG:
+        return random.choice(USUAL_TEMPLATES).format(**fields)
+
+    if len(calculated_results) == 1:
+        fields["actions"] = _describe(calculated_results[0], with_numbers=False)
+        return random.choice(SINGLE_TEMPLATES).format(**fields)
+
+    fields["actions"] = _join([_describe(a, with_numbers=True) for a in calculated_results])
+    return random.choice(MULTI_TEMPLATES).format(**fields)
@@ -0,0 +1,56 @@
+"""
+Stream generate_demo_data.py output into a running CarbonBuddy server.
+
+The file is sent to POST /api/seed in chunks as it is read, and the server
+applies it in batches of SEED_BATCH_SIZE, so neither side holds the whole data
+set in memory. The server must be started with ALLOW_SEED_ENDPOINT=1.
+
+Usage:
+    python seed.py demo_data.ndjson [--url http://localhost:8000]
+    python generate_demo_data.py --users 100000 --out - | python seed.py -
+"""
+import argparse
+import sys
+import time
+
+import httpx
+
+CHUNK_BYTES = 1 << 20
+
+
+def read_chunks(f):
+    while True:
+        chunk = f.read(CHUNK_BYTES)
+        if not chunk:
+            return
+        yield chunk
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help='NDJSON file from generate_demo_data.py, or "-" for stdin')
+    parser.add_argument("--url", default="http://localhost:8000")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    f = sys.stdin.buffer if args.path == "-" else open(args.path, "rb")
+    try:
+        response = httpx.post(f"{args.url}/api/seed", content=read_chunks(f),
+                              headers={"content-type": "application/x-ndjson"}, timeout=None)
+    finally:
+        if f is not sys.stdin.buffer:
+            f.close()
+
+    if response.status_code != 200:
+        print(f"Seeding failed ({response.status_code}): {response.text}", file=sys.stderr)
+        sys.exit(1)
+    result = response.json()
+    print(f"Seeded {result['users']} users and {result['actions']} actions in {time.perf_counter() - started:.1f}s "
+          f"({result['skipped']} lines skipped, {result['existing_users']} users already existed)")
+    for error in result["errors"][:10]:
+        print(f"  line {error['line']}: {error['error']}", file=sys.stderr)
+    print(f"Global stats: {result['global_stats']}")
+
+
+if __name__ == "__main__":
+    main()
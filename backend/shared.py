@@ -0,0 +1,508 @@
+"""
+Multi-worker shared state backed by one local SQLite file.
+
+With `uvicorn --workers N` every worker is its own process, so plain dicts and
+lists diverge. Setting SHARED_STATE=1 swaps global_stats, users_db, actions_db
+and the rolling aggregates for the classes below, which all read and write the
+same SQLite database (WAL mode, so readers never block the writer).
+
+Counter updates are single UPDATE ... SET value = value + ? statements inside an
+IMMEDIATE transaction, so concurrent workers never lose an increment.
+
+Everything written on the request path except user profiles is write-behind:
+logged actions, per-user totals and buckets, rolling aggregates, leaderboards
+and counter increments are queued to a writer thread with its own connection,
+which commits everything queued so far in one transaction. Waiting on another
+worker's lock then happens off the event loop. Dashboards and leaderboards
+trail a log by a few milliseconds; counters apply the worker's own increments
+locally straight away. User profiles are written in place, since the next
+request (possibly on another worker) reads them back.
+
+Each class mirrors the API of the in-process object it replaces, so the
+endpoints in main.py don't need to know which mode they're in.
+"""
+import json
+import queue
+import sqlite3
+import threading
+import time
+from datetime import date, datetime
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from history import GRANULARITIES, Buckets, bucket_keys
+from leaderboard import Entry, oldest_periods, period_key, sum_entries
+from storage import migrate_actions_table
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS claims (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS users (
+    user_id TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS actions (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    logged_at TEXT NOT NULL,
+    category TEXT NOT NULL,
+    action_type TEXT NOT NULL,
+    quantity REAL NOT NULL,
+    co2_saved_kg REAL NOT NULL,
+    factor_version TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_actions_user_id ON actions (user_id);
+CREATE INDEX IF NOT EXISTS idx_actions_logged_at ON actions (logged_at);
+CREATE TABLE IF NOT EXISTS user_totals (
+    user_id TEXT PRIMARY KEY,
+    total_co2_saved_kg REAL NOT NULL,
+    action_count INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS user_days (
+    user_id TEXT NOT NULL,
+    day TEXT NOT NULL,
+    PRIMARY KEY (user_id, day)
+);
+CREATE TABLE IF NOT EXISTS user_buckets (
+    user_id TEXT NOT NULL,
+    granularity TEXT NOT NULL,
+    period TEXT NOT NULL,
+    category TEXT NOT NULL,
+    kg REAL NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (user_id, granularity, period, category)
+);
+CREATE TABLE IF NOT EXISTS day_totals (
+    day TEXT PRIMARY KEY,
+    kg REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS second_totals (
+    second INTEGER PRIMARY KEY,
+    kg REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS leaderboard (
+    span TEXT NOT NULL,
+    period TEXT NOT NULL,
+    dimension TEXT NOT NULL,
+    key TEXT NOT NULL,
+    kg REAL NOT NULL,
+    PRIMARY KEY (span, period, dimension, key)
+);
+CREATE INDEX IF NOT EXISTS idx_leaderboard_rank ON leaderboard (span, period, dimension, kg DESC, key);
+"""
+
+ACTION_COLUMNS = ("id", "user_id", "logged_at", "category", "action_type", "quantity", "co2_saved_kg",
+                  "factor_version")
+
+_STOP = object()
+
+
+def run_transaction(conn: sqlite3.Connection, statements):
+    """Run (sql, params) pairs in one IMMEDIATE transaction (a list of params is executemany)"""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for sql, params in statements:
+            if isinstance(params, list):
+                if params:
+                    conn.executemany(sql, params)
+            else:
+                conn.execute(sql, params)
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+class SharedDB:
+    """One connection per process to the shared state file, plus a write-behind writer thread"""
+
+    def __init__(self, path: str, batch_size: int = 500):
+        self.path = path
+        self.batch_size = batch_size
+        self.batches_committed = 0
+        # Bumped by the writer around every commit, so readers can tell one overlapped them
+        self.commits_started = 0
+        self.commits_done = 0
+        self._lock = threading.Lock()
+        self.conn = self._connect()
+        self.conn.executescript(SCHEMA)
+        migrate_actions_table(self.conn)
+
+        self._queue: "queue.Queue" = queue.Queue()
+        self._writer = threading.Thread(target=self._run_writer, name="shared-writer", daemon=True)
+        self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def write(self, statements):
+        """Run (sql, params) pairs in one IMMEDIATE transaction, now"""
+        with self._lock:
+            run_transaction(self.conn, statements)
+
+    def write_later(self, statements, on_commit: Optional[Callable[[], None]] = None):
+        """Queue (sql, params) pairs for the writer thread (applied in order).
+
+        on_commit runs on the writer thread once they're committed (or have failed).
+        """
+        self._queue.put((statements, on_commit))
+
+    def flush(self):
+        """Block until everything queued so far is committed"""
+        self._queue.join()
+
+    def close(self):
+        self._queue.put(_STOP)
+        self._writer.join()
+
+    def _run_writer(self):
+        conn = self._connect()
+        stopping = False
+        while not stopping:
+            batch = [self._queue.get()]
+            # Group commit: everything already queued goes in the same transaction
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            writes = [item for item in batch if item is not _STOP]
+            stopping = len(writes) != len(batch)
+            self.commits_started += 1
+            try:
+                run_transaction(conn, [statement for statements, _ in writes for statement in statements])
+                self.batches_committed += 1
+            except sqlite3.Error as e:
+                print(f"ERROR in shared state writer: {e}")
+            finally:
+                for _, on_commit in writes:
+                    if on_commit is not None:
+                        on_commit()
+                self.commits_done += 1
+                for _ in batch:
+                    self._queue.task_done()
+        conn.close()
+
+    def claim(self, key: str, value: str) -> bool:
+        """Set key to value unless it already is; True only for the worker that changed it"""
+        with self._lock:
+            cursor = self.conn.execute(
+                "INSERT INTO claims (key, value) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value WHERE claims.value != excluded.value",
+                (key, value))
+            return cursor.rowcount == 1
+
+    def setting(self, key: str, default: str) -> str:
+        """The value stored under key, storing default first if there is none (every worker gets the same one)"""
+        with self._lock:
+            self.conn.execute("INSERT OR IGNORE INTO claims (key, value) VALUES (?, ?)", (key, default))
+            return self.conn.execute("SELECT value FROM claims WHERE key = ?", (key,)).fetchone()[0]
+
+    def read(self, sql: str, params=()):
+        with self._lock:
+            return self.conn.execute(sql, params).fetchall()
+
+
+class SharedStats(dict):
+    """global_stats whose numeric counters live in the shared database.
+
+    It's still a dict (so it serializes like one), but the values are refreshed
+    from the database at most every refresh_interval_s. Increments are applied
+    locally at once and written behind; until they're committed a refresh adds
+    them to what it reads, and a refresh that overlaps a commit is skipped, so
+    the counters never step backwards.
+    """
+
+    def __init__(self, db: SharedDB, initial: Dict[str, Any], refresh_interval_s: float = 0.25):
+        super().__init__(initial)
+        self.db = db
+        self.refresh_interval_s = refresh_interval_s
+        self._refreshed_at = 0.0
+        self._unflushed: Dict[str, float] = {}  # Increments queued but not committed yet
+        self._unflushed_lock = threading.Lock()
+        # First worker to start seeds the counters; the rest keep what's there
+        db.write(
+            [("INSERT OR IGNORE INTO counters (name, value) VALUES (?, ?)",
+              [(k, v) for k, v in initial.items() if isinstance(v, (int, float))])]
+            + [("INSERT OR IGNORE INTO meta (key, value) VALUES (?, ?)",
+                [(k, json.dumps(v)) for k, v in initial.items() if not isinstance(v, (int, float))])]
+        )
+        self.refresh(force=True)
+
+    def refresh(self, force: bool = False) -> "SharedStats":
+        now = time.monotonic()
+        if not force and now - self._refreshed_at < self.refresh_interval_s:
+            return self
+        started = self.db.commits_started
+        if started != self.db.commits_done:
+            return self  # A commit is in flight; keep the local values and try again next time
+        with self._unflushed_lock:
+            unflushed = dict(self._unflushed)
+        counters = self.db.read("SELECT name, value FROM counters")
+        if self.db.commits_started != started:
+            return self
+        for name, value in counters:
+            value += unflushed.get(name, 0)
+            # Counters are stored as REAL; keep the integer ones integers
+            super().__setitem__(name, int(value) if isinstance(self.get(name), int) else value)
+        for key, value in self.db.read("SELECT key, value FROM meta"):
+            super().__setitem__(key, json.loads(value))
+        self._refreshed_at = now
+        return self
+
+    def incr(self, deltas: Dict[str, float]):
+        """Atomically add to counters across all workers (committed in the background)"""
+        with self._unflushed_lock:
+            for name, delta in deltas.items():
+                self._unflushed[name] = self._unflushed.get(name, 0) + delta
+
+        def committed():
+            with self._unflushed_lock:
+                for name, delta in deltas.items():
+                    self._unflushed[name] -= delta
+
+        for name, delta in deltas.items():
+            super().__setitem__(name, self.get(name, 0) + delta)
+        self.db.write_later([("UPDATE counters SET value = value + ? WHERE name = ?",
+                              [(delta, name) for name, delta in deltas.items()])], committed)
+
+    def __setitem__(self, key, value):
+        if isinstance(value, (int, float)):
+            self.db.write([("INSERT INTO counters (name, value) VALUES (?, ?) "
+                            "ON CONFLICT(name) DO UPDATE SET value = excluded.value", (key, value))])
+        else:
+            # Only ever overwritten (last_updated), so it needn't be committed before we go on
+            self.db.write_later([("INSERT INTO meta (key, value) VALUES (?, ?) "
+                                  "ON CONFLICT(key) DO UPDATE SET value = excluded.value", (key, json.dumps(value)))])
+        super().__setitem__(key, value)
+
+
+class SharedUserStore:
+    """users_db backed by the shared database.
+
+    Reads return a fresh dict each time; callers write changes back with
+    save() (or item assignment).
+    """
+
+    def __init__(self, db: SharedDB):
+        self.db = db
+
+    def __contains__(self, user_id) -> bool:
+        return bool(self.db.read("SELECT 1 FROM users WHERE user_id = ?", (user_id,)))
+
+    def __getitem__(self, user_id: str) -> Dict[str, Any]:
+        rows = self.db.read("SELECT data FROM users WHERE user_id = ?", (user_id,))
+        if not rows:
+            raise KeyError(user_id)
+        return json.loads(rows[0][0])
+
+    def get(self, user_id: str, default=None):
+        try:
+            return self[user_id]
+        except KeyError:
+            return default
+
+    def __setitem__(self, user_id: str, user: Dict[str, Any]):
+        self.db.write([("INSERT INTO users (user_id, data) VALUES (?, ?) "
+                        "ON CONFLICT(user_id) DO UPDATE SET data = excluded.data", (user_id, json.dumps(user)))])
+
+    def save(self, user: Dict[str, Any]):
+        self[user["user_id"]] = user
+
+    def update(self, users: Dict[str, Dict[str, Any]]):
+        for user_id, user in users.items():
+            self[user_id] = user
+
+    def __len__(self) -> int:
+        return self.db.read("SELECT COUNT(*) FROM users")[0][0]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter([row[0] for row in self.db.read("SELECT user_id FROM users")])
+
+    def values(self):
+        return [json.loads(row[0]) for row in self.db.read("SELECT data FROM users")]
+
+    def items(self):
+        return [(user["user_id"], user) for user in self.values()]
+
+
+class SharedActionStore:
+    """actions_db backed by the shared database, with per-user running totals (written behind)"""
+
+    def __init__(self, db: SharedDB):
+        self.db = db
+
+    def extend(self, records: List[Dict[str, Any]]):
+        if not records:
+            return
+        per_user: Dict[str, List[float]] = {}
+        days = set()
+        buckets: Dict[tuple, List[float]] = {}
+        for r in records:
+            totals = per_user.setdefault(r["user_id"], [0.0, 0])
+            totals[0] += r["co2_saved_kg"]
+            totals[1] += 1
+            days.add((r["user_id"], r["logged_at"][:10]))
+            for granularity, period in zip(GRANULARITIES, bucket_keys(r["logged_at"][:10])):
+                bucket = buckets.setdefault((r["user_id"], granularity, period, r["category"]), [0.0, 0])
+                bucket[0] += r["co2_saved_kg"]
+                bucket[1] += 1
+        self.db.write_later([
+            ("INSERT OR IGNORE INTO actions (id, user_id, logged_at, category, action_type, quantity, co2_saved_kg, "
+             "factor_version) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", [tuple(r.get(c) for c in ACTION_COLUMNS) for r in records]),
+            ("INSERT INTO user_totals (user_id, total_co2_saved_kg, action_count) VALUES (?, ?, ?) "
+             "ON CONFLICT(user_id) DO UPDATE SET total_co2_saved_kg = total_co2_saved_kg + excluded.total_co2_saved_kg, "
+             "action_count = action_count + excluded.action_count",
+             [(user_id, kg, count) for user_id, (kg, count) in per_user.items()]),
+            ("INSERT OR IGNORE INTO user_days (user_id, day) VALUES (?, ?)", list(days)),
+            ("INSERT INTO user_buckets (user_id, granularity, period, category, kg, count) VALUES (?, ?, ?, ?, ?, ?) "
+             "ON CONFLICT(user_id, granularity, period, category) DO UPDATE SET kg = kg + excluded.kg, "
+             "count = count + excluded.count", [key + (kg, count) for key, (kg, count) in buckets.items()]),
+        ])
+
+    def append(self, record: Dict[str, Any]):
+        self.extend([record])
+
+    def user_summary(self, user_id: str) -> Dict[str, Any]:
+        totals = self.db.read("SELECT total_co2_saved_kg, action_count FROM user_totals WHERE user_id = ?", (user_id,))
+        if not totals:
+            return {"total_co2_saved_kg": 0.0, "action_count": 0, "days_active": 0, "first_active_day": None}
+        days, first_day = self.db.read("SELECT COUNT(*), MIN(day) FROM user_days WHERE user_id = ?", (user_id,))[0]
+        return {"total_co2_saved_kg": totals[0][0], "action_count": totals[0][1], "days_active": days,
+                "first_active_day": first_day}
+
+    def user_buckets(self, user_id: str, granularity: str, periods: List[str]) -> Buckets:
+        if not periods:
+            return {}
+        rows = self.db.read(
+            "SELECT period, category, kg, count FROM user_buckets "
+            "WHERE user_id = ? AND granularity = ? AND period BETWEEN ? AND ?",
+            (user_id, granularity, periods[0], periods[-1]))
+        buckets: Dict[str, tuple] = {}
+        for period, category, kg, count in rows:
+            kg_by_category, total = buckets.get(period, ({}, 0))
+            kg_by_category[category] = kg
+            buckets[period] = (kg_by_category, total + count)
+        return buckets
+
+    def query(self, user_id: Optional[str] = None, category: Optional[str] = None,
+              start: Optional[str] = None, end: Optional[str] = None,
+              page_size: int = 5000) -> Iterator[Dict[str, Any]]:
+        """Same as ActionStore.query, read a page of rows at a time"""
+        filters, params = [], []
+        for clause, value in (("user_id = ?", user_id), ("category = ?", category),
+                              ("logged_at >= ?", start), ("logged_at < ?", end)):
+            if value is not None:
+                filters.append(clause)
+                params.append(value)
+        # Stop at the current last row so actions added during the scan aren't included
+        last_rowid = self.db.read("SELECT COALESCE(MAX(rowid), 0) FROM actions")[0][0]
+        sql = (f"SELECT rowid, {', '.join(ACTION_COLUMNS)} FROM actions "
+               f"WHERE {' AND '.join(['rowid > ?', 'rowid <= ?'] + filters)} ORDER BY rowid LIMIT ?")
+        after = 0
+        while True:
+            rows = self.db.read(sql, (after, last_rowid, *params, page_size))
+            for row in rows:
+                yield dict(zip(ACTION_COLUMNS, row[1:]))
+            if len(rows) < page_size:
+                return
+            after = rows[-1][0]
+
+    def __len__(self) -> int:
+        return self.db.read("SELECT COUNT(*) FROM actions")[0][0]
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        rows = self.db.read(f"SELECT {', '.join(ACTION_COLUMNS)} FROM actions ORDER BY logged_at, rowid")
+        return (dict(zip(ACTION_COLUMNS, row)) for row in rows)
+
+
+class SharedAggregator:
+    """Shared version of aggregates.RollingAggregator (last-window and per-day kg)"""
+
+    def __init__(self, db: SharedDB, window_s: int = 60):
+        self.db = db
+        self.window_s = window_s
+
+    def add_many(self, entries: Iterable[Tuple[float, datetime]]):
+        """Add (kg, when) pairs, summed per day and second into one write"""
+        day_kg: Dict[str, float] = {}
+        second_kg: Dict[int, float] = {}
+        now_s = int(time.time())
+        for kg, when in entries:
+            day = when.date().isoformat()
+            day_kg[day] = day_kg.get(day, 0.0) + kg
+            second = int(when.timestamp())
+            if second <= now_s:  # A future second would stay in the window
+                second_kg[second] = second_kg.get(second, 0.0) + kg
+        if not day_kg:
+            return
+        self.db.write_later([
+            ("INSERT INTO day_totals (day, kg) VALUES (?, ?) ON CONFLICT(day) DO UPDATE SET kg = kg + excluded.kg",
+             list(day_kg.items())),
+            ("INSERT INTO second_totals (second, kg) VALUES (?, ?) "
+             "ON CONFLICT(second) DO UPDATE SET kg = kg + excluded.kg", list(second_kg.items())),
+            # Keep the per-second table to roughly one window
+            ("DELETE FROM second_totals WHERE second <= ?", (int(time.time()) - 2 * self.window_s,)),
+        ])
+
+    def last_window_kg(self, now: Optional[float] = None) -> float:
+        oldest = int(now if now is not None else time.time()) - self.window_s
+        return self.db.read("SELECT COALESCE(SUM(kg), 0) FROM second_totals WHERE second > ?", (oldest,))[0][0]
+
+    def day_kg(self, day: Optional[date] = None) -> float:
+        day = day or datetime.now().date()
+        rows = self.db.read("SELECT kg FROM day_totals WHERE day = ?", (day.isoformat(),))
+        return rows[0][0] if rows else 0.0
+
+class SharedLeaderboards:
+    """Shared version of leaderboard.Leaderboards; top-K and rank read the kg index"""
+
+    def __init__(self, db: SharedDB, days_kept: int = 8, weeks_kept: int = 3):
+        self.db = db
+        self.days_kept = days_kept
+        self.weeks_kept = weeks_kept
+
+    def add_many(self, entries: Iterable[Entry]):
+        oldest = oldest_periods(self.days_kept, self.weeks_kept)
+        rows = [(window, period, dimension, key, kg)
+                for (window, period, dimension), per_key in sum_entries(entries, oldest).items()
+                for key, kg in per_key.items()]
+        if not rows:
+            return
+        self.db.write_later([
+            ("INSERT INTO leaderboard (span, period, dimension, key, kg) VALUES (?, ?, ?, ?, ?) "
+             "ON CONFLICT(span, period, dimension, key) DO UPDATE SET kg = kg + excluded.kg", rows),
+            ("DELETE FROM leaderboard WHERE (span = 'day' AND period < ?) OR (span = 'week' AND period < ?)",
+             (oldest["day"], oldest["week"])),
+        ])
+
+    def top(self, dimension: str, window: str, limit: int, period: Optional[str] = None) -> List[Dict[str, Any]]:
+        rows = self.db.read(
+            "SELECT key, kg FROM leaderboard WHERE span = ? AND period = ? AND dimension = ? "
+            "ORDER BY kg DESC, key LIMIT ?",
+            (window, period or period_key(window, date.today()), dimension, limit))
+        return [{"rank": i + 1, "key": key, "co2_saved_kg": kg} for i, (key, kg) in enumerate(rows)]
+
+    def rank(self, dimension: str, window: str, key: str, period: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        board = (window, period or period_key(window, date.today()), dimension)
+        rows = self.db.read("SELECT kg FROM leaderboard WHERE span = ? AND period = ? AND dimension = ? AND key = ?",
+                            board + (key,))
+        if not rows:
+            return None
+        kg = rows[0][0]
+        ahead, total = self.db.read(
+            "SELECT COALESCE(SUM(kg > ? OR (kg = ? AND key < ?)), 0), COUNT(*) FROM leaderboard "
+            "WHERE span = ? AND period = ? AND dimension = ?", (kg, kg, key) + board)[0]
+        return {"rank": ahead + 1, "key": key, "co2_saved_kg": kg, "of": total}
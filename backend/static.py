@@ -0,0 +1,144 @@
+"""
+In-memory static file layer for the frontend.
+
+Every file under the frontend directory is read once, with gzip (and, if the
+brotli package is installed, brotli) variants compressed ahead of time. A
+request is then a dict lookup: pick the best encoding the client accepts,
+answer 304 when its If-None-Match still matches, otherwise send the bytes.
+
+refresh() rescans the directory and recompresses only files whose mtime or
+size changed, so edits show up without a restart (main.py calls it on a timer).
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+from typing import Dict, Optional, Tuple
+
+from starlette.responses import Response
+
+try:
+    import brotli
+except ImportError:  # Optional: gzip only
+    brotli = None
+
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml")
+MIN_COMPRESS_BYTES = 256
+# HTML isn't fingerprinted, so browsers revalidate it (a cheap 304); other files can be reused briefly
+HTML_CACHE_CONTROL = "no-cache"
+ASSET_CACHE_CONTROL = "public, max-age=300"
+
+mimetypes.add_type("text/javascript", ".js")
+
+
+class Asset:
+    __slots__ = ("content_type", "cache_control", "variants", "stamp")
+
+    def __init__(self, path: str, data: bytes, stamp: Tuple[int, int]):
+        self.stamp = stamp
+        self.content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        self.cache_control = HTML_CACHE_CONTROL if self.content_type == "text/html" else ASSET_CACHE_CONTROL
+        digest = hashlib.sha256(data).hexdigest()[:20]
+        # encoding -> (body, strong ETag); each encoding is its own representation
+        self.variants: Dict[str, Tuple[bytes, str]] = {"identity": (data, f'"{digest}"')}
+        if len(data) >= MIN_COMPRESS_BYTES and self.content_type.startswith(COMPRESSIBLE_TYPES):
+            compressed = gzip.compress(data, compresslevel=9, mtime=0)
+            if len(compressed) < len(data):
+                self.variants["gzip"] = (compressed, f'"{digest}-gz"')
+            if brotli is not None:
+                compressed = brotli.compress(data, quality=11)
+                if len(compressed) < len(data):
+                    self.variants["br"] = (compressed, f'"{digest}-br"')
+
+    def select(self, accept_encoding: str) -> str:
+        """Best encoding the client accepts (br, then gzip, else identity)"""
+        accepted = set()
+        for part in accept_encoding.lower().split(","):
+            coding, _, params = part.partition(";")
+            params = params.replace(" ", "")
+            try:
+                if params.startswith("q=") and float(params[2:]) == 0:
+                    continue  # Explicitly refused
+            except ValueError:
+                pass
+            accepted.add(coding.strip())
+        for encoding in ("br", "gzip"):
+            if encoding in self.variants and (encoding in accepted or "*" in accepted):
+                return encoding
+        return "identity"
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison, as If-None-Match requires
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+class StaticAssets:
+    def __init__(self, directory: str, index: str = "index.html"):
+        self.directory = os.path.abspath(directory)
+        self.index = index
+        self.assets: Dict[str, Asset] = {}  # Relative URL path ("index.html", "img/logo.svg") -> Asset
+        self.reloads = 0
+        self.refresh()
+        self.reloads = 0  # Only count reloads after the initial load
+
+    def refresh(self) -> int:
+        """Load new and changed files, forget deleted ones; returns how many changed"""
+        seen = set()
+        changed = 0
+        for root, dirs, files in os.walk(self.directory):
+            dirs[:] = [d for d in dirs if not d.startswith(".") and d != "node_modules"]
+            for name in files:
+                if name.startswith("."):
+                    continue
+                path = os.path.join(root, name)
+                key = os.path.relpath(path, self.directory).replace(os.sep, "/")
+                try:
+                    stat = os.stat(path)
+                    stamp = (stat.st_mtime_ns, stat.st_size)
+                    seen.add(key)
+                    current = self.assets.get(key)
+                    if current is not None and current.stamp == stamp:
+                        continue
+                    with open(path, "rb") as f:
+                        self.assets[key] = Asset(path, f.read(), stamp)
+                except OSError as e:
+                    print(f"Error loading static file {path}: {e}")
+                    continue
+                changed += 1
+        for key in set(self.assets) - seen:
+            del self.assets[key]
+            changed += 1
+        if changed:
+            self.reloads += 1
+        return changed
+
+    def response(self, path: str, headers, head: bool = False) -> Optional[Response]:
+        """Response for a URL path (relative, "" for the index), or None if there's no such file"""
+        path = path.strip("/")
+        asset = self.assets.get(path or self.index) or self.assets.get(f"{path}/{self.index}")
+        if asset is None:
+            return None
+        encoding = asset.select(headers.get("accept-encoding", ""))
+        body, etag = asset.variants[encoding]
+        response_headers = {"ETag": etag, "Cache-Control": asset.cache_control}
+        if len(asset.variants) > 1:
+            response_headers["Vary"] = "Accept-Encoding"
+        if etag_matches(headers.get("if-none-match", ""), etag):
+            return Response(status_code=304, headers=response_headers)
+        if encoding != "identity":
+            response_headers["Content-Encoding"] = encoding
+        response = Response(b"" if head else body, media_type=asset.content_type, headers=response_headers)
+        response.headers["Content-Length"] = str(len(body))
+        return response
+
+    def get_stats(self):
+        return {
+            "directory": self.directory,
+            "files": len(self.assets),
+            "bytes": sum(len(asset.variants["identity"][0]) for asset in self.assets.values()),
+            "brotli": brotli is not None,
+            "reloads": self.reloads,
+        }
@@ -0,0 +1,214 @@
+"""
+Pluggable persistence for users_db, actions_db and global_stats.
+
+The in-memory structures in main.py stay the serving state (indexes, rolling
+aggregates). A storage backend only has to load that state at startup and
+accept writes as they happen:
+
+- MemoryStorage keeps the original behavior: nothing survives a restart.
+- SQLiteStorage writes to a SQLite database in WAL mode. Writes are queued and
+  applied by a background thread in group-committed batches, so the request
+  path only pays for a queue put.
+- JournalStorage (journal.py) appends to a journal and takes periodic
+  snapshots of the in-memory state.
+
+Pick one with STORAGE_BACKEND=memory|sqlite|journal (see create_storage).
+Backends that want periodic snapshots set snapshot_interval_s.
+"""
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from journal import JournalStorage
+
+
+class MemoryStorage:
+    """No-op backend - state lives only in the process"""
+    name = "memory"
+    snapshot_interval_s = None
+
+    def load(self) -> Tuple[Dict[str, Dict[str, Any]], List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        return {}, [], None
+
+    def save_user(self, user: Dict[str, Any]):
+        pass
+
+    def append_actions(self, records: List[Dict[str, Any]]):
+        pass
+
+    def save_stats(self, stats: Dict[str, Any]):
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS actions (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    logged_at TEXT NOT NULL,
+    category TEXT NOT NULL,
+    action_type TEXT NOT NULL,
+    quantity REAL NOT NULL,
+    co2_saved_kg REAL NOT NULL,
+    factor_version TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_actions_user_id ON actions (user_id);
+CREATE INDEX IF NOT EXISTS idx_actions_logged_at ON actions (logged_at);
+CREATE TABLE IF NOT EXISTS stats (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+# Statements are kept constant so sqlite3's statement cache reuses the prepared form
+UPSERT_USER = "INSERT INTO users (user_id, data) VALUES (?, ?) ON CONFLICT(user_id) DO UPDATE SET data = excluded.data"
+INSERT_ACTION = ("INSERT OR IGNORE INTO actions (id, user_id, logged_at, category, action_type, quantity, co2_saved_kg, "
+                 "factor_version) VALUES (?, ?, ?, ?, ?, ?, ?, ?)")
+UPSERT_STATS = "INSERT INTO stats (key, value) VALUES ('global', ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value"
+
+ACTION_COLUMNS = ("id", "user_id", "logged_at", "category", "action_type", "quantity", "co2_saved_kg",
+                  "factor_version")
+
+_STOP = object()
+
+
+def migrate_actions_table(conn: sqlite3.Connection):
+    """Add columns introduced after a database was created"""
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(actions)")}
+    if "factor_version" not in columns:
+        try:
+            conn.execute("ALTER TABLE actions ADD COLUMN factor_version TEXT")
+        except sqlite3.OperationalError:
+            pass  # Another process added it first
+
+
+class SQLiteStorage:
+    """SQLite (WAL) backend with a background group-commit writer"""
+    name = "sqlite"
+    snapshot_interval_s = None
+
+    def __init__(self, path: str, batch_size: int = 500, flush_interval_s: float = 0.05):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval_s = flush_interval_s
+        self.batches_committed = 0
+        self.rows_written = 0
+
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        migrate_actions_table(conn)
+        conn.commit()
+        conn.close()
+
+        self._queue: "queue.Queue" = queue.Queue()
+        self._writer = threading.Thread(target=self._run_writer, name="sqlite-writer", daemon=True)
+        self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False, cached_statements=64)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")  # Safe with WAL, fsyncs at checkpoints
+        return conn
+
+    def load(self):
+        conn = self._connect()
+        try:
+            users = {user_id: json.loads(data) for user_id, data in conn.execute("SELECT user_id, data FROM users")}
+            actions = [
+                dict(zip(ACTION_COLUMNS, row))
+                for row in conn.execute(f"SELECT {', '.join(ACTION_COLUMNS)} FROM actions ORDER BY logged_at, rowid")
+            ]
+            row = conn.execute("SELECT value FROM stats WHERE key = 'global'").fetchone()
+            stats = json.loads(row[0]) if row else None
+        finally:
+            conn.close()
+        return users, actions, stats
+
+    # Request-path writes: serialize now (the caller may mutate the dict later), apply later
+    def save_user(self, user: Dict[str, Any]):
+        self._queue.put((UPSERT_USER, (user["user_id"], json.dumps(user))))
+
+    def append_actions(self, records: List[Dict[str, Any]]):
+        if records:
+            rows = [tuple(r.get(c) for c in ACTION_COLUMNS) for r in records]
+            self._queue.put((INSERT_ACTION, rows))
+
+    def save_stats(self, stats: Dict[str, Any]):
+        self._queue.put((UPSERT_STATS, (json.dumps(stats),)))
+
+    def flush(self):
+        """Block until everything queued so far is committed"""
+        self._queue.join()
+
+    def close(self):
+        self._queue.put(_STOP)
+        self._writer.join()
+
+    def _run_writer(self):
+        conn = self._connect()
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            batch = [item]
+            # Group commit: gather whatever else arrives within the flush interval
+            deadline = time.monotonic() + self.flush_interval_s
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            writes = [w for w in batch if w is not _STOP]
+            stopping = len(writes) != len(batch)
+            try:
+                with conn:
+                    for sql, params in writes:
+                        if sql is INSERT_ACTION:
+                            conn.executemany(sql, params)
+                            self.rows_written += len(params)
+                        else:
+                            conn.execute(sql, params)
+                            self.rows_written += 1
+                self.batches_committed += 1
+            except sqlite3.Error as e:
+                print(f"ERROR in sqlite writer: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+        conn.close()
+
+
+def create_storage():
+    """Build the backend selected by STORAGE_BACKEND"""
+    backend = os.environ.get("STORAGE_BACKEND", "memory")
+    if backend == "memory":
+        return MemoryStorage()
+    if backend == "sqlite":
+        return SQLiteStorage(
+            os.environ.get("SQLITE_PATH", "carbonbuddy.db"),
+            batch_size=int(os.environ.get("SQLITE_BATCH_SIZE", "500")),
+            flush_interval_s=float(os.environ.get("SQLITE_FLUSH_INTERVAL_MS", "50")) / 1000,
+        )
+    if backend == "journal":
+        return JournalStorage(
+            os.environ.get("JOURNAL_DIR", "journal"),
+            fsync_interval_s=float(os.environ.get("JOURNAL_FSYNC_INTERVAL_MS", "50")) / 1000,
+            snapshot_interval_s=float(os.environ.get("JOURNAL_SNAPSHOT_INTERVAL_S", "300")),
+        )
+    raise ValueError(f"Unknown STORAGE_BACKEND: {backend}")
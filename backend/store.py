@@ -0,0 +1,372 @@
+"""
+Columnar in-memory action store.
+
+Behaves like the plain actions_db list it replaces (append, iterate, len,
+indexing) and hands out the same action dicts, but keeps each field in its own
+compact column instead of one dict per action:
+
+- user_id, category, action_type and factor_version are interned to int codes
+- logged_at is microseconds since the epoch (naive local time, like the strings)
+- quantity and co2_saved_kg are float arrays
+- UUID ids (everything the app generates) take 16 bytes; other ids stay strings
+
+Columns grow in fixed-size chunks, so an append never copies what is already
+stored, and full chunks can be filtered with NumPy without copying (query()
+does when it's installed).
+
+A per-user index keeps row numbers, running totals and per-day, per-category
+history in flat arrays (see history.py), so dashboards read precomputed state
+instead of scanning every action ever logged.
+"""
+import re
+from array import array
+from bisect import bisect_left
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional
+
+from history import GRANULARITIES, Buckets, bucket_keys, period_days
+
+try:
+    import numpy as np
+except ImportError:  # Optional - filters and sums fall back to plain loops
+    np = None
+
+CHUNK_SIZE = 1 << 16  # Rows per column chunk
+EPOCH = datetime(1970, 1, 1)
+ONE_US = timedelta(microseconds=1)
+US_PER_DAY = 86_400_000_000
+EPOCH_ORDINAL = EPOCH.toordinal()
+DAY_SHIFT = 24  # History keys are (date ordinal << DAY_SHIFT) | category code
+LOW_64 = (1 << 64) - 1
+_UUID = re.compile(r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}")
+
+
+def to_epoch_us(timestamp: str) -> int:
+    when = datetime.fromisoformat(timestamp)
+    if when.tzinfo is not None:
+        raise ValueError(f"expected a naive local timestamp, got {timestamp!r}")
+    return (when - EPOCH) // ONE_US
+
+
+def from_epoch_us(value: int) -> str:
+    return (EPOCH + timedelta(microseconds=value)).isoformat()
+
+
+def uuid_int(action_id: Any) -> Optional[int]:
+    """The id as a 128-bit int if it's a canonical (lowercase, hyphenated) UUID string"""
+    if isinstance(action_id, str) and _UUID.fullmatch(action_id):
+        return int(action_id.replace("-", ""), 16)
+    return None
+
+
+def uuid_str(value: int) -> str:
+    h = f"{value:032x}"
+    return f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}"
+
+
+class Interner:
+    """Values <-> small int codes"""
+    __slots__ = ("codes", "values")
+
+    def __init__(self):
+        self.codes: Dict[Any, int] = {}
+        self.values: List[Any] = []
+
+    def code(self, value: Any) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+class Column:
+    """Append-only typed array, stored as chunks of CHUNK_SIZE values"""
+    __slots__ = ("typecode", "chunks")
+
+    def __init__(self, typecode: str):
+        self.typecode = typecode
+        self.chunks = [array(typecode)]
+
+    def new_chunk(self) -> array:
+        chunk = array(self.typecode)
+        self.chunks.append(chunk)
+        return chunk
+
+    def __getitem__(self, row: int):
+        return self.chunks[row // CHUNK_SIZE][row % CHUNK_SIZE]
+
+    def chunk_array(self, index: int, count: int):
+        """NumPy array of the first count values of one chunk"""
+        chunk = self.chunks[index]
+        if len(chunk) < CHUNK_SIZE:
+            chunk = chunk[:count]  # Copy: the last chunk can't be resized while a view of it exists
+        return np.frombuffer(chunk, dtype=chunk.typecode)[:count]
+
+
+class UserActions:
+    """Per-user slice of the store, updated on every append.
+
+    History is one entry per (day, category) in three parallel arrays sorted by
+    key; week and month buckets are summed from the days when read.
+    """
+    __slots__ = ("rows", "total_co2_saved_kg", "action_count", "days_active", "day_keys", "day_kg", "day_counts")
+
+    def __init__(self):
+        self.rows = array("I")
+        self.total_co2_saved_kg = 0.0
+        self.action_count = 0
+        self.days_active = 0
+        self.day_keys = array("q")
+        self.day_kg = array("d")
+        self.day_counts = array("I")
+
+    def add(self, row: int, co2_saved_kg: float, day_ordinal: int, category_code: int):
+        self.rows.append(row)
+        self.total_co2_saved_kg += co2_saved_kg
+        self.action_count += 1
+        keys = self.day_keys
+        key = day_ordinal << DAY_SHIFT | category_code
+        # Actions mostly arrive in time order, so the key is usually the last or a new last one
+        i = len(keys) if not keys or keys[-1] < key else bisect_left(keys, key)
+        if i < len(keys) and keys[i] == key:
+            self.day_kg[i] += co2_saved_kg
+            self.day_counts[i] += 1
+            return
+        if (i == 0 or keys[i - 1] >> DAY_SHIFT != day_ordinal) and (i == len(keys) or keys[i] >> DAY_SHIFT != day_ordinal):
+            self.days_active += 1
+        keys.insert(i, key)
+        self.day_kg.insert(i, co2_saved_kg)
+        self.day_counts.insert(i, 1)
+
+    def first_day(self) -> Optional[str]:
+        return date.fromordinal(self.day_keys[0] >> DAY_SHIFT).isoformat() if self.day_keys else None
+
+
+class ActionStore:
+    def __init__(self):
+        self._users = Interner()
+        self._categories = Interner()
+        self._action_types = Interner()
+        self._factor_versions = Interner()
+        self._user = Column("I")
+        self._category = Column("I")
+        self._action_type = Column("I")
+        self._factor_version = Column("I")
+        self._logged_at = Column("q")
+        self._quantity = Column("d")
+        self._co2_saved_kg = Column("d")
+        self._id_high = Column("Q")  # UUID ids as two 64-bit halves...
+        self._id_low = Column("Q")
+        self._text_ids: List[Optional[str]] = []  # ...other ids here (None for UUID rows)
+        self._by_user: Dict[str, UserActions] = {}
+        # Every column gets a row per action, so they all fill their chunks together
+        self._columns = (self._id_high, self._id_low, self._user, self._logged_at, self._category,
+                         self._action_type, self._quantity, self._co2_saved_kg, self._factor_version)
+        self._appends = [column.chunks[-1].append for column in self._columns]
+
+    def _convert(self, record: Dict[str, Any]) -> tuple:
+        """Column values for a record; raises (ValueError/TypeError/KeyError) before anything is stored"""
+        for field in ("quantity", "co2_saved_kg"):
+            if isinstance(record[field], bool) or not isinstance(record[field], (int, float)):
+                raise ValueError(f"{field} must be a number")
+        value = uuid_int(record["id"])
+        return (
+            0 if value is None else value >> 64,
+            0 if value is None else value & LOW_64,
+            self._users.code(record["user_id"]),
+            to_epoch_us(record["logged_at"]),
+            self._categories.code(record["category"]),
+            self._action_types.code(record["action_type"]),
+            float(record["quantity"]),
+            float(record["co2_saved_kg"]),
+            self._factor_versions.code(record.get("factor_version")),
+        ), record["id"] if value is None else None  # ...and the id kept as text, if it isn't a UUID
+
+    def _add(self, record: Dict[str, Any], values: tuple, text_id: Optional[str]):
+        row = len(self._text_ids)
+        if row and row % CHUNK_SIZE == 0:
+            self._appends = [column.new_chunk().append for column in self._columns]
+        for append, column_value in zip(self._appends, values):
+            append(column_value)
+        self._text_ids.append(text_id)
+
+        user_actions = self._by_user.get(record["user_id"])
+        if user_actions is None:
+            user_actions = self._by_user[record["user_id"]] = UserActions()
+        # values: (..., logged_at us, category code, action type, quantity, co2_saved_kg, ...)
+        user_actions.add(row, values[7], values[3] // US_PER_DAY + EPOCH_ORDINAL, values[4])
+
+    def append(self, record: Dict[str, Any]):
+        self._add(record, *self._convert(record))
+
+    def extend(self, records):
+        """Append a batch; if any record is invalid, none of them are stored"""
+        records = list(records)
+        converted = [self._convert(record) for record in records]
+        for record, (values, text_id) in zip(records, converted):
+            self._add(record, values, text_id)
+
+    def _record(self, row: int) -> Dict[str, Any]:
+        action_id = self._text_ids[row]
+        if action_id is None:
+            action_id = uuid_str((self._id_high[row] << 64) | self._id_low[row])
+        return {
+            "id": action_id,
+            "user_id": self._users.values[self._user[row]],
+            "logged_at": from_epoch_us(self._logged_at[row]),
+            "category": self._categories.values[self._category[row]],
+            "action_type": self._action_types.values[self._action_type[row]],
+            "quantity": self._quantity[row],
+            "co2_saved_kg": self._co2_saved_kg[row],
+            "factor_version": self._factor_versions.values[self._factor_version[row]],
+        }
+
+    def user_summary(self, user_id: str) -> Dict[str, Any]:
+        """Running totals for one user, without touching their actions"""
+        user_actions = self._by_user.get(user_id)
+        if user_actions is None:
+            return {"total_co2_saved_kg": 0.0, "action_count": 0, "days_active": 0, "first_active_day": None}
+        return {
+            "total_co2_saved_kg": user_actions.total_co2_saved_kg,
+            "action_count": user_actions.action_count,
+            "days_active": user_actions.days_active,
+            "first_active_day": user_actions.first_day(),
+        }
+
+    def user_buckets(self, user_id: str, granularity: str, periods: List[str]) -> Buckets:
+        """History buckets for the given periods (ones without actions are left out)"""
+        user_actions = self._by_user.get(user_id)
+        if user_actions is None or not periods:
+            return {}
+        bounds = [period_days(granularity, period) for period in periods]
+        keys = user_actions.day_keys
+        first = bisect_left(keys, min(start for start, _ in bounds).toordinal() << DAY_SHIFT)
+        last = bisect_left(keys, max(end for _, end in bounds).toordinal() + 1 << DAY_SHIFT)
+        wanted = set(periods)
+        index = GRANULARITIES.index(granularity)
+        categories = self._categories.values
+        buckets: Dict[str, tuple] = {}
+        for i in range(first, last):
+            day = date.fromordinal(keys[i] >> DAY_SHIFT).isoformat()
+            period = bucket_keys(day)[index]
+            if period not in wanted:
+                continue
+            category = categories[keys[i] & (1 << DAY_SHIFT) - 1]
+            kg_by_category, count = buckets.get(period, ({}, 0))
+            kg_by_category[category] = kg_by_category.get(category, 0.0) + user_actions.day_kg[i]
+            buckets[period] = (kg_by_category, count + user_actions.day_counts[i])
+        return buckets
+
+    def _bounds(self, category: Optional[str], start: Optional[str], end: Optional[str]):
+        """Filters in column terms: (category code, start us, end us); None if the category was never logged"""
+        category_code = None
+        if category is not None:
+            category_code = self._categories.codes.get(category)
+            if category_code is None:
+                return None
+        return (category_code, to_epoch_us(start) if start is not None else None,
+                to_epoch_us(end) if end is not None else None)
+
+    def _chunk_masks(self, n: int, category_code: Optional[int], start_us: Optional[int], end_us: Optional[int]):
+        """(first row, row count, NumPy mask or None for all rows) per chunk of the first n rows"""
+        for index in range((n + CHUNK_SIZE - 1) // CHUNK_SIZE):
+            first = index * CHUNK_SIZE
+            count = min(CHUNK_SIZE, n - first)
+            mask = None
+            if category_code is not None:
+                mask = self._category.chunk_array(index, count) == category_code
+            if start_us is not None or end_us is not None:
+                times = self._logged_at.chunk_array(index, count)
+                if start_us is not None:
+                    mask = times >= start_us if mask is None else mask & (times >= start_us)
+                if end_us is not None:
+                    mask = times < end_us if mask is None else mask & (times < end_us)
+            yield first, count, mask
+
+    def _matching_rows(self, n: int, user_id: Optional[str], bounds) -> Iterator[int]:
+        """Rows among the first n passing the filters (from _bounds), in order"""
+        if bounds is None:
+            return
+        category_code, start_us, end_us = bounds
+
+        if user_id is None and np is not None:
+            # Filter a chunk at a time on the code/timestamp columns
+            for first, count, mask in self._chunk_masks(n, category_code, start_us, end_us):
+                if mask is None:
+                    yield from range(first, first + count)
+                else:
+                    yield from (np.flatnonzero(mask) + first).tolist()
+            return
+
+        if user_id is not None:
+            user_actions = self._by_user.get(user_id)
+            if user_actions is None:
+                return
+            rows = user_actions.rows
+            candidates = (rows[i] for i in range(len(rows)))
+        else:
+            candidates = iter(range(n))
+        for row in candidates:
+            if row >= n:
+                return
+            if category_code is not None and self._category[row] != category_code:
+                continue
+            if start_us is not None and self._logged_at[row] < start_us:
+                continue
+            if end_us is not None and self._logged_at[row] >= end_us:
+                continue
+            yield row
+
+    def query(self, user_id: Optional[str] = None, category: Optional[str] = None,
+              start: Optional[str] = None, end: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """Lazily yield matching actions in the order they were added.
+
+        start/end are ISO timestamps bounding logged_at (start inclusive, end
+        exclusive). Actions appended while the scan runs aren't included.
+        Bad bounds raise ValueError here, before anything is yielded.
+        """
+        rows = self._matching_rows(len(self), user_id, self._bounds(category, start, end))
+        return (self._record(row) for row in rows)
+
+    def frozen(self) -> "FrozenActions":
+        """The actions stored so far, readable from another thread while appends continue"""
+        return FrozenActions(self, len(self))
+
+    def __len__(self):
+        return len(self._text_ids)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return (self._record(row) for row in range(len(self)))
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._record(row) for row in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("action index out of range")
+        return self._record(index)
+
+
+class FrozenActions:
+    """The first n actions of a store (rows never change once appended)"""
+
+    def __init__(self, store: ActionStore, n: int):
+        self.store = store
+        self.n = n
+
+    def __len__(self):
+        return self.n
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return (self.store._record(row) for row in range(self.n))
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.store._record(row) for row in range(*index.indices(self.n))]
+        if index < 0:
+            index += self.n
+        if not 0 <= index < self.n:
+            raise IndexError("action index out of range")
+        return self.store._record(index)
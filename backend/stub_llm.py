@@ -0,0 +1,111 @@
+"""
+Local OpenAI-compatible stand-in for the Dedalus endpoint, for benchmarks.
+
+Answers POST /v1/chat/completions (plain and stream=True) with canned replies
+shaped like the real ones: a JSON action list for classification prompts, a
+follow-up question (or the profile JSON block once the user says "done") for
+onboarding, and a short sentence for everything else.
+
+Latency and failures are injected per call:
+    STUB_LATENCY_MS     base latency per completion (default 300)
+    STUB_JITTER_MS      extra uniform random latency (default 100)
+    STUB_FAILURE_RATE   fraction of calls answered with HTTP 500 (default 0)
+    STUB_TOKEN_DELAY_MS delay between streamed chunks (default 10)
+
+Run it with:
+    uvicorn stub_llm:app --port 8100
+and point the app at it with DEDALUS_BASE_URL=http://127.0.0.1:8100/v1.
+"""
+import asyncio
+import json
+import os
+import random
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+LATENCY_MS = float(os.environ.get("STUB_LATENCY_MS", "300"))
+JITTER_MS = float(os.environ.get("STUB_JITTER_MS", "100"))
+FAILURE_RATE = float(os.environ.get("STUB_FAILURE_RATE", "0"))
+TOKEN_DELAY_MS = float(os.environ.get("STUB_TOKEN_DELAY_MS", "10"))
+
+CLASSIFICATION_REPLY = json.dumps([{
+    "category": "transport", "action_type": "bus", "quantity": 12, "unit": "km",
+    "confidence": "medium", "reasoning": "stub"
+}])
+ONBOARDING_QUESTION = "Nice to meet you! How do you usually get to work or campus, and roughly how far is it?"
+ONBOARDING_DONE = ("Thanks! " + json.dumps({
+    "onboarding_complete": True, "city": "Pittsburgh", "country": "USA", "commute_distance_km": 8,
+    "commute_mode": "bus", "diet_type": "meat_mixed_meal", "meals_per_day": 3, "has_ac": True,
+    "heating_type": "gas", "display_name": "Bench"
+}))
+REPLY = "Nice work! That trip kept real CO2 out of the air, and the whole community is adding up fast."
+
+app = FastAPI(title="Stub LLM")
+stats = {"requests": 0, "failures": 0}
+
+
+def pick_reply(messages) -> str:
+    system = messages[0]["content"] if messages else ""
+    if "identify climate actions" in system:
+        return CLASSIFICATION_REPLY
+    if "onboarding a new user" in system:
+        last = messages[-1]["content"].lower() if len(messages) > 1 else ""
+        return ONBOARDING_DONE if "done" in last else ONBOARDING_QUESTION
+    return REPLY
+
+
+def completion(content: str, model: str):
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 0, "completion_tokens": len(content) // 4, "total_tokens": len(content) // 4},
+    }
+
+
+def chunk(chunk_id: str, model: str, delta, finish_reason=None) -> bytes:
+    payload = {
+        "id": chunk_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+    return b"data: " + json.dumps(payload).encode() + b"\n\n"
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    stats["requests"] += 1
+    await asyncio.sleep((LATENCY_MS + random.random() * JITTER_MS) / 1000)
+
+    if random.random() < FAILURE_RATE:
+        stats["failures"] += 1
+        return JSONResponse({"error": {"message": "injected failure", "type": "server_error"}}, status_code=500)
+
+    model = body.get("model", "stub")
+    content = pick_reply(body.get("messages", []))
+    if not body.get("stream"):
+        return completion(content, model)
+
+    async def events():
+        chunk_id = f"chatcmpl-{uuid.uuid4().hex}"
+        yield chunk(chunk_id, model, {"role": "assistant", "content": ""})
+        for start in range(0, len(content), 16):
+            await asyncio.sleep(TOKEN_DELAY_MS / 1000)
+            yield chunk(chunk_id, model, {"content": content[start:start + 16]})
+        yield chunk(chunk_id, model, {}, finish_reason="stop")
+        yield b"data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.get("/stats")
+async def get_stats():
+    return stats
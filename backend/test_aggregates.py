@@ -0,0 +1,75 @@
+"""
+Tests for the rolling stats aggregates (aggregates.py and its shared twin).
+"""
+import time
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from aggregates import RollingAggregator
+from shared import SharedAggregator, SharedDB
+
+NOW = datetime(2026, 3, 1, 12, 0, 0)
+
+
+@pytest.fixture(params=["memory", "shared"])
+def aggregator(request, monkeypatch, tmp_path):
+    now = NOW.timestamp()
+    monkeypatch.setattr(time, "time", lambda: now)  # Read by both aggregators
+    if request.param == "memory":
+        yield RollingAggregator(window_s=60)
+        return
+    db = SharedDB(str(tmp_path / "shared.db"))
+    aggregator = SharedAggregator(db, window_s=60)
+    add_many = aggregator.add_many
+
+    def add_and_commit(entries):
+        add_many(entries)
+        db.flush()
+
+    aggregator.add_many = add_and_commit
+    yield aggregator
+    db.close()
+
+
+def test_last_window_counts_only_recent_seconds(aggregator):
+    aggregator.add_many([
+        (1.0, NOW - timedelta(seconds=5)),
+        (2.0, NOW - timedelta(seconds=59)),
+        (4.0, NOW - timedelta(seconds=60)),  # Just outside the window
+        (8.0, NOW - timedelta(minutes=10)),
+        (16.0, NOW),
+    ])
+    now = NOW.timestamp()
+    assert aggregator.last_window_kg(now) == 19.0
+    assert aggregator.last_window_kg(now + 30) == 17.0
+    assert aggregator.last_window_kg(now + 120) == 0.0
+
+
+def test_future_seconds_never_enter_the_window(aggregator):
+    aggregator.add_many([(605.0, NOW + timedelta(seconds=30)), (1.0, NOW)])
+    now = NOW.timestamp()
+    assert aggregator.last_window_kg(now) == 1.0
+    assert aggregator.last_window_kg(now + 30) == 1.0
+
+
+def test_day_totals_include_every_action(aggregator):
+    aggregator.add_many([
+        (1.5, NOW),
+        (2.5, NOW - timedelta(hours=3)),
+        (8.0, NOW - timedelta(days=1)),
+        (4.0, NOW + timedelta(minutes=2)),
+    ])
+    assert aggregator.day_kg(NOW.date()) == 8.0
+    assert aggregator.day_kg(NOW.date() - timedelta(days=1)) == 8.0
+    assert aggregator.day_kg(date(2020, 1, 1)) == 0.0
+
+
+def test_ring_slots_are_reused_for_new_seconds(monkeypatch):
+    clock = [NOW.timestamp()]
+    monkeypatch.setattr(time, "time", lambda: clock[0])
+    aggregator = RollingAggregator(window_s=10)
+    aggregator.add(3.0, NOW)
+    clock[0] += 10  # Same slot, ten seconds later
+    aggregator.add(5.0, NOW + timedelta(seconds=10))
+    assert aggregator.last_window_kg(clock[0]) == 5.0
@@ -1,13 +1,448 @@
+"""
+API tests against the in-memory app (run from backend/: python -m pytest -q).
+
+The app's state is module-level, so each test uses its own user ids.
+"""
+import asyncio
+import csv
+import io
+import json
+import shutil
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
 from fastapi.testclient import TestClient
-from main import app
-
-client = TestClient(app)
-
-try:
-    response = client.get("/")
-    print(f"Status: {response.status_code}")
-    print(f"Response: {response.json()}")
-except Exception as e:
-    print(f"Error: {e}")
-    import traceback
-    traceback.print_exc()
+
+import footprint
+import main
+from factors import FactorRegistry
+from jobs import JobQueue
+from llm import CircuitBreaker
+
+client = TestClient(main.app)
+
+
+def onboard(user_id: str, **fields) -> str:
+    survey = dict(user_id=user_id, city="Pune", commuteMode="car", commuteDistance=10, foodVibe="flex",
+                  hasAC=True, hasHeating=True)
+    survey.update(fields)
+    response = client.post("/api/onboard-quick", json=survey)
+    assert response.status_code == 200
+    return user_id
+
+
+def new_user_id(prefix: str) -> str:
+    return f"{prefix}-{uuid.uuid4().hex[:8]}"
+
+
+@pytest.fixture
+def exports(monkeypatch):
+    monkeypatch.setattr(main, "ALLOW_EXPORT_ENDPOINT", True)
+
+
+@pytest.fixture
+def seeding(monkeypatch):
+    monkeypatch.setattr(main, "ALLOW_SEED_ENDPOINT", True)
+
+
+# Routing
+
+def test_frontend_and_stats_are_served():
+    assert client.get("/").status_code == 200
+    response = client.get("/api/stats/global")
+    assert response.status_code == 200
+    assert "total_co2_saved_kg" in response.json()
+
+
+def test_frontend_revalidates_with_a_304():
+    first = client.get("/", headers={"Accept-Encoding": "gzip"})
+    again = client.get("/", headers={"Accept-Encoding": "gzip", "If-None-Match": first.headers["etag"]})
+    assert again.status_code == 304 and again.headers["etag"] == first.headers["etag"]
+    assert client.get("/no-such-file.js").status_code == 404
+
+
+def test_unknown_api_paths_are_404_for_every_method():
+    for method in ("GET", "POST", "DELETE"):
+        assert client.request(method, "/api/no-such-thing").status_code == 404
+
+
+def test_wrong_method_on_a_real_route_is_405():
+    assert client.delete("/api/stats/global").status_code == 405
+
+
+def test_metrics_label_requests_by_route_template():
+    user_id = onboard(new_user_id("metrics"))
+    client.get(f"/api/dashboard/{user_id}")
+    client.get("/api/no-such-thing")
+    response = client.get("/metrics")
+    assert response.headers["content-type"].startswith("text/plain")
+    lines = response.text.splitlines()
+    route = 'method="GET",route="/api/dashboard/{user_id}",status="200"'
+    assert any(line.startswith("carbonbuddy_http_request_duration_seconds_count{" + route) for line in lines)
+    assert any('route="/api/{path:path}",status="404"' in line for line in lines)  # The catch-all, not the path
+    assert user_id not in response.text and "no-such-thing" not in response.text
+    assert f"carbonbuddy_users {len(main.users_db)}" in lines
+
+
+# Onboarding
+
+LLM_PROFILE = {"onboarding_complete": True, "city": "Pune", "commute_distance_km": "10", "commute_mode": "bus",
+               "diet_type": "vegan_meal", "meals_per_day": "3", "has_ac": "false", "display_name": "Asha"}
+
+
+def test_onboarding_coerces_string_fields_from_the_llm():
+    user = main.UserProfile(user_id=new_user_id("onboard")).dict()
+    users_before = main.global_stats["total_users"]
+    completed = main.finish_onboarding(user, f"Great, all set! {json.dumps(LLM_PROFILE)}")
+    assert completed["onboarding_complete"] and user["onboarding_complete"]
+    assert (user["commute_distance_km"], user["meals_per_day"], user["has_ac"]) == (10.0, 3, False)
+    expected = main.calculate_annual_footprint({**LLM_PROFILE, "commute_distance_km": 10, "meals_per_day": 3,
+                                                "has_ac": False})["total"]
+    assert user["estimated_annual_footprint_kg"] == pytest.approx(expected)
+    assert main.global_stats["total_users"] == users_before + 1
+
+
+def test_onboarding_ignores_a_profile_it_cant_coerce():
+    user = main.UserProfile(user_id=new_user_id("onboard")).dict()
+    before = dict(user)
+    users_before = main.global_stats["total_users"]
+    bad = {**LLM_PROFILE, "commute_distance_km": "ten"}
+    assert main.finish_onboarding(user, json.dumps(bad)) is None
+    assert user == before and not user["onboarding_complete"]
+    assert main.global_stats["total_users"] == users_before
+
+
+# Streaming
+
+@pytest.fixture
+def llm_stream(monkeypatch):
+    """Make llm.stream yield the given deltas (an exception among them is raised there)"""
+    monkeypatch.setattr(main.llm, "breaker", CircuitBreaker(failure_threshold=5, cooldown_s=30))
+
+    def install(*deltas):
+        async def stream(messages, **kwargs):
+            for delta in deltas:
+                if isinstance(delta, BaseException):
+                    raise delta
+                yield delta
+        monkeypatch.setattr(main.llm, "stream", stream)
+
+    return install
+
+
+def stream_events(path: str, body: dict):
+    with client.stream("POST", path, json=body) as response:
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        return [json.loads(line) for line in response.iter_lines() if line]
+
+
+def test_log_stream_sends_actions_then_llm_tokens(llm_stream):
+    llm_stream("Nice ", "bus ride!")
+    user_id = onboard(new_user_id("stream"))
+    events = stream_events("/api/log/stream", {"user_id": user_id, "message": "took the bus 10 km",
+                                               "enhance_reply": True})
+    assert [event["type"] for event in events] == ["actions", "token", "token", "done"]
+    assert events[0]["actions_logged"][0]["action_type"] == "bus"
+    assert events[-1]["response_text"] == "Nice bus ride!"
+
+
+def test_log_stream_falls_back_to_the_template(llm_stream):
+    llm_stream(TimeoutError())
+    user_id = onboard(new_user_id("stream"))
+    events = stream_events("/api/log/stream", {"user_id": user_id, "message": "took the bus 10 km",
+                                               "enhance_reply": True})
+    assert [event["type"] for event in events] == ["actions", "token", "done"]
+    assert events[1]["text"] == events[2]["response_text"] != ""
+
+
+def test_onboard_stream_never_shows_the_profile_block(llm_stream):
+    profile = json.dumps(LLM_PROFILE)
+    llm_stream("You're all ", "set! ", profile[:20], profile[20:])
+    events = stream_events("/api/onboard/stream", {"user_id": new_user_id("stream"), "message": "bus, vegan"})
+    tokens = "".join(event["text"] for event in events if event["type"] == "token")
+    assert tokens == "You're all set! "
+    assert events[-1]["type"] == "done" and events[-1]["onboarding_complete"]
+
+
+# Ingest
+
+def test_ingest_accepts_valid_actions():
+    user_id = onboard(new_user_id("ingest"))
+    response = client.post("/api/ingest", json=[
+        {"user_id": user_id, "action_type": "bus", "quantity": 12},
+        {"user_id": user_id, "action_type": "vegan_meal", "quantity": 1, "logged_at": "2026-03-01T12:00:00"},
+    ])
+    body = response.json()
+    assert response.status_code == 200
+    assert (body["accepted"], body["rejected"], body["errors"]) == (2, 0, [])
+    assert body["total_co2_saved_kg"] > 0
+    assert client.get(f"/api/dashboard/{user_id}").json()["user"]["actions_count"] == 2
+
+
+def test_ingest_reports_each_invalid_item():
+    user_id = onboard(new_user_id("ingest"))
+    items = [
+        {"user_id": user_id, "action_type": "bus", "quantity": 3},
+        {"user_id": user_id, "action_type": "teleport", "quantity": 3},
+        {"user_id": user_id, "action_type": "bus", "quantity": "3"},
+        {"user_id": user_id, "action_type": "bus", "quantity": True},
+        {"user_id": user_id, "action_type": "bus", "quantity": -1},
+        {"user_id": "nobody-at-all", "action_type": "bus", "quantity": 3},
+        {"user_id": user_id, "action_type": "bus", "quantity": 3, "logged_at": "yesterday"},
+        "not an object",
+    ]
+    body = client.post("/api/ingest", json={"actions": items}).json()
+    assert (body["accepted"], body["rejected"]) == (1, 7)
+    assert [error["position"] for error in body["errors"]] == [1, 2, 3, 4, 5, 6, 7]
+    assert "unknown action_type" in body["errors"][0]["error"]
+    assert "not onboarded" in body["errors"][4]["error"]
+
+
+def test_ingest_rejects_future_timestamps():
+    user_id = onboard(new_user_id("ingest"))
+    soon = (datetime.now() + timedelta(minutes=1)).isoformat()
+    tomorrow = (datetime.now() + timedelta(days=1)).isoformat()
+    body = client.post("/api/ingest", json=[
+        {"user_id": user_id, "action_type": "bus", "quantity": 3, "logged_at": soon},  # Within clock skew
+        {"user_id": user_id, "action_type": "bus", "quantity": 5000, "logged_at": tomorrow},
+    ]).json()
+    assert (body["accepted"], body["rejected"]) == (1, 1)
+    assert "in the future" in body["errors"][0]["error"]
+
+
+def test_ingest_ndjson_reports_line_numbers():
+    user_id = onboard(new_user_id("ingest"))
+    lines = [json.dumps({"user_id": user_id, "action_type": "bus", "quantity": 3}), "{broken"]
+    body = client.post("/api/ingest", content="\n".join(lines) + "\n",
+                       headers={"Content-Type": "application/x-ndjson"}).json()
+    assert (body["accepted"], body["rejected"]) == (1, 1)
+    assert body["errors"][0]["position"] == 2
+
+
+def test_ingest_commits_in_batches(monkeypatch):
+    monkeypatch.setattr(main, "INGEST_BATCH_SIZE", 2)
+    user_id = onboard(new_user_id("ingest"))
+    body = client.post("/api/ingest", json=[{"user_id": user_id, "action_type": "bus", "quantity": 3}] * 5).json()
+    assert (body["accepted"], body["rejected"]) == (5, 0)
+
+
+def test_ingest_caps_json_bodies_but_not_ndjson(monkeypatch):
+    monkeypatch.setattr(main, "MAX_INGEST_JSON_BYTES", 1000)
+    user_id = onboard(new_user_id("ingest"))
+    items = [{"user_id": user_id, "action_type": "bus", "quantity": 3}] * 20
+    response = client.post("/api/ingest", json=items)
+    assert response.status_code == 413 and "NDJSON" in response.json()["detail"]
+    body = client.post("/api/ingest", content="\n".join(json.dumps(item) for item in items),
+                       headers={"Content-Type": "application/x-ndjson"}).json()
+    assert body["accepted"] == 20
+
+
+def test_ingest_rejects_a_malformed_body():
+    response = client.post("/api/ingest", content="[{", headers={"Content-Type": "application/json"})
+    assert response.status_code == 400
+
+
+# Background jobs
+
+def full_queue(name: str) -> JobQueue:
+    queue = JobQueue(name, workers=1, max_size=1)
+    queue.submit(name, print)  # Never started, so it stays full
+    return queue
+
+
+def test_logging_catches_up_inline_when_the_update_queue_is_full(monkeypatch):
+    main.flush_updates()
+    monkeypatch.setattr(main, "update_jobs", full_queue("updates"))
+    user_id = onboard(new_user_id("jobs"))
+    client.post("/api/ingest", json=[{"user_id": user_id, "action_type": "bus", "quantity": 3}])
+    assert main.pending_updates == []  # Flushed by the request itself
+    assert main.update_jobs.counts["updates"]["rejected"] == 1
+    assert main.leaderboards.rank("user", "all", user_id) is not None
+
+
+def test_llm_replies_are_skipped_when_the_reply_queue_is_full(monkeypatch):
+    monkeypatch.setattr(main, "reply_jobs", full_queue("reply"))
+    assert main.schedule_llm_reply([], 0.0, 0.0) is None
+
+
+# Export
+
+def ingest_dated(user_id: str):
+    client.post("/api/ingest", json=[
+        {"user_id": user_id, "action_type": "bus", "quantity": 5, "logged_at": "2026-02-27T09:00:00"},
+        {"user_id": user_id, "action_type": "bus", "quantity": 6, "logged_at": "2026-03-01T09:00:00"},
+        {"user_id": user_id, "action_type": "vegan_meal", "quantity": 1, "logged_at": "2026-03-02T13:00:00"},
+        {"user_id": user_id, "action_type": "bus", "quantity": 7, "logged_at": "2026-04-01T00:00:00"},
+    ])
+
+
+def export_ndjson(**params):
+    response = client.get("/api/export/actions", params=params)
+    assert response.status_code == 200
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_export_filters_by_user_category_and_range(exports):
+    user_id = onboard(new_user_id("export"))
+    ingest_dated(user_id)
+    assert len(export_ndjson(user_id=user_id)) == 4
+    march = export_ndjson(user_id=user_id, start="2026-03-01", end="2026-04-01")
+    assert [row["logged_at"] for row in march] == ["2026-03-01T09:00:00", "2026-03-02T13:00:00"]
+    assert [row["quantity"] for row in export_ndjson(user_id=user_id, category="transport")] == [5, 6, 7]
+    assert export_ndjson(user_id=user_id, category="no-such-category") == []
+
+
+def test_export_accepts_timezone_aware_bounds(exports):
+    user_id = onboard(new_user_id("export"))
+    ingest_dated(user_id)
+    # 09:30 local time on March 1st, with an explicit UTC offset
+    start = datetime(2026, 3, 1, 9, 30).astimezone().isoformat()
+    rows = export_ndjson(user_id=user_id, start=start, end="2026-03-03")
+    assert [row["logged_at"] for row in rows] == ["2026-03-02T13:00:00"]
+
+
+def test_export_csv_has_a_header_and_one_line_per_action(exports):
+    user_id = onboard(new_user_id("export"))
+    ingest_dated(user_id)
+    response = client.get("/api/export/actions", params={"user_id": user_id, "format": "csv"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [row["action_type"] for row in rows] == ["bus", "bus", "vegan_meal", "bus"]
+    assert set(rows[0]) == set(main.ACTION_COLUMNS)
+    assert rows[0]["user_id"] == user_id
+
+
+def test_export_rejects_bad_parameters(exports):
+    assert client.get("/api/export/actions", params={"start": "soon"}).status_code == 400
+    assert client.get("/api/export/actions", params={"format": "xml"}).status_code == 400
+
+
+def test_export_is_disabled_by_default(monkeypatch):
+    monkeypatch.setattr(main, "ALLOW_EXPORT_ENDPOINT", False)
+    assert client.get("/api/export/actions").status_code == 403
+
+
+# Seeding
+
+def test_seed_keeps_existing_users_and_reports_bad_lines(seeding):
+    existing = onboard(new_user_id("seed"), city="Oslo")
+    fresh = new_user_id("seed")
+    category = main.factor_registry.table.factors["bus"]["category"]
+    action = {"type": "action", "id": str(uuid.uuid4()), "user_id": fresh, "logged_at": "2026-03-01T08:15:00",
+              "category": category, "action_type": "bus", "quantity": 4, "co2_saved_kg": 0.5}
+    lines = [
+        {"type": "user", "user_id": existing, "city": "Paris"},
+        {"type": "user", "user_id": fresh, "city": "Lima", "onboarding_complete": True},
+        action,
+        {**action, "id": str(uuid.uuid4()), "quantity": "4"},
+        {**action, "id": str(uuid.uuid4()), "user_id": existing},
+    ]
+    body = client.post("/api/seed", content="\n".join(json.dumps(line) for line in lines) + "\n{oops").json()
+    assert (body["users"], body["actions"], body["existing_users"], body["skipped"]) == (1, 1, 1, 4)
+    assert [error["line"] for error in body["errors"]] == [1, 4, 5, 6]
+    assert main.users_db[existing]["city"] == "Oslo"
+    assert main.users_db[fresh]["city"] == "Lima"
+
+
+# Footprints
+
+def test_footprint_batch_is_capped(monkeypatch):
+    monkeypatch.setattr(main, "MAX_FOOTPRINT_BATCH_SIZE", 2)
+    profiles = [{"commute_mode": "bus", "commute_distance_km": 8}] * 2
+    body = client.post("/api/footprint/batch", json={"profiles": profiles}).json()
+    assert body["summary"]["count"] == 2 and len(body["footprints"]) == 2
+    assert client.post("/api/footprint/batch", json={"profiles": profiles * 2}).status_code == 413
+
+
+def test_rebaseline_is_disabled_by_default(monkeypatch):
+    monkeypatch.setattr(main, "ALLOW_REBASELINE_ENDPOINT", False)
+    assert client.post("/api/footprint/rebaseline").status_code == 403
+
+
+def test_rebaseline_fixes_stale_baselines(monkeypatch):
+    monkeypatch.setattr(main, "ALLOW_REBASELINE_ENDPOINT", True)
+    user_id = onboard(new_user_id("rebase"))
+    expected = main.users_db[user_id]["estimated_annual_footprint_kg"]
+    main.users_db[user_id]["estimated_annual_footprint_kg"] = 1.0
+    assert client.post("/api/footprint/rebaseline").json()["users_updated"] >= 1
+    assert main.users_db[user_id]["estimated_annual_footprint_kg"] == expected
+
+
+# History
+
+def test_history_rolls_up_logged_actions():
+    user_id = onboard(new_user_id("history"))
+    ingest_dated(user_id)
+    main.flush_updates()
+    body = client.get(f"/api/history/{user_id}", params={"granularity": "month", "start": "2026-02-01",
+                                                          "end": "2026-04-30"}).json()
+    assert [(p["period"], p["actions"]) for p in body["points"]] == [("2026-02", 1), ("2026-03", 2), ("2026-04", 1)]
+    assert set(body["points"][1]["categories"]) == {"transport", "food"}
+    days = client.get(f"/api/history/{user_id}", params={"start": "2026-02-27", "end": "2026-04-01",
+                                                         "max_points": 5}).json()["points"]
+    assert len(days) == 5 and sum(p["actions"] for p in days) == 4
+    assert days[0]["end_period"] == "2026-03-05"  # 34 days in groups of 7
+
+
+def test_history_rejects_bad_parameters():
+    user_id = onboard(new_user_id("history"))
+    for params in ({"granularity": "year"}, {"start": "March"}, {"start": "2026-03-02", "end": "2026-03-01"},
+                   {"max_points": 0}):
+        assert client.get(f"/api/history/{user_id}", params=params).status_code == 400
+    assert client.get("/api/history/nobody-at-all").status_code == 404
+
+
+# Emission factors
+
+@pytest.fixture
+def factor_file(monkeypatch, tmp_path):
+    """The app reading a copy of the factor file, with POST /api/factors/reload enabled"""
+    path = tmp_path / "emission_factors.json"
+    shutil.copy(main.factor_registry.path, path)
+    original = main.factor_registry
+    main.factor_registry = FactorRegistry(str(path))
+    monkeypatch.setattr(main, "ALLOW_FACTOR_RELOAD_ENDPOINT", True)
+    yield path
+    main.factor_registry = original
+    asyncio.run(main.rebaseline_users())  # Put everyone's baseline back
+
+
+def test_factor_reload_is_disabled_by_default(monkeypatch):
+    monkeypatch.setattr(main, "ALLOW_FACTOR_RELOAD_ENDPOINT", False)
+    assert client.post("/api/factors/reload").status_code == 403
+
+
+def test_factor_reload_rebaselines_users(factor_file):
+    user_id = onboard(new_user_id("factors"))
+    before = main.users_db[user_id]["estimated_annual_footprint_kg"]
+    data = json.loads(factor_file.read_text())
+    for factor in data["factors"]:
+        if factor["action_type"] == "car_petrol":
+            factor["emission_factor_kg_co2e"] *= 2
+    factor_file.write_text(json.dumps(data))
+
+    body = client.post("/api/factors/reload").json()
+    assert body["reloaded"] and body["reloads"] == 1
+    after = main.users_db[user_id]["estimated_annual_footprint_kg"]
+    assert after > before
+    assert after == footprint.footprint(main.users_db[user_id], main.factor_registry.table.factors)["total"]
+    assert client.post("/api/factors/reload").json()["reloaded"] is False  # Same version again
+
+
+# Leaderboard
+
+def test_user_leaderboard_hides_other_users_ids():
+    leader, runner_up = onboard(new_user_id("lb")), onboard(new_user_id("lb"))
+    client.post("/api/ingest", json=[
+        {"user_id": leader, "action_type": "bus", "quantity": 100000},
+        {"user_id": runner_up, "action_type": "bus", "quantity": 50000},
+    ])
+    main.flush_updates()
+    body = client.get("/api/leaderboard/user", params={"limit": 2, "user_id": runner_up}).json()
+    first, second = body["entries"]
+    assert "user_id" not in first and first["key"] != leader
+    assert second["user_id"] == runner_up
+    assert body["you"]["rank"] == 2 and body["you"]["user_id"] == runner_up
+    assert leader not in json.dumps(body)
@@ -0,0 +1,111 @@
+"""
+Tests for the live stats broadcaster (broadcast.py).
+"""
+import asyncio
+import json
+
+from broadcast import KEEPALIVE, StatsBroadcaster
+
+
+def counting_payload():
+    """A build_payload that counts how often it's called"""
+    calls = {"n": 0}
+
+    def build():
+        calls["n"] += 1
+        return {"n": calls["n"]}
+
+    return build, calls
+
+
+def decode(event: bytes):
+    assert event.startswith(b"data: ") and event.endswith(b"\n\n")
+    return json.loads(event[len(b"data: "):])
+
+
+def test_publish_builds_the_payload_once_for_every_subscriber():
+    build, calls = counting_payload()
+    broadcaster = StatsBroadcaster(build)
+    broadcaster.publish()
+    assert calls["n"] == 0  # Nobody listening
+
+    async def scenario():
+        queues = [broadcaster.subscribe() for _ in range(3)]
+        broadcaster.publish()
+        return [queue.get_nowait() for queue in queues]
+
+    events = asyncio.run(scenario())
+    assert calls["n"] == 1 and len(set(events)) == 1
+    assert decode(events[0]) == {"n": 1}
+
+
+def test_slow_subscribers_only_get_the_latest_event():
+    build, _ = counting_payload()
+    broadcaster = StatsBroadcaster(build)
+
+    async def scenario():
+        queue = broadcaster.subscribe()
+        for _ in range(3):
+            broadcaster.publish()
+        return queue.qsize(), decode(queue.get_nowait())
+
+    assert asyncio.run(scenario()) == (1, {"n": 3})
+
+
+def test_bursts_of_notifications_are_coalesced():
+    build, calls = counting_payload()
+    broadcaster = StatsBroadcaster(build, max_rate_hz=10, idle_refresh_s=60)
+
+    async def scenario():
+        queue = broadcaster.subscribe()
+        task = asyncio.create_task(broadcaster.run())
+        for _ in range(5):  # 0.5s of logging, 50 logs
+            for _ in range(10):
+                broadcaster.notify()
+            await asyncio.sleep(0.1)
+        await asyncio.sleep(0.15)
+        task.cancel()
+        return decode(queue.get_nowait())
+
+    latest = asyncio.run(scenario())
+    assert 2 <= calls["n"] <= 10  # About one event per 0.1s, not one per log
+    assert latest == {"n": calls["n"]}
+
+
+def test_idle_refresh_publishes_without_notifications():
+    build, calls = counting_payload()
+    broadcaster = StatsBroadcaster(build, idle_refresh_s=0.05)
+
+    async def scenario():
+        broadcaster.subscribe()
+        task = asyncio.create_task(broadcaster.run())
+        await asyncio.sleep(0.2)
+        task.cancel()
+
+    asyncio.run(scenario())
+    assert calls["n"] >= 1
+
+
+def test_events_stream_current_stats_updates_and_keepalives():
+    build, _ = counting_payload()
+    broadcaster = StatsBroadcaster(build)
+    disconnected = False
+
+    async def is_disconnected():
+        return disconnected
+
+    async def scenario():
+        nonlocal disconnected
+        stream = broadcaster.events(is_disconnected, keepalive_s=0.05)
+        first = await stream.__anext__()
+        assert broadcaster.subscriber_count == 1
+        broadcaster.publish()
+        update = await stream.__anext__()
+        keepalive = await stream.__anext__()  # Nothing new within keepalive_s
+        disconnected = True
+        remaining = [event async for event in stream]
+        return first, update, keepalive, remaining
+
+    first, update, keepalive, remaining = asyncio.run(scenario())
+    assert (decode(first), decode(update), keepalive) == ({"n": 1}, {"n": 2}, KEEPALIVE)
+    assert remaining == [] and broadcaster.subscriber_count == 0
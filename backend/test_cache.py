@@ -0,0 +1,72 @@
+"""
+Tests for the classification cache (cache.py).
+"""
+import pytest
+
+import cache
+from cache import ClassificationCache
+
+USER = {"commute_distance_km": 8, "commute_mode": "car_petrol", "diet_type": "meat_mixed_meal"}
+BUS = [{"category": "transport", "action_type": "bus", "quantity": 8}]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(cache.time, "time", lambda: now[0])
+    return now
+
+
+# ClassificationCache
+
+def test_cache_normalizes_messages_but_not_profiles():
+    entries = ClassificationCache()
+    entries.put("Took the bus!", USER, BUS)
+    assert entries.get("took  the bus", USER) == BUS
+    assert entries.get("took the bus", dict(USER, commute_distance_km=20)) is None
+    assert (entries.hits, entries.misses) == (1, 1)
+
+
+def test_cache_evicts_least_recently_used():
+    entries = ClassificationCache(max_size=2)
+    entries.put("one", USER, BUS)
+    entries.put("two", USER, BUS)
+    entries.get("one", USER)
+    entries.put("three", USER, BUS)
+    assert entries.get("two", USER) is None
+    assert entries.get("one", USER) == BUS and entries.get("three", USER) == BUS
+    assert entries.evictions == 1
+
+
+def test_cache_entries_expire(clock):
+    entries = ClassificationCache(ttl_s=60)
+    entries.put("biked to work", USER, BUS)
+    clock[0] += 59
+    assert entries.get("biked to work", USER) == BUS
+    clock[0] += 2
+    assert entries.get("biked to work", USER) is None
+    assert len(entries) == 0
+
+
+def test_cache_saves_and_loads_unexpired_entries_in_order(tmp_path, clock):
+    path = str(tmp_path / "cache.json")
+    entries = ClassificationCache(ttl_s=60, path=path)
+    entries.put("old", USER, BUS)
+    clock[0] += 30
+    entries.put("new", USER, [])
+    assert entries.dirty
+    entries.save(entries.snapshot())
+    assert not entries.dirty
+
+    clock[0] += 45  # "old" has expired by now
+    loaded = ClassificationCache(max_size=1, ttl_s=60, path=path)
+    assert len(loaded) == 1 and loaded.get("new", USER) == []
+    assert list(tmp_path.iterdir()) == [tmp_path / "cache.json"]
+
+
+@pytest.mark.parametrize("content", ["{not json", "[1, 2]", '{"a": 1}', '[["key"]]', '[["key", "soon", []]]',
+                                     '[[1, 9e99, []]]', '[["key", 9e99, []], ["other", 9e99, "x"]]'])
+def test_cache_starts_empty_on_a_malformed_file(tmp_path, content):
+    path = tmp_path / "cache.json"
+    path.write_text(content)
+    assert len(ClassificationCache(path=str(path))) == 0
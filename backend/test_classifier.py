@@ -0,0 +1,48 @@
+"""
+Tests for the deterministic fast-path classifier (classifier.py).
+"""
+import pytest
+
+import classifier
+
+USER = {"commute_distance_km": 8, "commute_mode": "car_petrol", "diet_type": "meat_mixed_meal"}
+
+
+def test_classifier_answers_confident_messages():
+    assert classifier.classify("took the bus to work", USER) == [{
+        "category": "transport", "action_type": "bus", "quantity": 8.0, "unit": "km",
+        "confidence": "high", "reasoning": "fast-path rule match",
+    }]
+    actions = classifier.classify("had a vegan lunch and took the train 12 km", USER)
+    assert [(a["action_type"], a["quantity"]) for a in actions] == [("vegan_meal", 1.0), ("train_electric", 12.0)]
+    assert classifier.classify("biked 3 miles", USER)[0]["quantity"] == pytest.approx(4.8)
+
+
+@pytest.mark.parametrize("message, action_type, quantity", [
+    ("biked 2.5 km to work", "bike_walk", 2.5),
+    ("took the bus 1.5 miles", "bus", 2.4),
+    ("walked 0.8 km.", "bike_walk", 0.8),
+])
+def test_classifier_reads_decimal_quantities(message, action_type, quantity):
+    [action] = classifier.classify(message, USER)
+    assert (action["action_type"], action["quantity"]) == (action_type, pytest.approx(quantity))
+
+
+def test_classifier_still_splits_sentences_on_full_stops():
+    actions = classifier.classify("Biked 4.5 km to work. Had a vegan lunch.", USER)
+    assert [(a["action_type"], a["quantity"]) for a in actions] == [("bike_walk", 4.5), ("vegan_meal", 1.0)]
+
+
+@pytest.mark.parametrize("message", ["", "didn't take the bus", "watched a movie", "took the bus and watched a movie",
+                                     "x" * 201 + " bus"])
+def test_classifier_defers_to_the_llm(message):
+    assert classifier.classify(message, USER) is None
+
+
+def test_classifier_counts_hits_and_fallbacks():
+    before = dict(classifier.get_stats())
+    classifier.classify("line dried my laundry", USER)
+    classifier.classify("watched a movie", USER)
+    after = classifier.get_stats()
+    assert after["fast_path_hits"] == before["fast_path_hits"] + 1
+    assert after["llm_fallbacks"] == before["llm_fallbacks"] + 1
@@ -0,0 +1,58 @@
+"""
+Tests for the compiled emission factor table and its hot reload (factors.py).
+"""
+import json
+import os
+import shutil
+
+import pytest
+
+from factors import FactorRegistry
+
+FACTORS_PATH = os.path.join(os.path.dirname(__file__), "emission_factors.json")
+
+
+def set_factor(path, action_type: str, value: float):
+    with open(path) as f:
+        data = json.load(f)
+    for factor in data["factors"]:
+        if factor["action_type"] == action_type:
+            factor["emission_factor_kg_co2e"] = value
+    with open(path, "w") as f:
+        json.dump(data, f)
+
+
+@pytest.fixture
+def registry(tmp_path):
+    path = tmp_path / "emission_factors.json"
+    shutil.copy(FACTORS_PATH, path)
+    return FactorRegistry(str(path))
+
+
+def test_reload_swaps_in_a_changed_file(registry):
+    version = registry.table.version
+    assert not registry.reload()  # Unchanged
+    set_factor(registry.path, "bus", 0.5)
+    assert registry.reload()
+    assert registry.table.value("bus") == 0.5
+    assert registry.table.version != version and registry.reloads == 1
+
+
+def test_reload_ignores_a_rewrite_with_the_same_content(registry):
+    with open(registry.path) as f:
+        content = f.read()
+    with open(registry.path, "w") as f:
+        f.write(content)
+    assert not registry.reload(force=True)
+    assert registry.reloads == 0
+
+
+def test_reload_keeps_the_current_table_when_the_file_is_broken(registry):
+    table = registry.table
+    with open(registry.path, "w") as f:
+        f.write('{"factors": [')
+    assert not registry.reload(force=True)
+    assert registry.table is table and registry.last_error
+    shutil.copy(FACTORS_PATH, registry.path)  # Fixing the file clears the error
+    registry.reload(force=True)
+    assert registry.last_error is None
@@ -0,0 +1,69 @@
+"""
+Tests for the footprint engine (footprint.py).
+"""
+import os
+import random
+
+import pytest
+
+import footprint
+from factors import compile_file
+
+FACTORS = compile_file(os.path.join(os.path.dirname(__file__), "emission_factors.json")).factors
+
+
+def random_profiles(n: int):
+    rng = random.Random(7)
+    modes = ["car_petrol", "bus", "train_electric", "bike_walk", "teleport", None]
+    diets = ["beef_heavy_meal", "meat_mixed_meal", "vegan_meal", "no-such-diet", None]
+    return [{
+        "commute_mode": rng.choice(modes),
+        "commute_distance_km": rng.choice([0, 3.5, 12, 40, None]),
+        "diet_type": rng.choice(diets),
+        "meals_per_day": rng.choice([1, 2, 3, 0, None]),
+        "has_ac": rng.choice([True, False, None]),
+    } for _ in range(n)]
+
+
+def test_footprint_components_add_up():
+    result = footprint.footprint({"commute_mode": "bus", "commute_distance_km": 10, "diet_type": "vegan_meal",
+                                  "meals_per_day": 3, "has_ac": True}, FACTORS)
+    bus = FACTORS["bus"]["emission_factor_kg_co2e"]
+    vegan = FACTORS["vegan_meal"]["emission_factor_kg_co2e"]
+    assert result["transport"] == pytest.approx(10 * 2 * 250 * bus)
+    assert result["food"] == pytest.approx(vegan * 3 * 365)
+    assert result["home"] == 2000
+    assert result["total"] == pytest.approx(result["transport"] + result["food"] + result["home"])
+
+
+def test_missing_and_unknown_values_get_the_defaults():
+    defaults = footprint.footprint({}, FACTORS)
+    assert footprint.footprint({"commute_mode": "teleport", "diet_type": "no-such-diet"}, FACTORS) == defaults
+    assert defaults["transport"] == 0 and defaults["home"] == 1500
+
+
+@pytest.mark.skipif(footprint.np is None, reason="NumPy isn't installed")
+def test_batch_matches_one_at_a_time():
+    profiles = random_profiles(500)
+    batch = footprint.batch_footprints(profiles, FACTORS)
+    for i, profile in enumerate(profiles):
+        single = footprint.footprint(profile, FACTORS)
+        for key in ("total", "transport", "food", "home"):
+            assert batch[key][i] == pytest.approx(single[key])
+
+
+def test_batch_without_numpy(monkeypatch):
+    profiles = random_profiles(50)
+    monkeypatch.setattr(footprint, "np", None)
+    batch = footprint.batch_footprints(profiles, FACTORS)
+    assert batch["total"] == [footprint.footprint(p, FACTORS)["total"] for p in profiles]
+    assert footprint.batch_footprints([], FACTORS) == {"total": [], "transport": [], "food": [], "home": []}
+
+
+def test_breakdown_and_summary():
+    result = footprint.footprint({"commute_distance_km": 7, "has_ac": True}, FACTORS)
+    assert sum(footprint.breakdown_percentages(result).values()) == 100
+    summary = footprint.summarize(footprint.batch_footprints(random_profiles(100), FACTORS))
+    assert summary["count"] == 100
+    assert summary["total_p50"] <= summary["total_p90"]
+    assert footprint.summarize({"total": []}) == {"count": 0}
@@ -0,0 +1,66 @@
+"""
+Tests for the history periods and series (history.py).
+"""
+from datetime import date
+
+import history
+
+
+def test_period_keys_cover_partial_periods_at_both_ends():
+    assert history.period_keys("day", date(2026, 2, 27), date(2026, 3, 2)) == [
+        "2026-02-27", "2026-02-28", "2026-03-01", "2026-03-02"]
+    # 2026-03-04 is a Wednesday; weeks start on Monday
+    assert history.period_keys("week", date(2026, 3, 4), date(2026, 3, 16)) == ["2026-W10", "2026-W11", "2026-W12"]
+    assert history.period_keys("week", date(2026, 12, 30), date(2027, 1, 5)) == ["2026-W53", "2027-W01"]
+    assert history.period_keys("month", date(2025, 11, 30), date(2026, 2, 1)) == [
+        "2025-11", "2025-12", "2026-01", "2026-02"]
+
+
+def test_period_keys_are_capped():
+    assert len(history.period_keys("day", date(1990, 1, 1), date(2026, 1, 1))) == history.MAX_PERIODS
+
+
+def test_period_days_match_bucket_keys():
+    for granularity, index in (("day", 0), ("week", 1), ("month", 2)):
+        for period in history.period_keys(granularity, date(2025, 12, 1), date(2026, 3, 31)):
+            first, last = history.period_days(granularity, period)
+            assert history.bucket_keys(first.isoformat())[index] == period
+            assert history.bucket_keys(last.isoformat())[index] == period
+    assert history.period_days("month", "2024-02") == (date(2024, 2, 1), date(2024, 2, 29))
+
+
+def test_default_ranges():
+    end = date(2026, 3, 15)
+    assert history.default_start("day", end) == date(2026, 2, 14)
+    assert len(history.period_keys("week", history.default_start("week", end), end)) == 12
+    assert history.default_start("month", end) == date(2025, 4, 1)
+
+
+def test_series_zero_fills_missing_periods():
+    keys = ["2026-03-01", "2026-03-02", "2026-03-03"]
+    points = history.series({"2026-03-02": ({"food": 0.1234, "transport": 2.0}, 3)}, keys)
+    assert [point["total_co2_saved_kg"] for point in points] == [0, 2.123, 0]
+    assert points[1] == {"period": "2026-03-02", "total_co2_saved_kg": 2.123, "actions": 3,
+                         "categories": {"food": 0.123, "transport": 2.0}}
+    assert points[0]["categories"] == {} and "end_period" not in points[0]
+
+
+def test_series_downsamples_to_max_points():
+    keys = [f"2026-03-{day:02d}" for day in range(1, 11)]
+    buckets = {key: ({"food": 1.0}, 1) for key in keys}
+    points = history.series(buckets, keys, max_points=4)
+    assert len(points) == 4  # Groups of 3, 3, 3 and 1
+    assert [(p["period"], p["end_period"], p["actions"]) for p in points] == [
+        ("2026-03-01", "2026-03-03", 3), ("2026-03-04", "2026-03-06", 3),
+        ("2026-03-07", "2026-03-09", 3), ("2026-03-10", "2026-03-10", 1)]
+    assert sum(p["total_co2_saved_kg"] for p in points) == 10.0
+    assert history.series(buckets, keys, max_points=20) == history.series(buckets, keys)
+
+
+def test_recent_rate_starts_at_the_first_action():
+    today = date(2026, 3, 28)
+    assert len(history.recent_window(None, today)) == history.RECENT_RATE_DAYS
+    days = history.recent_window("2026-03-25", today)
+    assert days == ["2026-03-25", "2026-03-26", "2026-03-27", "2026-03-28"]
+    assert history.daily_rate({"2026-03-26": ({"food": 2.0, "energy": 6.0}, 2)}, days) == 2.0
+    assert history.daily_rate({}, []) == 0.0
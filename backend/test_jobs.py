@@ -0,0 +1,89 @@
+"""
+Tests for the background job queue (jobs.py).
+"""
+import asyncio
+
+from jobs import JobQueue
+
+
+def test_a_full_queue_rejects_instead_of_blocking():
+    queue = JobQueue("test", workers=1, max_size=2)
+    assert queue.submit("reply", print) and queue.submit("reply", print)
+    assert queue.submit("reply", print) is None
+    assert queue.depth == 2
+    assert queue.get_stats()["kinds"] == {"reply": {"submitted": 2, "done": 0, "failed": 0, "rejected": 1}}
+
+
+def test_jobs_submitted_before_startup_run_once_started():
+    queue = JobQueue("test", workers=2)
+    ran = []
+    queue.submit("update", ran.append, "early")
+
+    async def scenario():
+        queue.start()
+        job = queue.submit("update", ran.append, "late")
+        assert await job.wait(1)
+        await queue.close()
+
+    asyncio.run(scenario())
+    assert ran == ["early", "late"]
+
+
+def test_plain_functions_run_in_order_and_coroutines_overlap():
+    queue = JobQueue("test", workers=3)
+    events = []
+
+    async def slow(name):
+        events.append(f"start {name}")
+        await asyncio.sleep(0.05)
+        events.append(f"end {name}")
+        return name
+
+    async def scenario():
+        queue.start()
+        jobs = [queue.submit("reply", slow, name) for name in ("a", "b", "c")]
+        ordered = [queue.submit("update", events.append, i) for i in range(3)]
+        for job in jobs + ordered:
+            assert await job.wait(1)
+        await queue.close()
+        return jobs
+
+    jobs = asyncio.run(scenario())
+    assert [job.result for job in jobs] == ["a", "b", "c"]
+    assert events[:3] == ["start a", "start b", "start c"]  # All three in flight at once
+    assert [event for event in events if isinstance(event, int)] == [0, 1, 2]
+
+
+def test_failures_are_recorded_and_the_worker_carries_on():
+    queue = JobQueue("test", workers=1)
+
+    def fail():
+        raise ValueError("boom")
+
+    async def scenario():
+        queue.start()
+        failed = queue.submit("reply", fail)
+        ok = queue.submit("reply", lambda: 42)
+        assert await ok.wait(1)
+        await queue.close()
+        return failed, ok
+
+    failed, ok = asyncio.run(scenario())
+    assert (failed.status, ok.status, ok.result) == ("failed", "done", 42)
+    assert ok.fn is None and ok.args is None  # Inputs are dropped once finished
+    assert queue.counts["reply"]["failed"] == 1 and queue.counts["reply"]["done"] == 1
+
+
+def test_wait_gives_up_after_the_timeout():
+    queue = JobQueue("test", workers=1)
+
+    async def scenario():
+        queue.start()
+        job = queue.submit("reply", asyncio.sleep, 0.2, "late")
+        finished_early = await job.wait(0.01)
+        finished = await job.wait(1)
+        await queue.close()
+        return finished_early, finished, job
+
+    finished_early, finished, job = asyncio.run(scenario())
+    assert (finished_early, finished, job.result) == (False, True, "late")
@@ -0,0 +1,62 @@
+"""
+Tests for the incrementally maintained leaderboards (leaderboard.py).
+"""
+from datetime import date, datetime, timedelta
+
+from leaderboard import Leaderboards, RankedScores, period_key
+
+
+def test_ranked_scores_order_and_ties():
+    scores = RankedScores()
+    scores.add_many({"carol": 5.0, "ana": 5.0, "ben": 9.0, "dev": 1.0})
+    # Ties are broken by key
+    assert scores.top(3) == [("ben", 9.0), ("ana", 5.0), ("carol", 5.0)]
+    assert [scores.rank(key) for key in ("ben", "ana", "carol", "dev")] == [1, 2, 3, 4]
+    assert scores.rank("nobody") is None
+
+
+def test_ranked_scores_reorder_on_update():
+    scores = RankedScores()
+    scores.add_many({f"user{i:03d}": float(i) for i in range(200)})
+    assert scores.top(1) == [("user199", 199.0)]
+    scores.add_many({"user000": 500.0, "user150": 0.5})  # Deltas add to the scores
+    assert scores.top(2) == [("user000", 500.0), ("user199", 199.0)]
+    # Behind user000 and user151..user199
+    assert (scores.scores["user150"], scores.rank("user150")) == (150.5, 51)
+    assert len(scores) == 200
+
+
+def test_ranked_scores_across_blocks(monkeypatch):
+    monkeypatch.setattr(RankedScores, "BLOCK", 4)
+    scores = RankedScores()
+    scores.add_many({f"k{i:02d}": float(i % 7) for i in range(40)})
+    scores.top(1)  # Order everything once, then move a few keys one at a time
+    scores.add_many({"k00": 10.0, "k13": -1.0})
+    expected = sorted(scores.scores.items(), key=lambda item: (-item[1], item[0]))
+    assert scores.top(40) == expected
+    assert [scores.rank(key) for key, _ in expected] == list(range(1, 41))
+
+
+def test_leaderboards_roll_up_groups_and_windows():
+    now = datetime.now()
+    boards = Leaderboards()
+    boards.add_many([
+        ({"user": "ana", "city": "Pune"}, 2.0, now),
+        ({"user": "ben", "city": "Pune"}, 3.0, now),
+        ({"user": "cas", "city": "Oslo"}, 4.0, now - timedelta(days=1)),
+    ])
+    assert [row["key"] for row in boards.top("user", "all", 10)] == ["cas", "ben", "ana"]
+    assert boards.top("city", "all", 10)[0] == {"rank": 1, "key": "Pune", "co2_saved_kg": 5.0}
+    assert [row["key"] for row in boards.top("user", "day", 10)] == ["ben", "ana"]
+    yesterday = period_key("day", date.today() - timedelta(days=1))
+    assert boards.rank("user", "day", "cas", period=yesterday) == {"rank": 1, "key": "cas", "co2_saved_kg": 4.0,
+                                                                   "of": 1}
+    assert boards.rank("country", "all", "Norway") is None
+
+
+def test_leaderboards_drop_expired_days():
+    boards = Leaderboards(days_kept=2)
+    long_ago = datetime.now() - timedelta(days=5)
+    boards.add_many([({"user": "ana"}, 1.0, long_ago)])
+    assert boards.top("user", "day", 10, period=period_key("day", long_ago.date())) == []
+    assert boards.top("user", "all", 10)[0]["key"] == "ana"
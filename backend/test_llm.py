@@ -0,0 +1,183 @@
+"""
+Tests for the LLM client's retries and circuit breaker (llm.py), against a fake endpoint.
+"""
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from openai import APIStatusError
+
+import llm
+from llm import CircuitBreaker, LLMUnavailable
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=3, cooldown_s=30)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()  # Resets the streak
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == "closed" and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open" and breaker.times_opened == 1
+    assert not breaker.available() and not breaker.allow()
+    assert breaker.rejected == 1
+
+
+def test_breaker_half_open_lets_one_probe_through():
+    breaker = CircuitBreaker(failure_threshold=1, cooldown_s=30)
+    breaker.record_failure()
+    breaker.opened_at -= 30  # Cooldown over
+    assert breaker.available()
+    assert breaker.allow() and breaker.state == "half_open"
+    assert not breaker.allow()  # Only one probe at a time
+    breaker.release()  # The probe was cancelled: the next call may probe
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.allow()
+
+
+def test_breaker_failed_probe_reopens():
+    breaker = CircuitBreaker(failure_threshold=5, cooldown_s=30)
+    for _ in range(5):
+        breaker.record_failure()
+    breaker.opened_at -= 30
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open" and breaker.times_opened == 2
+    assert breaker.get_stats()["retry_in_s"] > 29
+
+
+class FakeCompletions:
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+        self.timeouts = []
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        self.timeouts.append(kwargs["timeout"])
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome
+
+
+def reply(content):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=None)
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    """Point llm at a fake endpoint with a fresh breaker (2 failures to open, no retries)"""
+    def install(*outcomes):
+        completions = FakeCompletions(*outcomes)
+        monkeypatch.setattr(llm, "_client", SimpleNamespace(chat=SimpleNamespace(completions=completions)))
+        return completions
+
+    monkeypatch.setattr(llm, "breaker", CircuitBreaker(failure_threshold=2, cooldown_s=30))
+    monkeypatch.setattr(llm, "_semaphore", None)
+    monkeypatch.setattr(llm, "MAX_RETRIES", 0)
+    return install
+
+
+def test_complete_failures_open_the_circuit(fake_llm):
+    completions = fake_llm(asyncio.TimeoutError(), asyncio.TimeoutError(), reply("unused"))
+    for _ in range(2):
+        with pytest.raises(asyncio.TimeoutError):
+            asyncio.run(llm.complete(MESSAGES))
+    assert llm.breaker.state == "open" and not llm.available()
+    with pytest.raises(LLMUnavailable):
+        asyncio.run(llm.complete(MESSAGES))
+    assert completions.calls == 2  # Rejected without reaching the endpoint
+
+
+def test_complete_probe_recovers_the_circuit(fake_llm):
+    fake_llm(asyncio.TimeoutError(), asyncio.TimeoutError(), reply("back"))
+    for _ in range(2):
+        with pytest.raises(asyncio.TimeoutError):
+            asyncio.run(llm.complete(MESSAGES))
+    llm.breaker.opened_at -= 30
+    assert asyncio.run(llm.complete(MESSAGES)) == "back"
+    assert llm.breaker.state == "closed"
+
+
+def test_complete_unreadable_response_fails_the_probe(fake_llm):
+    fake_llm(SimpleNamespace(choices=[], usage=None))
+    llm.breaker.state, llm.breaker.opened_at = "open", 0.0
+    with pytest.raises(IndexError):
+        asyncio.run(llm.complete(MESSAGES))
+    assert llm.breaker.state == "open" and not llm.breaker._probing
+
+
+def status_error(code: int) -> APIStatusError:
+    response = httpx.Response(code, request=httpx.Request("POST", "https://llm.invalid/v1/chat/completions"))
+    return APIStatusError(f"HTTP {code}", response=response, body=None)
+
+
+@pytest.fixture
+def retrying_llm(fake_llm, monkeypatch):
+    """fake_llm with two quick retries"""
+    monkeypatch.setattr(llm, "MAX_RETRIES", 2)
+    monkeypatch.setattr(llm, "RETRY_BASE_S", 0.001)
+    monkeypatch.setattr(llm, "RETRY_MAX_S", 0.004)
+    monkeypatch.setattr(llm, "retries", {})
+    return fake_llm
+
+
+def test_transient_failures_are_retried(retrying_llm):
+    completions = retrying_llm(asyncio.TimeoutError(), status_error(503), reply("made it"))
+    assert asyncio.run(llm.complete(MESSAGES, kind="reply")) == "made it"
+    assert completions.calls == 3 and llm.retries == {"reply": 2}
+    assert llm.breaker.state == "closed" and llm.breaker.consecutive_failures == 0
+
+
+def test_rate_limits_are_retried(retrying_llm):
+    completions = retrying_llm(status_error(429), reply("ok"))
+    assert asyncio.run(llm.complete(MESSAGES)) == "ok"
+    assert completions.calls == 2
+
+
+def test_exhausted_retries_count_as_one_failure(retrying_llm):
+    completions = retrying_llm(*[asyncio.TimeoutError()] * 3)
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(llm.complete(MESSAGES))
+    assert completions.calls == 3
+    assert llm.breaker.consecutive_failures == 1 and llm.breaker.state == "closed"
+
+
+def test_client_errors_are_not_retried_or_held_against_the_endpoint(retrying_llm):
+    completions = retrying_llm(status_error(400), ValueError("bad request"))
+    for error in (APIStatusError, ValueError):
+        with pytest.raises(error):
+            asyncio.run(llm.complete(MESSAGES))
+    assert completions.calls == 2 and llm.retries == {}
+    assert llm.breaker.consecutive_failures == 0
+
+
+def test_no_retry_past_the_deadline(retrying_llm, monkeypatch):
+    monkeypatch.setattr(llm, "DEADLINE_S", 0.5)
+    monkeypatch.setattr(llm, "_backoff_s", lambda attempt: 1.0)  # The wait alone would overrun the deadline
+    completions = retrying_llm(asyncio.TimeoutError(), reply("too late"))
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(llm.complete(MESSAGES))
+    assert completions.calls == 1 and llm.breaker.consecutive_failures == 1
+
+
+def test_attempt_timeouts_are_capped_by_the_deadline(retrying_llm, monkeypatch):
+    monkeypatch.setattr(llm, "DEADLINE_S", 2.0)
+    completions = retrying_llm(reply("ok"))
+    asyncio.run(llm.complete(MESSAGES, timeout=30))
+    assert 0.1 <= completions.timeouts[0] <= 2.0
+
+
+def test_backoff_is_jittered_under_a_doubling_ceiling(monkeypatch):
+    monkeypatch.setattr(llm, "RETRY_BASE_S", 0.25)
+    monkeypatch.setattr(llm, "RETRY_MAX_S", 4.0)
+    monkeypatch.setattr(llm.random, "uniform", lambda low, high: (low, high))
+    assert [llm._backoff_s(attempt)[1] for attempt in range(6)] == [0.25, 0.5, 1.0, 2.0, 4.0, 4.0]
+    assert llm._backoff_s(0)[0] == 0
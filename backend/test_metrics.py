@@ -0,0 +1,54 @@
+"""
+Tests for the Prometheus metrics (metrics.py).
+"""
+import pytest
+
+import metrics
+
+
+@pytest.fixture(autouse=True)
+def registry(monkeypatch):
+    """Render only the metrics a test creates"""
+    monkeypatch.setattr(metrics, "_metrics", [])
+
+
+def test_counter_renders_one_sample_per_label_set():
+    counter = metrics.Counter("test_calls_total", "Calls", ("kind",))
+    counter.inc("reply")
+    counter.inc("reply", amount=2)
+    counter.inc('say "hi"\n')
+    assert metrics.render().splitlines() == [
+        "# HELP test_calls_total Calls",
+        "# TYPE test_calls_total counter",
+        'test_calls_total{kind="reply"} 3',
+        'test_calls_total{kind="say \\"hi\\"\\n"} 1',
+    ]
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = metrics.Histogram("test_seconds", "Latency", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value, "/x")
+    assert histogram.samples() == [
+        'test_seconds_bucket{route="/x",le="0.1"} 2',
+        'test_seconds_bucket{route="/x",le="1.0"} 3',
+        'test_seconds_bucket{route="/x",le="+Inf"} 4',
+        'test_seconds_sum{route="/x"} 3.65',
+        'test_seconds_count{route="/x"} 4',
+    ]
+
+
+def test_gauges_are_read_at_scrape_time():
+    value = {"n": 1}
+    gauge = metrics.Gauge("test_items", "Items", lambda: value["n"])
+    labelled = metrics.CallbackCounter("test_hits_total", "Hits", lambda: {("hit",): 5, ("miss",): 2}, ("result",))
+    value["n"] = 7
+    assert gauge.samples() == ["test_items 7"]
+    assert labelled.samples() == ['test_hits_total{result="hit"} 5', 'test_hits_total{result="miss"} 2']
+    assert "# TYPE test_hits_total counter" in metrics.render()
+
+
+def test_a_broken_gauge_is_left_out():
+    metrics.Gauge("test_broken", "Broken", lambda: 1 / 0)
+    metrics.Gauge("test_fine", "Fine", lambda: 1)
+    assert metrics.render().splitlines()[-1] == "test_fine 1"
@@ -0,0 +1,65 @@
+"""
+Tests for prompt budgeting (prompts.py).
+"""
+import json
+
+import pytest
+
+import prompts
+
+
+def conversation(turns: int, answer_chars: int = 100):
+    history = []
+    for i in range(turns):
+        history.append({"role": "assistant", "content": f"Question {i}? " + "q" * 200})
+        history.append({"role": "user", "content": f"answer {i} " + "a" * answer_chars})
+    return history
+
+
+def test_short_histories_are_sent_as_they_are():
+    history = conversation(2)
+    assert prompts.compact_history(history, budget_tokens=1000) is history
+
+
+@pytest.mark.parametrize("budget, answer_chars", [(124, 10), (500, 100), (1500, 100), (1500, 700)])
+def test_long_histories_fit_the_budget(budget, answer_chars):
+    history = conversation(40, answer_chars)
+    compacted = prompts.compact_history(history, budget_tokens=budget)
+    assert prompts.messages_tokens(compacted) <= budget
+    assert compacted[-1] == history[-1]  # The latest turns are kept verbatim
+    assert compacted[-2:] == history[-2:]
+
+
+def test_older_answers_are_summarized_and_questions_dropped():
+    history = conversation(20)
+    compacted = prompts.compact_history(history, budget_tokens=600)
+    summary = compacted[0]["content"]
+    first_kept = compacted[0]["content"].split("\n\n")[-1]
+    assert compacted[0]["role"] == "user" and summary.startswith(prompts.SUMMARY_PREFIX)
+    kept_from = int(first_kept.split()[1])  # The first user answer kept verbatim
+    assert f'"answer {kept_from - 1} ' in summary and f"Question {kept_from - 1}?" not in summary
+    assert '"answer 0 ' not in summary  # The oldest answers didn't fit
+    # Roles still alternate
+    assert all(a["role"] != b["role"] for a, b in zip(compacted, compacted[1:]))
+
+
+def test_summarized_answers_are_truncated():
+    history = conversation(12, answer_chars=1000)
+    compacted = prompts.compact_history(history, budget_tokens=1500)
+    summarized = [part for part in compacted[0]["content"].split(" | ") if "answer" in part]
+    assert summarized and all(len(part) <= prompts.SUMMARY_ANSWER_CHARS + 60 for part in summarized)
+
+
+def test_classification_profile_has_only_the_fields_it_uses():
+    user = {"user_id": "ana", "commute_mode": "bus", "commute_distance_km": 8, "diet_type": "vegan_meal",
+            "conversation_history": conversation(50)}
+    assert json.loads(prompts.classification_profile(user)) == {
+        "commute_distance_km": 8, "commute_mode": "bus", "diet_type": "vegan_meal"}
+
+
+def test_prompt_sizes_are_recorded_per_kind(monkeypatch):
+    monkeypatch.setattr(prompts, "prompt_stats", {})
+    assert prompts.record_prompt("reply", [{"role": "user", "content": "x" * 40}]) == 10
+    prompts.record_prompt("reply", [{"role": "user", "content": "x" * 80}])
+    assert prompts.get_stats()["reply"] == {"calls": 2, "total_tokens": 30, "max_tokens": 20, "last_tokens": 20,
+                                            "avg_tokens": 15.0}
@@ -0,0 +1,142 @@
+"""
+Tests for the state shared between workers (shared.py), on a temporary database.
+
+Each SharedDB has its own connection and writer thread, so two of them on the
+same file behave like two uvicorn workers.
+"""
+import threading
+import uuid
+from datetime import datetime
+
+import pytest
+
+from leaderboard import Leaderboards
+from shared import SharedActionStore, SharedDB, SharedLeaderboards, SharedStats, SharedUserStore
+from store import ActionStore
+
+INITIAL = {"total_co2_saved_kg": 0.0, "total_actions_logged": 0, "last_updated": "never"}
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "shared.db")
+
+
+@pytest.fixture
+def workers(db_path):
+    """Two connections to the same shared state, like two worker processes"""
+    dbs = [SharedDB(db_path), SharedDB(db_path)]
+    yield dbs
+    for db in dbs:
+        db.close()
+
+
+def make_action(user_id: str, logged_at: str, category: str = "transport", kg: float = 1.0):
+    return {"id": str(uuid.uuid4()), "user_id": user_id, "logged_at": logged_at, "category": category,
+            "action_type": "bus", "quantity": 1.0, "co2_saved_kg": kg, "factor_version": "v1"}
+
+
+def test_concurrent_increments_are_never_lost(workers):
+    stats = [SharedStats(db, INITIAL) for db in workers]
+
+    def log_actions(worker_stats):
+        for _ in range(300):
+            worker_stats.incr({"total_co2_saved_kg": 0.5, "total_actions_logged": 1})
+
+    threads = [threading.Thread(target=log_actions, args=(s,)) for s in stats]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for db in workers:
+        db.flush()
+    for s in stats:
+        s.refresh(force=True)
+        assert (s["total_co2_saved_kg"], s["total_actions_logged"]) == (300.0, 600)
+        assert isinstance(s["total_actions_logged"], int)
+
+
+def test_the_first_worker_seeds_the_counters(workers):
+    first = SharedStats(workers[0], dict(INITIAL, total_actions_logged=7))
+    first.incr({"total_actions_logged": 1})
+    workers[0].flush()
+    second = SharedStats(workers[1], dict(INITIAL, total_actions_logged=1000))  # Its initial values are ignored
+    assert second["total_actions_logged"] == 8
+    first["last_updated"] = "today"
+    workers[0].flush()
+    assert second.refresh(force=True)["last_updated"] == "today"
+
+
+def test_increments_show_locally_before_they_commit(workers):
+    stats = SharedStats(workers[0], INITIAL)
+    stats.incr({"total_actions_logged": 2})
+    assert stats["total_actions_logged"] == 2  # Whether or not the writer got to it yet
+    stats.refresh(force=True)
+    assert stats["total_actions_logged"] == 2
+
+
+def test_users_written_by_one_worker_are_read_by_another(workers):
+    first, second = SharedUserStore(workers[0]), SharedUserStore(workers[1])
+    first.save({"user_id": "ana", "city": "Pune"})
+    assert "ana" in second and second["ana"]["city"] == "Pune"
+    user = second["ana"]
+    user["city"] = "Oslo"  # A copy: nothing changes until it's saved
+    assert first["ana"]["city"] == "Pune"
+    second.save(user)
+    assert first.get("ana")["city"] == "Oslo" and first.get("nobody") is None
+    assert list(first) == ["ana"] and len(second) == 1
+
+
+def test_action_rollups_match_the_in_memory_store(workers):
+    records = [
+        make_action("ana", "2026-03-01T08:00:00"),
+        make_action("ana", "2026-03-01T19:00:00", "food", 0.25),
+        make_action("ben", "2026-03-03T09:00:00", kg=2.0),
+        make_action("ana", "2026-03-09T08:00:00", kg=4.0),
+    ]
+    shared_actions, memory = SharedActionStore(workers[0]), ActionStore()
+    shared_actions.extend(records)
+    memory.extend(records)
+    workers[0].flush()
+
+    other_worker = SharedActionStore(workers[1])
+    assert len(other_worker) == 4
+    for user_id in ("ana", "ben", "nobody"):
+        assert other_worker.user_summary(user_id) == memory.user_summary(user_id)
+    for granularity, periods in (("day", ["2026-03-01", "2026-03-02"]), ("week", ["2026-W09", "2026-W10", "2026-W11"])):
+        assert other_worker.user_buckets("ana", granularity, periods) == memory.user_buckets("ana", granularity, periods)
+    assert [r["id"] for r in other_worker.query(user_id="ana", start="2026-03-02")] == [records[3]["id"]]
+
+
+def test_leaderboards_match_the_in_memory_ones(workers):
+    now = datetime.now()
+    entries = [({"user": "ana", "city": "Pune"}, 2.0, now),
+               ({"user": "ben", "city": "Pune"}, 3.0, now),
+               ({"user": "cas", "city": "Oslo"}, 4.0, now)]
+    shared_boards, memory = SharedLeaderboards(workers[0]), Leaderboards()
+    shared_boards.add_many(entries)
+    memory.add_many(entries)
+    workers[0].flush()
+
+    other_worker = SharedLeaderboards(workers[1])
+    for dimension in ("user", "city"):
+        assert other_worker.top(dimension, "all", 10) == memory.top(dimension, "all", 10)
+        assert other_worker.top(dimension, "day", 10) == memory.top(dimension, "day", 10)
+    assert other_worker.rank("user", "week", "ben") == memory.rank("user", "week", "ben")
+
+
+def test_only_one_worker_claims_each_value(workers):
+    assert workers[0].claim("rebaselined_factor_version", "v2")
+    assert not workers[1].claim("rebaselined_factor_version", "v2")
+    assert workers[1].claim("rebaselined_factor_version", "v3")
+
+
+def test_setting_is_stored_once_for_every_worker(db_path):
+    first, second = SharedDB(db_path), SharedDB(db_path)
+    assert first.setting("secret", "aaa") == "aaa"
+    assert second.setting("secret", "bbb") == "aaa"
+    first.close()
+    second.close()
+    reopened = SharedDB(db_path)
+    assert reopened.setting("secret", "ccc") == "aaa"
+    reopened.close()
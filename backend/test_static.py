@@ -0,0 +1,88 @@
+"""
+Tests for the in-memory, precompressed frontend files (static.py).
+"""
+import gzip
+import os
+
+import pytest
+
+import static
+from static import StaticAssets
+
+PAGE = b"<!doctype html><html><body>" + b"<p>Log a climate action</p>" * 50 + b"</body></html>"
+
+
+def write(directory, name: str, data: bytes):
+    path = directory / name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    return path
+
+
+@pytest.fixture
+def assets(tmp_path):
+    write(tmp_path, "index.html", PAGE)
+    write(tmp_path, "app.js", b"console.log('hi');\n" * 40)
+    write(tmp_path, "img/logo.png", b"\x89PNG" + bytes(range(256)) * 4)
+    write(tmp_path, "docs/index.html", b"<p>docs</p>")
+    write(tmp_path, ".secret", b"hidden")
+    return StaticAssets(str(tmp_path))
+
+
+def test_the_best_accepted_encoding_is_sent(assets):
+    response = assets.response("", {"accept-encoding": "gzip, deflate"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert gzip.decompress(response.body) == PAGE
+    assert response.headers["content-length"] == str(len(response.body))
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert "content-encoding" not in assets.response("index.html", {}).headers
+    assert "content-encoding" not in assets.response("", {"accept-encoding": "gzip;q=0"}).headers
+    if static.brotli is not None:
+        assert assets.response("", {"accept-encoding": "gzip, br"}).headers["content-encoding"] == "br"
+        assert assets.response("", {"accept-encoding": "*"}).headers["content-encoding"] == "br"
+
+
+def test_each_encoding_has_its_own_etag_and_matching_gets_a_304(assets):
+    gzipped = assets.response("", {"accept-encoding": "gzip"})
+    plain = assets.response("", {})
+    assert gzipped.headers["etag"] != plain.headers["etag"]
+    etag = gzipped.headers["etag"]
+    for if_none_match in (etag, f"W/{etag}", f'"other", {etag}', "*"):
+        response = assets.response("", {"accept-encoding": "gzip", "if-none-match": if_none_match})
+        assert response.status_code == 304 and response.body == b"" and response.headers["etag"] == etag
+    # The gzip ETag doesn't validate the uncompressed representation
+    assert assets.response("", {"if-none-match": etag}).status_code == 200
+
+
+def test_cache_control_and_content_types(assets):
+    page = assets.response("", {})
+    script = assets.response("app.js", {})
+    assert (page.headers["cache-control"], page.media_type) == ("no-cache", "text/html")
+    assert (script.headers["cache-control"], script.media_type) == ("public, max-age=300", "text/javascript")
+
+
+def test_small_and_binary_files_are_not_compressed(assets):
+    for path in ("img/logo.png", "docs"):
+        response = assets.response(path, {"accept-encoding": "gzip"})
+        assert "content-encoding" not in response.headers and "vary" not in response.headers
+    assert assets.response("docs/", {}).body == b"<p>docs</p>"
+
+
+def test_head_sends_headers_only(assets):
+    response = assets.response("app.js", {}, head=True)
+    assert response.body == b"" and response.headers["content-length"] == str(len(b"console.log('hi');\n" * 40))
+
+
+def test_unknown_and_hidden_files_are_not_served(assets):
+    assert assets.response("missing.css", {}) is None
+    assert assets.response(".secret", {}) is None
+
+
+def test_refresh_picks_up_edits_and_deletions(assets, tmp_path):
+    etag = assets.response("app.js", {})
+    assert assets.refresh() == 0
+    write(tmp_path, "app.js", b"console.log('changed');\n")
+    os.remove(tmp_path / "img" / "logo.png")
+    assert assets.refresh() == 2 and assets.reloads == 1
+    assert assets.response("app.js", {}).headers["etag"] != etag.headers["etag"]
+    assert assets.response("img/logo.png", {}) is None
@@ -0,0 +1,254 @@
+"""
+Tests for the action store (store.py) and the persistence backends
+(storage.py, journal.py).
+"""
+import json
+import os
+import uuid
+
+import pytest
+
+import journal as journal_module
+import store
+from journal import _LENGTH, JournalStorage
+from storage import SQLiteStorage
+from store import ActionStore
+
+
+def make_action(user_id: str, logged_at: str, category: str = "transport", action_type: str = "bus",
+                quantity: float = 5, action_id=None):
+    return {
+        "id": action_id or str(uuid.uuid4()),
+        "user_id": user_id,
+        "logged_at": logged_at,
+        "category": category,
+        "action_type": action_type,
+        "quantity": quantity,
+        "co2_saved_kg": round(quantity * 0.1, 3),
+        "factor_version": "v1",
+    }
+
+
+ACTIONS = [
+    make_action("ana", "2026-03-01T08:00:00"),
+    make_action("ben", "2026-03-01T09:30:00", "food", "vegan_meal", 1, action_id="legacy-42"),
+    make_action("ana", "2026-03-02T18:15:00.250000", "food", "vegetarian_meal", 2),
+    make_action("ben", "2026-03-05T07:00:00", quantity=12.5),
+    make_action("ana", "2026-04-01T00:00:00"),
+]
+
+
+@pytest.fixture(params=["numpy", "pure-python"])
+def action_store(request, monkeypatch):
+    """A small store split over several column chunks, with and without NumPy"""
+    if request.param == "numpy" and store.np is None:
+        pytest.skip("NumPy isn't installed")
+    if request.param == "pure-python":
+        monkeypatch.setattr(store, "np", None)
+    monkeypatch.setattr(store, "CHUNK_SIZE", 2)
+    actions = ActionStore()
+    actions.extend(ACTIONS[:3])
+    for record in ACTIONS[3:]:
+        actions.append(record)
+    return actions
+
+
+# ActionStore
+
+def test_store_round_trips_records(action_store):
+    assert len(action_store) == len(ACTIONS)
+    assert list(action_store) == ACTIONS
+    assert action_store[1]["id"] == "legacy-42"
+    assert action_store[-1] == ACTIONS[-1]
+    assert action_store[1:3] == ACTIONS[1:3]
+    assert list(action_store.frozen()) == ACTIONS
+
+
+def test_store_query_filters(action_store):
+    def ids(**filters):
+        return [record["id"] for record in action_store.query(**filters)]
+
+    assert ids() == [record["id"] for record in ACTIONS]
+    assert ids(user_id="ana") == [ACTIONS[0]["id"], ACTIONS[2]["id"], ACTIONS[4]["id"]]
+    assert ids(category="food") == [ACTIONS[1]["id"], ACTIONS[2]["id"]]
+    assert ids(start="2026-03-01T09:30:00", end="2026-04-01T00:00:00") == [r["id"] for r in ACTIONS[1:4]]
+    assert ids(user_id="ben", category="transport", start="2026-03-02") == [ACTIONS[3]["id"]]
+    assert ids(category="lifestyle") == []
+    assert ids(user_id="nobody") == []
+
+
+def test_store_query_rejects_bad_bounds_up_front(action_store):
+    with pytest.raises(ValueError):
+        action_store.query(start="2026-03-01T00:00:00+02:00")
+    with pytest.raises(ValueError):
+        action_store.query(end="not a date")
+
+
+def test_store_keeps_running_user_totals(action_store):
+    summary = action_store.user_summary("ana")
+    assert summary["action_count"] == 3
+    assert summary["total_co2_saved_kg"] == pytest.approx(0.5 + 0.2 + 0.5)
+    assert summary["first_active_day"] == "2026-03-01"
+    assert action_store.user_buckets("ana", "day", ["2026-03-02", "2026-03-03"]) == {"2026-03-02": ({"food": 0.2}, 1)}
+
+
+def test_store_rolls_days_up_into_weeks_and_months():
+    actions = ActionStore()
+    for day, category, kg in [("2026-03-31", "food", 1.0), ("2026-03-02", "transport", 2.0),  # Out of order
+                              ("2026-03-31", "food", 0.5), ("2026-04-01", "food", 4.0), ("2026-03-31", "energy", 8.0)]:
+        actions.append(dict(ACTIONS[0], id=str(uuid.uuid4()), logged_at=f"{day}T12:00:00", category=category,
+                            co2_saved_kg=kg))
+    summary = actions.user_summary("ana")
+    assert (summary["days_active"], summary["first_active_day"]) == (3, "2026-03-02")
+    assert actions.user_buckets("ana", "day", ["2026-03-31"]) == {"2026-03-31": ({"food": 1.5, "energy": 8.0}, 3)}
+    assert actions.user_buckets("ana", "week", ["2026-W14"]) == {"2026-W14": ({"food": 5.5, "energy": 8.0}, 4)}
+    assert actions.user_buckets("ana", "month", ["2026-03", "2026-04", "2026-05"]) == {
+        "2026-03": ({"transport": 2.0, "food": 1.5, "energy": 8.0}, 4), "2026-04": ({"food": 4.0}, 1)}
+
+
+def test_store_extend_is_all_or_nothing():
+    actions = ActionStore()
+    actions.append(ACTIONS[0])
+    bad = dict(ACTIONS[2], quantity="2")
+    with pytest.raises(ValueError):
+        actions.extend([ACTIONS[1], bad])
+    assert list(actions) == ACTIONS[:1]
+    assert actions.user_summary("ben")["action_count"] == 0
+
+
+# SQLiteStorage
+
+def test_sqlite_storage_round_trips(tmp_path):
+    path = str(tmp_path / "state.db")
+    storage = SQLiteStorage(path, flush_interval_s=0.001)
+    storage.save_user({"user_id": "ana", "city": "Pune"})
+    storage.save_user({"user_id": "ana", "city": "Lima"})
+    storage.append_actions(ACTIONS)
+    storage.save_stats({"total_actions_logged": 5})
+    storage.close()
+
+    users, actions, stats = SQLiteStorage(path).load()
+    assert users == {"ana": {"user_id": "ana", "city": "Lima"}}
+    assert sorted(actions, key=lambda r: r["logged_at"]) == sorted(ACTIONS, key=lambda r: r["logged_at"])
+    assert stats == {"total_actions_logged": 5}
+
+
+# JournalStorage
+
+def open_journal(directory) -> JournalStorage:
+    journal = JournalStorage(str(directory), fsync_interval_s=0.01)
+    journal.load()
+    return journal
+
+
+def test_journal_replays_after_a_restart(tmp_path):
+    journal = open_journal(tmp_path)
+    journal.save_user({"user_id": "ana", "city": "Pune"})
+    journal.append_actions(ACTIONS[:2])
+    journal.save_stats({"total_actions_logged": 2})
+    journal.close()
+
+    journal = JournalStorage(str(tmp_path))
+    users, actions, stats = journal.load()
+    journal.close()
+    assert users == {"ana": {"user_id": "ana", "city": "Pune"}}
+    assert actions == ACTIONS[:2]
+    assert stats == {"total_actions_logged": 2}
+
+
+def test_journal_loads_the_snapshot_plus_the_tail(tmp_path):
+    journal = open_journal(tmp_path)
+    journal.save_user({"user_id": "ana"})
+    journal.append_actions(ACTIONS[:3])
+    seq = journal.begin_snapshot()
+    journal.append_actions(ACTIONS[3:])
+    journal.write_snapshot(seq, json.dumps({"ana": {"user_id": "ana"}}), ACTIONS[:3], {"n": 3})
+    journal.save_user({"user_id": "ben"})
+    journal.close()
+    assert len(journal._segments()) == 1  # The segments the snapshot covers are gone
+
+    journal = JournalStorage(str(tmp_path))
+    users, actions, stats = journal.load()
+    journal.close()
+    assert set(users) == {"ana", "ben"}
+    assert actions == ACTIONS
+    assert stats == {"n": 3}
+
+
+def test_journal_ignores_a_torn_tail_and_skips_corrupt_records(tmp_path):
+    journal = open_journal(tmp_path)
+    journal.append_actions(ACTIONS[:1])
+    journal.flush()
+    # A record that isn't JSON, a valid one, then a write cut short mid-record
+    payload = b"{not json"
+    journal._file.write(_LENGTH.pack(len(payload)) + payload)
+    journal._file.flush()
+    journal.append_actions(ACTIONS[1:2])
+    journal.close()
+    segment = journal._segments()[-1]
+    with open(segment, "ab") as f:
+        f.write(_LENGTH.pack(100) + b'{"seq": 99, "op": "act')
+
+    journal = JournalStorage(str(tmp_path))
+    users, actions, stats = journal.load()
+    assert actions == ACTIONS[:2]
+    # New records carry on after the last good seq, in a new segment
+    journal.append_actions(ACTIONS[2:3])
+    journal.close()
+    assert os.path.basename(journal._segments()[-1]) == "journal-000000000003.log"
+    journal = JournalStorage(str(tmp_path))
+    assert journal.load()[1] == ACTIONS[:3]
+    journal.close()
+
+
+def write_raw_record(journal: JournalStorage, record):
+    payload = json.dumps(record).encode()
+    journal._file.write(_LENGTH.pack(len(payload)) + payload)
+    journal._file.flush()
+
+
+def test_journal_skips_well_formed_records_it_cant_replay(tmp_path):
+    journal = open_journal(tmp_path)
+    journal.save_user({"user_id": "ana"})
+    journal.flush()
+    for record in [
+        {"seq": 10, "data": {"user_id": "x"}},  # No op
+        {"seq": 11, "op": "rename", "data": {}},
+        {"seq": 12, "op": "user", "data": {"city": "Pune"}},  # No user_id
+        {"seq": 13, "op": "actions", "data": [{"id": "a"}]},
+        {"seq": 14, "op": "stats", "data": [1, 2]},
+        [1, 2, 3],
+    ]:
+        write_raw_record(journal, record)
+    journal.append_actions(ACTIONS[:1])
+    journal.close()
+
+    journal = JournalStorage(str(tmp_path))
+    users, actions, _ = journal.load()
+    journal.close()
+    assert users == {"ana": {"user_id": "ana"}}
+    assert actions == ACTIONS[:1]
+
+
+def test_journal_begin_snapshot_does_no_disk_io(tmp_path, monkeypatch):
+    journal = JournalStorage(str(tmp_path), fsync_interval_s=60)  # No background flush during the test
+    journal.load()
+    journal.append_actions(ACTIONS[:2])
+
+    def no_io(*args):
+        raise AssertionError("disk I/O in begin_snapshot")
+
+    monkeypatch.setattr(journal_module.os, "fsync", no_io)
+    monkeypatch.setattr(journal, "_open_segment", no_io)
+    seq = journal.begin_snapshot()
+    monkeypatch.undo()
+
+    journal.append_actions(ACTIONS[2:])  # After the snapshot's seq: must survive it
+    journal.flush()
+    journal.write_snapshot(seq, "{}", ACTIONS[:2], {})
+    journal.close()
+    assert [os.path.basename(path) for path in journal._segments()] == [f"journal-{seq + 1:012d}.log"]
+
+    journal = JournalStorage(str(tmp_path))
+    assert journal.load()[1] == ACTIONS
+    journal.close()
@@ -3,10 +3,9 @@
 echo "🌍 Starting CarbonBuddy..."
 echo ""
 
-# Kill existing processes on ports 8000 and 3000
+# Kill existing processes on port 8000
 echo "🧹 Cleaning up existing processes..."
 lsof -ti:8000 | xargs kill -9 2>/dev/null || true
-lsof -ti:3000 | xargs kill -9 2>/dev/null || true
 
 # Get the directory where this script is located
 SCRIPT_DIR="$( cd "$( dirname "${BASH_SOURCE[0]}" )" && pwd )"
@@ -37,7 +36,7 @@ else
     echo "⚠️  Warning: Virtual environment not found. Python dependencies may not be available."
 fi
 
-# Start backend
+# Start backend (it also serves the frontend from memory)
 echo "📡 Starting backend on http://localhost:8000..."
 cd "$SCRIPT_DIR/backend"
 python3 main.py &
@@ -46,22 +45,16 @@ BACKEND_PID=$!
 # Wait for backend to start
 sleep 3
 
-# Start frontend
-echo "🎨 Starting frontend on http://localhost:3000..."
-cd "$SCRIPT_DIR/frontend"
-python3 -m http.server 3000 &
-FRONTEND_PID=$!
-
 echo ""
 echo "✅ CarbonBuddy is running!"
-echo "   Backend:  http://localhost:8000"
-echo "   Frontend: http://localhost:3000"
+echo "   App + API: http://localhost:8000"
 echo ""
-echo "   Open http://localhost:3000 in your browser"
+echo "   Open http://localhost:8000 in your browser"
+echo "   (edits to frontend/ are picked up without a restart)"
 echo ""
-echo "Press Ctrl+C to stop both servers"
+echo "Press Ctrl+C to stop the server"
 echo ""
 
 # Wait for Ctrl+C
-trap "kill $BACKEND_PID $FRONTEND_PID; exit" INT
+trap "kill $BACKEND_PID; exit" INT
 wait